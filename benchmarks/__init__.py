@@ -0,0 +1,23 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Performance benchmarks for CDC Aggregator shared library.
+
+Benchmarks are not part of the installed package. Run them from the
+repository root, for example::
+
+    python -m benchmarks.run --records 1000 --variables 50
+
+:mod:`benchmarks.corpus` generates synthetic OAI-PMH corpora for all
+supported DDI versions. :mod:`benchmarks.run` reports throughput,
+latency and peak RSS per parser class.
+"""
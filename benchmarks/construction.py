@@ -0,0 +1,97 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark Study instantiation.
+
+Instantiates studies with the aggregator attributes fabricated lazily
+and compares to touching every aggregator attribute right after
+instantiation, which is what eager fabrication costs. Also imports
+studies from a DocStore document without aggregator attributes, which
+must not fabricate them either. Reports time and allocations per
+instance traced with :mod:`tracemalloc`.
+"""
+import argparse
+import tracemalloc
+from functools import partial
+from time import perf_counter
+
+from cdcagg_common.records import Study
+
+
+_AGGREGATOR_ATTRIBUTES = ('_provenance', '_direct_base_url',
+                          '_aggregator_identifier', '_source_fingerprint')
+
+
+def lazy():
+    """Instantiate Study without touching aggregator attributes."""
+    return Study()
+
+
+def eager():
+    """Instantiate Study and fabricate all aggregator attributes."""
+    study = Study()
+    for name in _AGGREGATOR_ATTRIBUTES:
+        getattr(study, name)
+    return study
+
+
+def imported(document):
+    """Instantiate Study from a DocStore document.
+
+    :param dict document: Document without aggregator attributes.
+    """
+    return Study(document)
+
+
+def measure(func, number):
+    """Measure time and allocations of instantiations.
+
+    Instances are kept alive until measurement ends, as they would be
+    when loading query results.
+
+    :param callable func: Function returning a new instance.
+    :param int number: Number of instances.
+    :returns: Seconds, allocated blocks and allocated bytes.
+    :rtype: tuple
+    """
+    start = perf_counter()
+    studies = [func() for _ in range(number)]
+    elapsed = perf_counter() - start
+    del studies
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    studies = [func() for _ in range(number)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    del studies
+    stats = after.compare_to(before, 'filename')
+    blocks = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+    return elapsed, blocks, size
+
+
+def main(argv=None):
+    """Run benchmark and print results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=100000,
+                        help='Number of studies to instantiate.')
+    args = parser.parse_args(argv)
+    print(f'{"mode":>6} {"us/instance":>12} {"blocks/instance":>16} {"bytes/instance":>15}')
+    document = Study().export_dict(include_provenance=False, include_metadata=True, include_id=True)
+    for name, func in (('eager', eager), ('lazy', lazy), ('import', partial(imported, document))):
+        elapsed, blocks, size = measure(func, args.number)
+        print(f'{name:>6} {elapsed / args.number * 1e6:>12.3f} {blocks / args.number:>16.1f} '
+              f'{size / args.number:>15.1f}')
+
+
+if __name__ == '__main__':
+    main()
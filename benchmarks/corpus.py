@@ -0,0 +1,205 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Synthetic OAI-PMH corpora for benchmarks.
+
+Generates OAI-PMH GetRecord and ListRecords responses wrapping
+DDI 1.2.2 Nesstar, DDI 2.5, DDI 3.1, DDI 3.2 and DDI 3.3 metadata.
+The size of each record is controlled by the number of variables,
+the number of languages of localized elements and the depth of the
+provenance chain in ``oai:about``.
+"""
+from xml.sax.saxutils import escape
+
+from cdcagg_common import mappings
+
+
+OAI_PMH_START = ('<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/" '
+                 'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+                 '<responseDate>2020-01-01T00:00:00Z</responseDate>')
+OAI_PMH_END = '</OAI-PMH>'
+DEFAULT_LANGUAGES = ('en', 'fi', 'de', 'fr', 'sv', 'nl', 'el', 'sl')
+
+
+def _languages(count):
+    return [DEFAULT_LANGUAGES[index % len(DEFAULT_LANGUAGES)] + ('' if index < len(DEFAULT_LANGUAGES)
+                                                                else str(index))
+            for index in range(count)]
+
+
+def _ddic_body(number, variables, languages, ns_attr, child_ns_attr=''):
+    langs = _languages(languages)
+    titles = ''.join(f'<titl xml:lang="{lang}">Study {number} title in {lang}</titl>' for lang in langs)
+    abstracts = ''.join(f'<abstract xml:lang="{lang}">{escape(f"Abstract of study {number} in {lang}. " * 5)}'
+                        '</abstract>' for lang in langs)
+    keywords = ''.join(f'<keyword xml:lang="{lang}" vocab="some_vocab">keyword {index}</keyword>'
+                       for lang in langs for index in range(3))
+    var_els = ''.join(f'<var ID="V{index}" name="var{index}">' +
+                      ''.join(f'<labl xml:lang="{lang}">Variable {index} in {lang}</labl>' for lang in langs) +
+                      '<qstn><qstnLit>What is the value?</qstnLit></qstn>'
+                      '<catgry><catValu>1</catValu><labl>Yes</labl></catgry>'
+                      '<catgry><catValu>2</catValu><labl>No</labl></catgry></var>'
+                      for index in range(variables))
+    return (f'<codeBook {ns_attr}>'
+            f'<stdyDscr {child_ns_attr}><citation><titlStmt>{titles}'
+            f'<IDNo agency="some_agency">study_{number}</IDNo></titlStmt>'
+            '<prodStmt><producer>Some Producer</producer></prodStmt>'
+            '<distStmt><distDate date="2020-01-01">2020</distDate></distStmt></citation>'
+            f'<stdyInfo><subject>{keywords}</subject>{abstracts}'
+            '<sumDscr><collDate event="start" date="2019-01-01"/><nation>Finland</nation></sumDscr>'
+            '</stdyInfo><dataAccs><useStmt><conditions>Free</conditions></useStmt></dataAccs></stdyDscr>'
+            f'<dataDscr {child_ns_attr}>{var_els}</dataDscr></codeBook>')
+
+
+def ddi122_nesstar(number, variables, languages):
+    """DDI 1.2.2 Nesstar codebook."""
+    return _ddic_body(number, variables, languages, 'xmlns="http://www.icpsr.umich.edu/DDI"', 'xmlns=""')
+
+
+def ddi25(number, variables, languages):
+    """DDI 2.5 codebook."""
+    return _ddic_body(number, variables, languages, 'xmlns="ddi:codebook:2_5" version="2.5"')
+
+
+def _ddi3_body(number, variables, languages, version):
+    langs = _languages(languages)
+    ns = {prefix: f'ddi:{name}:{version}' for prefix, name in (
+        ('ddi', 'instance'), ('s', 'studyunit'), ('r', 'reusable'), ('a', 'archive'),
+        ('l', 'logicalproduct'), ('c', 'conceptualcomponent'), ('d', 'datacollection'))}
+    ns_attrs = ' '.join(f'xmlns:{prefix}="{uri}"' for prefix, uri in ns.items())
+    if version == '3_1':
+        titles = ''.join(f'<r:Title xml:lang="{lang}">Study {number} title in {lang}</r:Title>' for lang in langs)
+        abstract = ''.join(f'<r:Content xml:lang="{lang}">Abstract of study {number} in {lang}</r:Content>'
+                           for lang in langs)
+        var_label = ''.join(f'<r:Label xml:lang="{lang}">Variable label in {lang}</r:Label>' for lang in langs)
+    else:
+        titles = '<r:Title>' + ''.join(f'<r:String xml:lang="{lang}">Study {number} title in {lang}</r:String>'
+                                       for lang in langs) + '</r:Title>'
+        abstract = ''.join(f'<r:Content xml:lang="{lang}">Abstract of study {number} in {lang}</r:Content>'
+                           for lang in langs)
+        var_label = '<r:Label>' + ''.join(f'<r:Content xml:lang="{lang}">Variable label in {lang}</r:Content>'
+                                          for lang in langs) + '</r:Label>'
+    user_id = '' if version == '3_1' else f'<r:UserID typeOfUserID="StudyNumber">study_{number}</r:UserID>'
+    var_els = ''.join(f'<l:Variable><r:ID>var{index}</r:ID>'
+                      f'<l:VariableName><r:String>var{index}</r:String></l:VariableName>{var_label}'
+                      '</l:Variable>' for index in range(variables))
+    return (f'<ddi:DDIInstance {ns_attrs}><s:StudyUnit>{user_id}'
+            f'<r:Citation>{titles}<r:Creator>Some Creator</r:Creator></r:Citation>'
+            f'<r:Abstract>{abstract}</r:Abstract>'
+            '<a:Archive><a:ArchiveSpecific><a:Collection>'
+            f'<a:CallNumber>study_{number}</a:CallNumber>'
+            '</a:Collection></a:ArchiveSpecific></a:Archive>'
+            f'<l:LogicalProduct><l:VariableScheme>{var_els}</l:VariableScheme></l:LogicalProduct>'
+            '</s:StudyUnit></ddi:DDIInstance>')
+
+
+def ddi31(number, variables, languages):
+    """DDI 3.1 instance."""
+    return _ddi3_body(number, variables, languages, '3_1')
+
+
+def ddi32(number, variables, languages):
+    """DDI 3.2 instance."""
+    return _ddi3_body(number, variables, languages, '3_2')
+
+
+def ddi33(number, variables, languages):
+    """DDI 3.3 instance."""
+    return _ddi3_body(number, variables, languages, '3_3')
+
+
+#: Metadata generators by format name and the parser class expected
+#: to map them.
+FORMATS = {
+    'ddi122': (ddi122_nesstar, mappings.DDI122NesstarRecordParser),
+    'ddi25': (ddi25, mappings.DDI25RecordParser),
+    'ddi31': (ddi31, mappings.DDI31RecordParser),
+    'ddi32': (ddi32, mappings.DDI32RecordParser),
+    'ddi33': (ddi33, mappings.DDI33RecordParser),
+}
+
+
+def provenance(depth):
+    """``oai:about`` element with a chain of nested originDescription elements.
+
+    :param int depth: Number of nested originDescription elements.
+                      Zero returns an empty string.
+    :returns: XML
+    :rtype: str
+    """
+    if depth == 0:
+        return ''
+    origdesc = ''.join(f'<originDescription harvestDate="2000-01-01T00:00:00Z" altered="false">'
+                       f'<baseURL>http://base.url/{level}</baseURL>'
+                       f'<identifier>oai:some:{level}</identifier>'
+                       f'<datestamp>2000-01-01</datestamp>'
+                       f'<metadataNamespace>ddi:codebook:2_5</metadataNamespace>'
+                       for level in range(depth))
+    return ('<about><provenance xmlns="http://www.openarchives.org/OAI/2.0/provenance">' +
+            origdesc + '</originDescription>' * depth + '</provenance></about>')
+
+
+def record(fmt, number, variables=10, languages=2, provenance_depth=1):
+    """``oai:record`` element.
+
+    :param str fmt: Format name. One of :data:`FORMATS`.
+    :param int number: Record number used in identifiers and titles.
+    :param int variables: Number of variables.
+    :param int languages: Number of languages of localized elements.
+    :param int provenance_depth: Depth of the provenance chain.
+    :returns: XML
+    :rtype: str
+    """
+    metadata = FORMATS[fmt][0](number, variables, languages)
+    return ('<record><header>'
+            f'<identifier>oai:some.base.url:{fmt}:{number}</identifier>'
+            '<datestamp>2020-01-01T00:00:00Z</datestamp></header>'
+            f'<metadata>{metadata}</metadata>{provenance(provenance_depth)}</record>')
+
+
+def get_record(fmt, number, base_url='http://some.base.url/oai', **kwargs):
+    """OAI-PMH GetRecord response.
+
+    Keyword arguments are passed to :func:`record`.
+
+    :returns: XML
+    :rtype: bytes
+    """
+    return (f'{OAI_PMH_START}<request verb="GetRecord">{base_url}</request>'
+            f'<GetRecord>{record(fmt, number, **kwargs)}</GetRecord>{OAI_PMH_END}').encode('utf8')
+
+
+def list_records(fmt, count, base_url='http://some.base.url/oai', **kwargs):
+    """OAI-PMH ListRecords response.
+
+    Keyword arguments are passed to :func:`record`.
+
+    :param int count: Number of records.
+    :returns: XML
+    :rtype: bytes
+    """
+    return (f'{OAI_PMH_START}<request verb="ListRecords">{base_url}</request><ListRecords>' +
+            ''.join(record(fmt, number, **kwargs) for number in range(count)) +
+            f'</ListRecords>{OAI_PMH_END}').encode('utf8')
+
+
+def corpus(fmt, count, **kwargs):
+    """Generate GetRecord responses.
+
+    Keyword arguments are passed to :func:`get_record`.
+
+    :param str fmt: Format name. One of :data:`FORMATS`.
+    :param int count: Number of records.
+    :returns: Generator yielding GetRecord responses.
+    """
+    for number in range(count):
+        yield get_record(fmt, number, **kwargs)
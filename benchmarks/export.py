@@ -0,0 +1,96 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark NDJSON export of studies.
+
+Maps a pool of distinct synthetic records and exports them in turn with
+:class:`cdcagg_common.streams.NDJSONWriter`. Records are not cached
+between exports, like records exported once in a harvest. Reports
+records per second, output size and peak RSS, which stays constant
+regardless of the number of records when the export streams. Use
+``--min-rate`` to fail when throughput is below a target.
+"""
+import argparse
+import os
+import sys
+from time import perf_counter
+from xml.etree import ElementTree
+
+from cdcagg_common import (
+    mappings,
+    streams
+)
+from benchmarks import corpus
+from benchmarks.run import peak_rss_kib
+
+
+class _CountingFile:
+    """Binary sink counting written bytes."""
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return self._fileobj.write(data)
+
+    def flush(self):
+        self._fileobj.flush()
+
+
+def studies(count, distinct=1000, fmt='ddi25', **kwargs):
+    """Yield count studies cycling through distinct mapped studies.
+
+    :param int count: Number of studies to yield.
+    :param int distinct: Number of distinct studies to map.
+    :param str fmt: Corpus format name.
+    :returns: generator yielding studies.
+    """
+    pool = [next(iter(mappings.get_parser(ElementTree.fromstring(source)).studies))
+            for source in corpus.corpus(fmt, min(count, distinct), **kwargs)]
+    for index in range(count):
+        yield pool[index % len(pool)]
+
+
+def main(argv=None):
+    """Run benchmark and print results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=1000000,
+                        help='Number of records to export.')
+    parser.add_argument('--distinct', type=int, default=1000,
+                        help='Number of distinct records to map and export in turn.')
+    parser.add_argument('--compression', choices=['none', streams.COMPRESSION_GZIP,
+                                                  streams.COMPRESSION_ZSTD],
+                        default='none', help='Output compression.')
+    parser.add_argument('--output', default=os.devnull,
+                        help='Output file. Defaults to the null device.')
+    parser.add_argument('--min-rate', type=float, default=None,
+                        help='Exit with an error if records/s is below this.')
+    args = parser.parse_args(argv)
+    compression = None if args.compression == 'none' else args.compression
+    with open(args.output, 'wb') as fileobj:
+        output = _CountingFile(fileobj)
+        start = perf_counter()
+        count = streams.write_ndjson(studies(args.records, args.distinct), output, compression=compression)
+        elapsed = perf_counter() - start
+    rate = count / elapsed
+    print(f'records: {count}  records/s: {rate:.0f}  output MiB: {output.size / 2**20:.1f}  '
+          f'peak RSS KiB: {peak_rss_kib()}')
+    if args.min_rate is not None and rate < args.min_rate:
+        print(f'below target of {args.min_rate:.0f} records/s', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
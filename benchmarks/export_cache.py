@@ -0,0 +1,61 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark repeated exports of an unchanged study.
+
+Compares cached exports of a record instantiated with
+``cache_exports`` to exports rebuilt from the field values, which is
+what every export of a record without caching costs.
+"""
+import argparse
+from timeit import timeit
+from xml.etree import ElementTree
+
+from cdcagg_common import (
+    mappings,
+    records
+)
+from benchmarks import corpus
+
+
+def rebuilt(study):
+    """Export study bypassing the cache."""
+    study.invalidate_export_cache()
+    return study.export_dict()
+
+
+def cached(study):
+    """Export study from the cache."""
+    return study.export_dict()
+
+
+def main(argv=None):
+    """Run benchmark and print results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--variables', type=int, nargs='+', default=[10, 100, 1000],
+                        help='Number of variables in the study.')
+    parser.add_argument('--number', type=int, default=1000,
+                        help='Number of exports per measurement.')
+    args = parser.parse_args(argv)
+    print(f'{"variables":>10} {"rebuilt us":>12} {"cached us":>12}')
+    for variables in args.variables:
+        root_element = ElementTree.fromstring(corpus.get_record('ddi25', 0, variables=variables))
+        mapped = next(iter(mappings.get_parser(root_element).studies))
+        study = records.Study(mapped.export_dict(include_metadata=True, include_id=True),
+                              cache_exports=True)
+        results = [timeit(lambda: func(study), number=args.number) / args.number
+                   for func in (rebuilt, cached)]
+        print(f'{variables:>10} {results[0] * 1e6:>12.2f} {results[1] * 1e6:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
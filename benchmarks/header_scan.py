@@ -0,0 +1,77 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark header scan of ListRecords responses.
+
+Reads the headers of a synthetic OAI-PMH ListRecords response with
+:func:`cdcagg_common.mappings.iter_headers` and compares to mapping
+every record with :func:`cdcagg_common.mappings.iter_list_records`,
+which is what deciding on records from their headers costs without
+the scan. Reports records per second and peak memory allocated while
+reading, traced with :mod:`tracemalloc` in a separate run.
+"""
+import argparse
+import tracemalloc
+from time import perf_counter
+
+from cdcagg_common import mappings
+from benchmarks import corpus
+
+
+def scan(source):
+    """Read header info of each record."""
+    for _ in mappings.iter_headers(source):
+        pass
+
+
+def mapped(source):
+    """Map each record."""
+    for _ in mappings.iter_list_records(source):
+        pass
+
+
+def measure(func, source):
+    """Measure time and peak allocated memory of reading source.
+
+    :param callable func: Function reading source.
+    :param bytes source: ListRecords response.
+    :returns: Seconds and peak allocated bytes.
+    :rtype: tuple
+    """
+    start = perf_counter()
+    func(source)
+    elapsed = perf_counter() - start
+    tracemalloc.start()
+    func(source)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main(argv=None):
+    """Run benchmark and print results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=100,
+                        help='Number of records in the response.')
+    parser.add_argument('--variables', type=int, nargs='+', default=[10, 100, 1000],
+                        help='Number of variables per record.')
+    args = parser.parse_args(argv)
+    print(f'{"variables":>10} {"scan rec/s":>12} {"scan KiB":>10} {"map rec/s":>12} {"map KiB":>10}')
+    for variables in args.variables:
+        source = corpus.list_records('ddi25', args.records, variables=variables)
+        results = [measure(func, source) for func in (scan, mapped)]
+        print(f'{variables:>10} ' + ' '.join(f'{args.records / elapsed:>12.1f} {peak / 1024:>10.0f}'
+                                             for elapsed, peak in results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Micro-benchmark for OAI-PMH envelope lookups.
+
+Compares the per-record cost of envelope, header and provenance
+lookups made with string XPaths through
+:meth:`xml.etree.ElementTree.Element.find` to the same lookups made
+with the paths precompiled in :mod:`cdcagg_common.mappings`.
+
+The DDI parsers in kuha_common use many distinct paths per record.
+These are simulated by looking up a number of distinct XPaths
+between records, which makes the ElementPath cache churn as it
+does under load.
+"""
+import argparse
+from timeit import timeit
+from xml.etree import ElementTree
+
+from cdcagg_common import mappings
+
+
+ENVELOPE = (
+    '<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/">'
+    '<request verb="GetRecord">http://some.base.url</request>'
+    '<GetRecord><record><header>'
+    '<identifier>oai:some.base.url:1</identifier>'
+    '<datestamp>2020-01-01T00:00:00Z</datestamp></header>'
+    '<metadata><codeBook xmlns="ddi:codebook:2_5"/></metadata>'
+    '<about><provenance xmlns="http://www.openarchives.org/OAI/2.0/provenance">'
+    '<originDescription harvestDate="2002-02-02T14:10:02Z" altered="true">'
+    '<baseURL>http://the.oa.org</baseURL>'
+    '<identifier>oai:r2.org:klik001</identifier>'
+    '<datestamp>2002-01-01</datestamp>'
+    '<metadataNamespace>http://www.openarchives.org/OAI/2.0/oai_dc/</metadataNamespace>'
+    '</originDescription></provenance></about>'
+    '</record></GetRecord></OAI-PMH>')
+
+
+def xpath_lookups(root_element):
+    """Envelope lookups as made with string XPaths."""
+    namespaces = dict(**{'ddi': 'ddi:codebook:2_5'}, oai=mappings.OAI_NS['oai'])
+    mappings.datetime_to_datestamp(mappings.datetime_now())
+    root_element.find('./oai:GetRecord/oai:record/oai:metadata/ddi:codeBook', namespaces)
+    ''.join(root_element.find('./oai:request', mappings.OAI_NS).itertext())
+    ''.join(root_element.find('./oai:GetRecord/oai:record/oai:header/oai:identifier', mappings.OAI_NS).itertext())
+    ''.join(root_element.find('./oai:GetRecord/oai:record/oai:header/oai:datestamp', mappings.OAI_NS).itertext())
+    prov_el = root_element.find('./oai:GetRecord/oai:record/oai:about/oai_p:provenance', mappings.OAI_NS)
+    origdesc_el = prov_el.find('./oai_p:originDescription', mappings.OAI_NS)
+    for path in ('./oai_p:baseURL', './oai_p:identifier', './oai_p:datestamp',
+                 './oai_p:metadataNamespace'):
+        ''.join(origdesc_el.find(path, mappings.OAI_NS).itertext())
+    origdesc_el.find('./oai_p:originDescription', mappings.OAI_NS)
+
+
+def compiled_lookups(root_element):
+    """Envelope lookups as made with precompiled paths."""
+    mappings._get_ddi_root_and_namespace_or_raise(root_element,
+                                                  mappings.DDI25RecordParser._metadata_roots)
+    prov_info = mappings.ProvenanceInfo(root_element, 'ddi:codebook:2_5')
+    prov_info.full()
+
+
+def _churn(element, distinct_paths):
+    for index in range(distinct_paths):
+        element.find(f'./oai:GetRecord/oai:record/oai:metadata/oai:churn{index}', mappings.OAI_NS)
+
+
+def main(argv=None):
+    """Run benchmark and print results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=20000,
+                        help='Number of simulated records.')
+    parser.add_argument('--distinct-paths', type=int, default=150,
+                        help='Number of distinct XPaths looked up between records '
+                        'to simulate DDI parsers. 0 disables churn.')
+    args = parser.parse_args(argv)
+    root_element = ElementTree.fromstring(ENVELOPE)
+    churn = timeit(lambda: _churn(root_element, args.distinct_paths), number=args.records)
+    results = {}
+    for name, func in (('xpath', xpath_lookups), ('compiled', compiled_lookups)):
+        elapsed = timeit(lambda func=func: (_churn(root_element, args.distinct_paths),
+                                            func(root_element)),
+                         number=args.records)
+        results[name] = max(elapsed - churn, 0) / args.records * 1e6
+        print(f'{name:>10}: {results[name]:8.2f} us/record')
+    print(f'{"saving":>10}: {results["xpath"] - results["compiled"]:8.2f} us/record')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark provenance chain extraction with deep chains.
+
+Times :meth:`cdcagg_common.mappings.ProvenanceInfo.full` for
+increasingly deep chains of nested ``oai_p:originDescription``
+elements. Time per level stays constant when extraction is linear.
+"""
+import argparse
+from timeit import timeit
+from xml.etree import ElementTree
+
+from cdcagg_common import mappings
+from benchmarks import corpus
+
+
+def provenance_chain(depth):
+    """Build OAI-PMH GetRecord root element with a provenance chain.
+
+    :param int depth: Number of nested originDescription elements.
+    :returns: XML root node.
+    :rtype: :obj:`xml.etree.ElementTree.Element`
+    """
+    return ElementTree.fromstring(corpus.get_record('ddi25', 0, variables=0, languages=1,
+                                                    provenance_depth=depth))
+
+
+def main(argv=None):
+    """Run benchmark and print results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--depths', type=int, nargs='+', default=[10, 100, 1000, 10000],
+                        help='Provenance chain depths to benchmark.')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='Number of extractions per depth.')
+    args = parser.parse_args(argv)
+    print(f'{"depth":>8} {"ms/record":>12} {"us/level":>10}')
+    for depth in args.depths:
+        root_element = provenance_chain(depth)
+        context = mappings.HarvestContext(max_provenance_depth=depth)
+        elapsed = timeit(lambda: mappings.ProvenanceInfo(root_element, 'ddi:codebook:2_5', context).full(),
+                         number=args.repeat) / args.repeat
+        print(f'{depth:>8} {elapsed * 1e3:>12.3f} {elapsed / depth * 1e6:>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
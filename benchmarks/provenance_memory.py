@@ -0,0 +1,86 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark memory of bulk-loaded studies with repeating provenance.
+
+Loads studies from an NDJSON stream where every record has the same
+base URLs, metadata namespace and harvest dates, and reports memory
+retained by the loaded studies traced with :mod:`tracemalloc`. Run
+with ``--no-intern`` to compare to loading without interning.
+"""
+import argparse
+import json
+import tracemalloc
+from io import BytesIO
+from unittest import mock
+
+from cdcagg_common import records
+
+
+def ndjson(count, harvests=5, chain=2):
+    """Build NDJSON stream of records with repeating provenance.
+
+    :param int count: Number of records.
+    :param int harvests: Number of harvest dates per record.
+    :param int chain: Provenance entries per harvest.
+    :returns: Stream.
+    :rtype: :obj:`io.BytesIO`
+    """
+    lines = []
+    for number in range(count):
+        provenances = [{'harvest_date': f'2000-01-0{harvest + 1}T00:00:00Z', 'altered': True,
+                        'base_url': f'http://some.base.url/{level}/oai',
+                        'identifier': f'oai:some.domain:{number}',
+                        'datestamp': '1999-01-01T00:00:00Z', 'direct': level == 0,
+                        'metadata_namespace': 'ddi:codebook:2_5'}
+                       for harvest in range(harvests) for level in range(chain)]
+        lines.append(json.dumps({'_provenance': provenances,
+                                 '_direct_base_url': 'http://some.base.url/0/oai',
+                                 '_aggregator_identifier': f'{number:064x}'}))
+    return BytesIO('\n'.join(lines).encode('utf8'))
+
+
+def measure(count):
+    """Measure memory retained by loaded studies.
+
+    :param int count: Number of studies to load.
+    :returns: Retained and peak bytes.
+    :rtype: tuple
+    """
+    stream = ndjson(count)
+    tracemalloc.start()
+    studies = list(records.Study.iter_from_stream(stream))
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del studies
+    return current, peak
+
+
+def main(argv=None):
+    """Run benchmark and print results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=10000,
+                        help='Number of records to load.')
+    parser.add_argument('--no-intern', action='store_true',
+                        help='Load without interning provenance values.')
+    args = parser.parse_args(argv)
+    if args.no_intern:
+        with mock.patch.object(records, '_intern', lambda value: value):
+            current, peak = measure(args.records)
+    else:
+        current, peak = measure(args.records)
+    print(f'records: {args.records}  retained KiB/record: {current / args.records / 1024:.2f}  '
+          f'peak MiB: {peak / 2**20:.1f}')
+
+
+if __name__ == '__main__':
+    main()
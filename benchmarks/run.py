@@ -0,0 +1,129 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark mapping throughput per parser class.
+
+Maps a synthetic corpus of OAI-PMH GetRecord responses for each
+supported DDI version and reports records per second, p50 and p99
+latency and peak RSS. Each parser class runs in its own process, so
+that peak RSS is measured per parser class.
+
+Each record is parsed from bytes, mapped with its parser class and
+exported with :meth:`cdcagg_common.records.RecordBase.export_dict`.
+The corpus is generated one record at a time and is not held in
+memory, so peak RSS reflects mapping only. Throughput is computed from
+the time spent mapping, excluding corpus generation.
+"""
+import argparse
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from xml.etree import ElementTree
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+from benchmarks import corpus
+
+
+def percentile(sorted_values, fraction):
+    """Get percentile from sorted values using nearest rank.
+
+    :param list sorted_values: Values in ascending order.
+    :param float fraction: Percentile as a fraction between 0 and 1.
+    :returns: Value at percentile.
+    """
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def peak_rss_kib():
+    """Get peak resident set size of the current process in KiB.
+
+    :returns: Peak RSS or None if it is not available on this platform.
+    :rtype: int or None
+    """
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere.
+    return maxrss // 1024 if sys.platform == 'darwin' else maxrss
+
+
+def bench_format(fmt, records, **kwargs):
+    """Map synthetic corpus of one format and measure it.
+
+    Keyword arguments are passed to :func:`benchmarks.corpus.get_record`.
+
+    :param str fmt: Format name. One of :data:`benchmarks.corpus.FORMATS`.
+    :param int records: Number of records to map.
+    :returns: Measurements.
+    :rtype: dict
+    """
+    parser_class = corpus.FORMATS[fmt][1]
+    source_bytes = 0
+    latencies = []
+    # Records are generated one at a time so that the corpus is never
+    # held in memory. Generation is excluded from the timings.
+    for source in corpus.corpus(fmt, records, **kwargs):
+        source_bytes += len(source)
+        record_start = perf_counter()
+        for study in parser_class(ElementTree.fromstring(source)).studies:
+            study.export_dict()
+        latencies.append(perf_counter() - record_start)
+    elapsed = sum(latencies)
+    latencies.sort()
+    return {'format': fmt,
+            'parser': parser_class.__name__,
+            'records': records,
+            'bytes_per_record': source_bytes // records,
+            'records_per_sec': records / elapsed,
+            'p50_ms': percentile(latencies, 0.5) * 1e3,
+            'p99_ms': percentile(latencies, 0.99) * 1e3,
+            'peak_rss_kib': peak_rss_kib()}
+
+
+def _format_row(result):
+    rss = result['peak_rss_kib']
+    return (f"{result['parser']:<28} {result['bytes_per_record']:>10} {result['records_per_sec']:>12.1f} "
+            f"{result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f} "
+            f"{'n/a' if rss is None else rss // 1024:>9}")
+
+
+def main(argv=None):
+    """Run benchmarks and print results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--formats', nargs='+', choices=sorted(corpus.FORMATS),
+                        default=list(corpus.FORMATS), help='Formats to benchmark.')
+    parser.add_argument('--records', type=int, default=1000,
+                        help='Number of records per format.')
+    parser.add_argument('--variables', type=int, default=50,
+                        help='Number of variables per record.')
+    parser.add_argument('--languages', type=int, default=2,
+                        help='Number of languages of localized elements.')
+    parser.add_argument('--provenance-depth', type=int, default=1,
+                        help='Depth of the provenance chain per record.')
+    args = parser.parse_args(argv)
+    print(f"{'parser':<28} {'bytes/rec':>10} {'records/s':>12} {'p50 ms':>9} {'p99 ms':>9} {'rss MiB':>9}")
+    for fmt in args.formats:
+        # Fresh process per format so that peak RSS is per parser class.
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            result = executor.submit(bench_format, fmt, args.records, variables=args.variables,
+                                     languages=args.languages,
+                                     provenance_depth=args.provenance_depth).result()
+        print(_format_row(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark validation of Study documents.
+
+Compares the cached compiled validator to validation through record
+instantiation, which imports the document into the record fields. If
+Cerberus is installed, also compares to a Cerberus schema built from
+the record fields, like the schema DocStore validates with.
+"""
+import argparse
+from timeit import timeit
+from xml.etree import ElementTree
+
+try:
+    import cerberus
+except ImportError:
+    cerberus = None
+
+from cdcagg_common import (
+    mappings,
+    validation
+)
+from cdcagg_common.records import Study
+from benchmarks import corpus
+
+
+def cerberus_schema(record_class):
+    """Build Cerberus schema from the fields of a record class.
+
+    :param record_class: Record class whose fields are validated.
+    :returns: Cerberus schema.
+    :rtype: dict
+    """
+    schema = {}
+    for _, factory in record_class.record_fields():
+        keys = validation.field_keys(factory)
+        if keys:
+            item = {'type': 'dict', 'nullable': True,
+                    'schema': {key: {'nullable': True} for key in keys}}
+            if factory.sub_name:
+                item['schema'][factory.sub_name]['required'] = True
+        else:
+            item = {'nullable': True}
+        schema[factory.name] = item if factory.single_value else {'type': 'list', 'schema': item}
+    return schema
+
+
+def main(argv=None):
+    """Run benchmark and print results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--variables', type=int, nargs='+', default=[10, 100, 1000],
+                        help='Number of variables in the study.')
+    parser.add_argument('--number', type=int, default=1000,
+                        help='Number of validations per measurement.')
+    args = parser.parse_args(argv)
+    validator = Study.validator()
+    validators = [('instantiate us', Study)]
+    if cerberus is not None:
+        validators.append(('cerberus us', cerberus.Validator(cerberus_schema(Study)).validate))
+    validators.append(('compiled us', validator.validate))
+    print(f'{"variables":>10} ' + ' '.join(f'{name:>16}' for name, _ in validators))
+    for variables in args.variables:
+        root_element = ElementTree.fromstring(corpus.get_record('ddi25', 0, variables=variables))
+        study = next(iter(mappings.get_parser(root_element).studies))
+        document = study.export_dict(include_metadata=False, include_id=False)
+        assert validator.is_valid(document), validator.validate(document)
+        results = [timeit(lambda func=func: func(document), number=args.number) / args.number
+                   for _, func in validators]
+        print(f'{variables:>10} ' + ' '.join(f'{result * 1e6:>16.2f}' for result in results))
+
+
+if __name__ == '__main__':
+    main()
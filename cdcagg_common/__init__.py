@@ -34,6 +34,15 @@ def list_collection_names():
     return [Study.get_collection()]
 
 
+def list_indexes():
+    """List indexes of all collections.
+
+    :returns: Index specifications by collection name.
+    :rtype: dict
+    """
+    return {rec.get_collection(): list(rec.list_indexes()) for rec in list_records()}
+
+
 def record_by_collection_name(collname):
     """Get record class by collection name
 
@@ -0,0 +1,208 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Map raw OAI-PMH records in batches using a process pool.
+
+Each raw OAI-PMH GetRecord payload is parsed and mapped by the
+parser registered for its metadata in :mod:`cdcagg_common.mappings`.
+Results are exported as dictionaries with
+:meth:`cdcagg_common.records.RecordBase.export_dict`.
+"""
+import os
+import traceback
+from collections import (
+    deque,
+    namedtuple
+)
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    FIRST_COMPLETED,
+    wait
+)
+from itertools import islice
+from xml.etree import ElementTree
+
+from cdcagg_common import instrumentation
+from cdcagg_common.mappings import (
+    get_parser_class,
+    HarvestContext,
+    RecordDeleted,
+    _instantiate_parser
+)
+
+
+#: Result of mapping a single source.
+#:
+#: :index: Position of the source in the sequence of sources.
+#: :records: List of exported record dictionaries or None on error
+#:           or deletion.
+#: :error: :obj:`RecordError` or None on success.
+#: :tombstone: :obj:`cdcagg_common.mappings.Tombstone` if the source
+#:             is a deleted record, otherwise None.
+MappingResult = namedtuple('MappingResult', ['index', 'records', 'error', 'tombstone'],
+                           defaults=(None,))
+
+#: Error captured while mapping a single source. Holds the exception
+#: type name, exception message and formatted traceback, so that it
+#: can be passed between processes regardless of the exception type.
+RecordError = namedtuple('RecordError', ['exception_type', 'message', 'traceback'])
+
+
+def map_record(source, context=None):
+    """Parse and map a single raw OAI-PMH GetRecord payload.
+
+    :param source: XML payload.
+    :type source: str or bytes
+    :param context: Harvest batch context passed to the parser.
+    :type context: :obj:`cdcagg_common.mappings.HarvestContext` or None
+    :returns: Exported records.
+    :rtype: list
+    :raises: :exc:`cdcagg_common.mappings.RecordDeleted` if the
+             payload is a deleted record.
+    :raises: :exc:`kuha_common.document_store.mappings.exceptions.UnknownXMLRoot`
+             if there is no parser for the payload.
+    """
+    return _map_record(source, context)
+
+
+def _map_record(source, context, explicit=True):
+    # A context created for a batch is passed only to parsers accepting it.
+    start = instrumentation.clock()
+    root_element = ElementTree.fromstring(source)
+    end = instrumentation.clock()
+    parser = _instantiate_parser(get_parser_class(root_element, context), root_element,
+                                 context, explicit, len(source))
+    instrumentation.observe(instrumentation.STAGE_PARSE, start, type(parser),
+                            getattr(parser, 'base_url', None), end)
+    return [study.export_dict() for study in parser.studies]
+
+
+def _map_chunk(chunk, harvest_date, fingerprint_sources=False):
+    context = HarvestContext(harvest_date, fingerprint_sources=fingerprint_sources)
+    results = []
+    for index, source in chunk:
+        try:
+            records = _map_record(source, context, explicit=False)
+        except RecordDeleted as exc:
+            results.append(MappingResult(index, None, None, exc.tombstone))
+        except Exception as exc:  # pylint: disable=broad-except
+            results.append(MappingResult(index, None, RecordError(
+                type(exc).__name__, str(exc), traceback.format_exc())))
+        else:
+            results.append(MappingResult(index, records, None))
+    return results
+
+
+def _map_chunk_recorded(chunk, harvest_date, fingerprint_sources=False):
+    # Runs in a worker process. Measurements are returned with the
+    # results and replayed into the sink of the calling process.
+    recorder = instrumentation.Recorder()
+    instrumentation.enable(recorder)
+    try:
+        return _map_chunk(chunk, harvest_date, fingerprint_sources), recorder
+    finally:
+        instrumentation.disable()
+
+
+def _chunk_results(future):
+    results = future.result()
+    if isinstance(results, tuple):
+        results, recorder = results
+        instrumentation.replay(recorder)
+    return results
+
+
+def _chunked(iterable, chunksize):
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, chunksize))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, chunksize))
+
+
+def _drain(pending, ordered):
+    if ordered:
+        yield from _chunk_results(pending.popleft())
+        return
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        pending.remove(future)
+        yield from _chunk_results(future)
+
+
+def map_records(sources, workers=None, chunksize=16, ordered=True, max_pending=None,
+                harvest_date=None, fingerprint_sources=False):
+    """Parse and map raw OAI-PMH GetRecord payloads in a process pool.
+
+    Sources are consumed lazily and submitted to the pool in chunks.
+    At most max_pending chunks are in flight at any time, so memory
+    consumption is bounded regardless of the number of sources.
+
+    All records of the batch share the same harvest date.
+
+    Errors are captured per source. A source that fails to parse
+    or map yields a :obj:`MappingResult` with error set and does
+    not affect other sources in the batch.
+
+    If instrumentation is enabled when a chunk is submitted, the
+    worker records its measurements and they are replayed into the
+    sink of the calling process as the results of the chunk are
+    yielded.
+
+    :param sources: Iterable of raw OAI-PMH GetRecord payloads.
+    :param int or None workers: Number of worker processes. Defaults
+                                to the number of CPUs. Use 0 to map in
+                                the current process without a pool.
+    :param int chunksize: Number of sources submitted to a worker at once.
+    :param bool ordered: Yield results in the order of sources. If
+                         False, results are yielded as chunks finish.
+    :param int or None max_pending: Maximum number of chunks in flight.
+                                    Defaults to twice the number of workers.
+    :param str or None harvest_date: Harvest date as datestamp.
+                                     Defaults to current time.
+    :param bool fingerprint_sources: Set the fingerprint of the source
+                                     metadata to every mapped record.
+    :returns: Generator yielding :obj:`MappingResult` for each source.
+    :rtype: :obj:`generator`
+    :raises: :exc:`ValueError` if workers is negative or chunksize or
+             max_pending is less than one.
+    """
+    if chunksize < 1:
+        raise ValueError("chunksize must be a positive integer")
+    if workers is not None and workers < 0:
+        raise ValueError("workers must not be negative")
+    if max_pending is not None and max_pending < 1:
+        raise ValueError("max_pending must be a positive integer")
+    harvest_date = HarvestContext(harvest_date).harvest_date
+    return _map_records(sources, workers, chunksize, ordered, max_pending, harvest_date,
+                        fingerprint_sources)
+
+
+def _map_records(sources, workers, chunksize, ordered, max_pending, harvest_date,
+                 fingerprint_sources):
+    chunks = _chunked(enumerate(sources), chunksize)
+    if workers == 0:
+        for chunk in chunks:
+            yield from _map_chunk(chunk, harvest_date, fingerprint_sources)
+        return
+    workers = workers or os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = 2 * workers
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk in chunks:
+            map_chunk = _map_chunk_recorded if instrumentation.is_enabled() else _map_chunk
+            pending.append(executor.submit(map_chunk, chunk, harvest_date, fingerprint_sources))
+            while len(pending) >= max_pending:
+                yield from _drain(pending, ordered)
+        while pending:
+            yield from _drain(pending, ordered)
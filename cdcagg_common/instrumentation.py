@@ -0,0 +1,379 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Opt-in instrumentation of the mapping hot path.
+
+Timers and counters are placed around the stages of mapping a
+record:
+
+* :data:`STAGE_PARSE` parsing XML into an element tree.
+* :data:`STAGE_PROVENANCE` reading provenance info from the
+  OAI-PMH envelope. Observed twice per source record: reading the
+  direct provenance when the parser is instantiated and reading the
+  chain of indirect provenances when studies are mapped.
+* :data:`STAGE_MAP` mapping DDI metadata to record fields,
+  including adding provenance to the records.
+* :data:`STAGE_EXPORT` exporting a record with
+  :meth:`cdcagg_common.records.RecordBase.export_dict`.
+
+Stages do not overlap, so stage totals add up to no more than the
+total time spent.
+
+Measurements are keyed by source class name (parser class or record
+class) and endpoint base URL, and passed to a pluggable sink.
+Instrumentation is disabled by default. While disabled, the hooks
+only check a module-level variable and never read a clock.
+
+The sink is per process. Worker processes record measurements with
+a :class:`Recorder`, which is passed back to the calling process and
+replayed into its sink with :func:`replay`.
+:func:`cdcagg_common.batch.map_records` does this for its workers.
+
+Enable with a sink::
+
+    from cdcagg_common import instrumentation
+    aggregator = instrumentation.Aggregator()
+    instrumentation.enable(aggregator)
+    ...  # map a batch
+    instrumentation.disable()
+    print(aggregator.report())
+"""
+from bisect import bisect_left
+from time import perf_counter
+
+
+STAGE_PARSE = 'parse'
+STAGE_PROVENANCE = 'provenance'
+STAGE_MAP = 'map'
+STAGE_EXPORT = 'export'
+
+#: Default upper bounds of histogram buckets in seconds.
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_sink = None
+
+
+class Sink:
+    """Base class for instrumentation sinks.
+
+    Subclass and override :meth:`timing` and :meth:`count`.
+    """
+
+    def timing(self, stage, source, base_url, seconds):
+        """Receive time spent in a stage.
+
+        :param str stage: Stage name.
+        :param str source: Name of the parser or record class.
+        :param str or None base_url: Endpoint base URL.
+        :param float seconds: Elapsed time.
+        """
+
+    def count(self, name, source, base_url, value):
+        """Receive counter increment.
+
+        :param str name: Counter name.
+        :param str or None source: Name of the parser or record class.
+        :param str or None base_url: Endpoint base URL.
+        :param int value: Increment.
+        """
+
+
+def enable(sink):
+    """Enable instrumentation.
+
+    :param sink: Sink receiving measurements.
+    :type sink: :obj:`Sink`
+    """
+    global _sink  # pylint: disable=global-statement
+    _sink = sink
+
+
+def disable():
+    """Disable instrumentation."""
+    global _sink  # pylint: disable=global-statement
+    _sink = None
+
+
+def is_enabled():
+    """Check whether instrumentation is enabled.
+
+    :rtype: bool
+    """
+    return _sink is not None
+
+
+def replay(recorder):
+    """Submit measurements recorded elsewhere to the enabled sink.
+
+    Does nothing if instrumentation is disabled.
+
+    :param recorder: Recorded measurements.
+    :type recorder: :obj:`Recorder`
+    """
+    sink = _sink
+    if sink is not None:
+        recorder.replay(sink)
+
+
+def _source_name(source):
+    if source is None or isinstance(source, str):
+        return source
+    return getattr(source, '__name__', type(source).__name__)
+
+
+def clock():
+    """Start timing a stage.
+
+    :returns: Start time or None if instrumentation is disabled.
+    :rtype: float or None
+    """
+    return None if _sink is None else perf_counter()
+
+
+def observe(stage, start, source, base_url=None, end=None):
+    """Submit time elapsed since start.
+
+    Does nothing if start is None, i.e. instrumentation was disabled
+    when :func:`clock` was called.
+
+    :param str stage: Stage name.
+    :param float or None start: Return value of :func:`clock`.
+    :param source: Parser or record class or its name.
+    :param str or None base_url: Endpoint base URL.
+    :param float or None end: Return value of :func:`clock` when the
+                              stage ended. Defaults to current time.
+    """
+    sink = _sink
+    if start is None or sink is None:
+        return
+    sink.timing(stage, _source_name(source), base_url,
+                (perf_counter() if end is None else end) - start)
+
+
+def count(name, source=None, base_url=None, value=1):
+    """Increment counter.
+
+    :param str name: Counter name.
+    :param source: Parser or record class or its name.
+    :param str or None base_url: Endpoint base URL.
+    :param int value: Increment.
+    """
+    sink = _sink
+    if sink is not None:
+        sink.count(name, _source_name(source), base_url, value)
+
+
+class _NullTimer:
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+
+    __slots__ = ('_stage', '_source', '_base_url', '_start')
+
+    def __init__(self, stage, source, base_url):
+        self._stage = stage
+        self._source = source
+        self._base_url = base_url
+        self._start = None
+
+    def __enter__(self):
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        observe(self._stage, self._start, self._source, self._base_url)
+        return False
+
+
+def timed(stage, source, base_url=None):
+    """Context manager timing a stage.
+
+    :param str stage: Stage name.
+    :param source: Parser or record class or its name.
+    :param str or None base_url: Endpoint base URL.
+    :returns: Context manager.
+    """
+    if _sink is None:
+        return _NULL_TIMER
+    return _Timer(stage, source, base_url)
+
+
+def timed_iter(stage, iterable, source, base_url=None):
+    """Time each step of an iteration.
+
+    If instrumentation is disabled, returns the iterable as is.
+
+    :param str stage: Stage name.
+    :param iterable: Iterable to time.
+    :param source: Parser or record class or its name.
+    :param str or None base_url: Endpoint base URL.
+    :returns: Iterable yielding the same items.
+    """
+    if _sink is None:
+        return iterable
+    return _timed_iter(stage, iterable, source, base_url)
+
+
+def _timed_iter(stage, iterable, source, base_url):
+    iterator = iter(iterable)
+    while True:
+        start = perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        observe(stage, start, source, base_url)
+        yield item
+
+
+class Recorder(Sink):
+    """Sink recording measurements as they are received.
+
+    Recorders are picklable, so measurements taken in a worker
+    process can be returned to the calling process and replayed
+    into its sink.
+    """
+
+    def __init__(self):
+        """Initiate Recorder."""
+        self.timings = []
+        self.counts = []
+
+    def timing(self, stage, source, base_url, seconds):
+        self.timings.append((stage, source, base_url, seconds))
+
+    def count(self, name, source, base_url, value):
+        self.counts.append((name, source, base_url, value))
+
+    def replay(self, sink):
+        """Submit recorded timings and then recorded counts to sink.
+
+        :param sink: Sink receiving measurements.
+        :type sink: :obj:`Sink`
+        """
+        for timing in self.timings:
+            sink.timing(*timing)
+        for count_ in self.counts:
+            sink.count(*count_)
+
+
+class StageStats:
+    """Aggregated timings of a stage for one source and base URL."""
+
+    __slots__ = ('count', 'total', 'max', 'histogram', '_buckets')
+
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        #: Counts per bucket. The last item counts values above all buckets.
+        self.histogram = [0] * (len(buckets) + 1)
+
+    def add(self, seconds):
+        """Add a timing.
+
+        :param float seconds: Elapsed time.
+        """
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.histogram[bisect_left(self._buckets, seconds)] += 1
+
+    @property
+    def mean(self):
+        """Mean time in seconds.
+
+        :rtype: float
+        """
+        return self.total / self.count if self.count else 0.0
+
+
+class Aggregator(Sink):
+    """Sink aggregating totals and histograms in memory.
+
+    Timings are aggregated per (stage, source, base_url) and
+    counters per (name, source, base_url).
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """Initiate Aggregator.
+
+        :param tuple buckets: Upper bounds of histogram buckets in seconds
+                              in ascending order.
+        """
+        self.buckets = tuple(buckets)
+        self.stages = {}
+        self.counters = {}
+
+    def timing(self, stage, source, base_url, seconds):
+        key = (stage, source, base_url)
+        stats = self.stages.get(key)
+        if stats is None:
+            stats = self.stages[key] = StageStats(self.buckets)
+        stats.add(seconds)
+
+    def count(self, name, source, base_url, value):
+        key = (name, source, base_url)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def stage_totals(self):
+        """Get totals per stage over all sources and base URLs.
+
+        :returns: Stage name mapped to (count, total seconds).
+        :rtype: dict
+        """
+        totals = {}
+        for (stage, _, _), stats in self.stages.items():
+            count_, total = totals.get(stage, (0, 0.0))
+            totals[stage] = (count_ + stats.count, total + stats.total)
+        return totals
+
+    def reset(self):
+        """Discard aggregated values."""
+        self.stages.clear()
+        self.counters.clear()
+
+    def report(self):
+        """Format aggregated values as a text report.
+
+        :returns: Report
+        :rtype: str
+        """
+        lines = [f"{'stage':<12} {'source':<28} {'base_url':<40} {'count':>8} "
+                 f"{'total s':>10} {'mean ms':>10} {'max ms':>10}"]
+        for (stage, source, base_url), stats in sorted(self.stages.items(),
+                                                       key=lambda item: tuple(str(k) for k in item[0])):
+            lines.append(f'{stage:<12} {str(source):<28} {str(base_url):<40} {stats.count:>8} '
+                         f'{stats.total:>10.3f} {stats.mean * 1e3:>10.3f} {stats.max * 1e3:>10.3f}')
+            bounds = [f'<={bound}' for bound in self.buckets] + [f'>{self.buckets[-1]}']
+            lines.append('    histogram: ' + ' '.join(f'{bound}:{value}' for bound, value
+                                                      in zip(bounds, stats.histogram) if value))
+        for stage, (count_, total) in sorted(self.stage_totals().items()):
+            lines.append(f'total {stage}: {count_} in {total:.3f} s')
+        for (name, source, base_url), value in sorted(self.counters.items(),
+                                                      key=lambda item: tuple(str(k) for k in item[0])):
+            lines.append(f'counter {name} {source} {base_url}: {value}')
+        return '\n'.join(lines)
@@ -12,8 +12,17 @@
 # limitations under the License.
 """XML parsers that read XML and map the metadata to CDCAGG records.
 """
+import sys
+import inspect
+from io import BytesIO
+from weakref import (
+    WeakKeyDictionary,
+    WeakSet
+)
+from collections import namedtuple
 from hashlib import sha256
 from urllib.parse import quote_plus
+from xml.etree import ElementTree
 from kuha_common.document_store.mappings import (
     ddi,
     exceptions
@@ -22,25 +31,193 @@ from kuha_common.document_store.records import (
     datetime_now,
     datetime_to_datestamp
 )
-from cdcagg_common.records import Study
+from cdcagg_common import instrumentation
+from cdcagg_common.records import (
+    Study,
+    intern_provenance
+)
 
 
 OAI_NS = {'oai': 'http://www.openarchives.org/OAI/2.0/',
           'oai_p': 'http://www.openarchives.org/OAI/2.0/provenance'}
 
+_OAI_PMH_TAG = '{http://www.openarchives.org/OAI/2.0/}OAI-PMH'
+_OAI_REQUEST_TAG = '{http://www.openarchives.org/OAI/2.0/}request'
+_OAI_GETRECORD_TAG = '{http://www.openarchives.org/OAI/2.0/}GetRecord'
+_OAI_LISTRECORDS_TAG = '{http://www.openarchives.org/OAI/2.0/}ListRecords'
+_OAI_RECORD_TAG = '{http://www.openarchives.org/OAI/2.0/}record'
+_OAI_HEADER_TAG = '{http://www.openarchives.org/OAI/2.0/}header'
+_OAI_METADATA_TAG = '{http://www.openarchives.org/OAI/2.0/}metadata'
+
+
+class _CompiledPath:
+    """Path of child elements compiled once to fully qualified tags.
+
+    :meth:`xml.etree.ElementTree.Element.find` with a prefixed path
+    and a namespaces dictionary goes through the ElementPath
+    tokenizer and its size-limited cache on every call. The compiled
+    path resolves prefixes once and steps through the tree one child
+    tag at a time, which never involves ElementPath.
+
+    Supports only paths of prefixed child elements separated by '/',
+    such as ``oai:GetRecord/oai:record``.
+    """
+
+    __slots__ = ('_tags',)
+
+    def __init__(self, path, namespaces=None):
+        """Compile path.
+
+        :param str path: Path of prefixed element names separated by '/'.
+        :param dict or None namespaces: Prefix to namespace mapping.
+                                        Defaults to :data:`OAI_NS`.
+        """
+        namespaces = OAI_NS if namespaces is None else namespaces
+        tags = []
+        for step in path.split('/'):
+            prefix, local_name = step.split(':')
+            tags.append(f'{{{namespaces[prefix]}}}{local_name}')
+        self._tags = tuple(tags)
+
+    def find(self, element):
+        """Find first matching element.
+
+        :param element: Element to start from.
+        :type element: :obj:`xml.etree.ElementTree.Element`
+        :returns: Matching element or None if not found.
+        :rtype: :obj:`xml.etree.ElementTree.Element` or None
+        """
+        for tag in self._tags:
+            element = element.find(tag)
+            if element is None:
+                return None
+        return element
+
+    def text(self, element):
+        """Get all inner text of first matching element.
+
+        :param element: Element to start from.
+        :type element: :obj:`xml.etree.ElementTree.Element`
+        :returns: Inner text of the matching element.
+        :rtype: str
+        :raises: :exc:`AttributeError` if there is no matching element.
+        """
+        return ''.join(self.find(element).itertext())
+
+
+_REQUEST_PATH = _CompiledPath('oai:request')
+_HEADER_PATH = _CompiledPath('oai:GetRecord/oai:record/oai:header')
+_IDENTIFIER_PATH = _CompiledPath('oai:identifier')
+_DATESTAMP_PATH = _CompiledPath('oai:datestamp')
+_METADATA_PATH = _CompiledPath('oai:GetRecord/oai:record/oai:metadata')
+_PROVENANCE_PATH = _CompiledPath('oai:GetRecord/oai:record/oai:about/oai_p:provenance')
+_ORIGIN_DESCRIPTION_PATH = _CompiledPath('oai_p:originDescription')
+_ORIGIN_BASE_URL_PATH = _CompiledPath('oai_p:baseURL')
+_ORIGIN_IDENTIFIER_PATH = _CompiledPath('oai_p:identifier')
+_ORIGIN_DATESTAMP_PATH = _CompiledPath('oai_p:datestamp')
+_ORIGIN_METADATA_NAMESPACE_PATH = _CompiledPath('oai_p:metadataNamespace')
+
+
+#: Default maximum number of nested ``oai_p:originDescription`` elements.
+MAX_PROVENANCE_DEPTH = 100
 
-def _indirect_provenances_from_oaixml(origdesc_el):
-    provenances = [{'harvest_date': origdesc_el.get('harvestDate'),
-                    'altered': origdesc_el.get('altered') == 'true',
-                    'direct': False,
-                    'base_url': ''.join(origdesc_el.find('./oai_p:baseURL', OAI_NS).itertext()),
-                    'identifier': ''.join(origdesc_el.find('./oai_p:identifier', OAI_NS).itertext()),
-                    'datestamp': ''.join(origdesc_el.find('./oai_p:datestamp', OAI_NS).itertext()),
-                    'metadata_namespace': ''.join(origdesc_el.find('./oai_p:metadataNamespace', OAI_NS).itertext())}]
-    nested_origdesc_el = origdesc_el.find('./oai_p:originDescription', OAI_NS)
-    if nested_origdesc_el is not None:
-        provenances.extend(_indirect_provenances_from_oaixml(nested_origdesc_el))
-    return provenances
+
+class ProvenanceDepthExceeded(ValueError):
+    """Raised when a provenance chain is nested deeper than allowed."""
+
+    def __init__(self, max_depth):
+        super().__init__(f"Provenance chain exceeds maximum depth of {max_depth} "
+                         "nested originDescription elements")
+        self.max_depth = max_depth
+
+
+class HarvestContext:
+    """Values shared by all records mapped in one harvest batch.
+
+    Pass the same context to all parsers of a batch to give the
+    records a consistent harvest date and to share per-batch work
+    between them: the harvest date is computed once, base URLs and
+    metadata namespaces are interned and the hash state of each
+    base URL is reused for aggregator identifiers.
+    """
+
+    def __init__(self, harvest_date=None, max_provenance_depth=MAX_PROVENANCE_DEPTH,
+                 fingerprint_sources=False):
+        """Initiate HarvestContext.
+
+        :param str or None harvest_date: Harvest date as datestamp.
+                                         Defaults to current time.
+        :param int max_provenance_depth: Maximum number of nested
+                                         ``oai_p:originDescription``
+                                         elements read per record.
+        :param bool fingerprint_sources: Set the fingerprint of the
+                                         source metadata to every
+                                         mapped study.
+        :returns: Instance of HarvestContext
+        :rtype: :obj:`HarvestContext`
+        """
+        self.harvest_date = harvest_date or datetime_to_datestamp(datetime_now())
+        self.max_provenance_depth = max_provenance_depth
+        self.fingerprint_sources = fingerprint_sources
+        self._base_url_hashes = {}
+
+    @staticmethod
+    def intern(value):
+        """Intern a string which repeats across records.
+
+        :param str or None value: Value to intern.
+        :returns: Interned value.
+        :rtype: str or None
+        """
+        return None if value is None else sys.intern(value)
+
+    def aggregator_identifier(self, oai_base_url, oai_identifier):
+        """Generate aggregator identifier.
+
+        Gives the same result as :func:`_generate_aggregator_identifier`,
+        but hashes each base URL only once per context.
+
+        :param str oai_base_url: Direct OAI-PMH Base URL of source record.
+        :param str oai_identifier: Direct OAI Identifier of source record.
+        :returns: Hexadecimal notation of sha256 hash.
+        :rtype: str
+        """
+        base_hash = self._base_url_hashes.get(oai_base_url)
+        if base_hash is None:
+            base_hash = self._base_url_hashes[oai_base_url] = sha256(f'{oai_base_url}-'.encode('utf8'))
+        hasher = base_hash.copy()
+        hasher.update(oai_identifier.encode('utf8'))
+        return hasher.hexdigest()
+
+
+def _append_indirect_provenances(provenances, origdesc_el, context):
+    """Walk nested originDescription elements and append to provenances.
+
+    The chain is walked iteratively, so its length is limited only
+    by :attr:`HarvestContext.max_provenance_depth`.
+
+    :param list provenances: List to append provenances to.
+    :param origdesc_el: Outermost originDescription element.
+    :type origdesc_el: :obj:`xml.etree.ElementTree.Element`
+    :param context: Harvest batch context.
+    :type context: :obj:`HarvestContext`
+    :raises: :exc:`ProvenanceDepthExceeded` if the chain is nested
+             deeper than allowed.
+    """
+    depth = 0
+    while origdesc_el is not None:
+        if depth == context.max_provenance_depth:
+            raise ProvenanceDepthExceeded(context.max_provenance_depth)
+        depth += 1
+        provenances.append({
+            'harvest_date': context.intern(origdesc_el.get('harvestDate')),
+            'altered': origdesc_el.get('altered') == 'true',
+            'direct': False,
+            'base_url': context.intern(_ORIGIN_BASE_URL_PATH.text(origdesc_el)),
+            'identifier': _ORIGIN_IDENTIFIER_PATH.text(origdesc_el),
+            'datestamp': _ORIGIN_DATESTAMP_PATH.text(origdesc_el),
+            'metadata_namespace': context.intern(_ORIGIN_METADATA_NAMESPACE_PATH.text(origdesc_el))})
+        origdesc_el = _ORIGIN_DESCRIPTION_PATH.find(origdesc_el)
 
 
 class ProvenanceInfo:
@@ -50,27 +227,29 @@ class ProvenanceInfo:
     :mod:`cdcagg_common.records` is accessible via record instances
     and does not use this class.
     """
-    def __init__(self, root_element, metadata_namespace):
+    def __init__(self, root_element, metadata_namespace, context=None):
         """Initiate ProvenanceInfo object with XML root element and
         direct source metadata namespace
 
         :param root_element: XML root node.
         :type root_element: :obj:`xml.etree.ElementTree.Element`
         :param str metadata_namespace: Direct metadata namespace.
+        :param context: Harvest batch context. Defaults to a new context.
+        :type context: :obj:`HarvestContext` or None
         :returns: Instance of ProvenanceInfo
         :rtype: :obj:`ProvenanceInfo`
         """
         self._root_element = root_element
+        self._context = HarvestContext() if context is None else context
         self._metadata_namespace = metadata_namespace
+        header_el = _HEADER_PATH.find(root_element)
         self._direct_provenance = {
-            'harvest_date': datetime_to_datestamp(datetime_now()),
+            'harvest_date': self._context.harvest_date,
             'altered': True, 'direct': True,
-            'metadata_namespace': metadata_namespace,
-            'base_url': ''.join(self._root_element.find('./oai:request', OAI_NS).itertext()),
-            'identifier': ''.join(self._root_element.find(
-                './oai:GetRecord/oai:record/oai:header/oai:identifier', OAI_NS).itertext()),
-            'datestamp': ''.join(self._root_element.find(
-                './oai:GetRecord/oai:record/oai:header/oai:datestamp', OAI_NS).itertext())
+            'metadata_namespace': self._context.intern(metadata_namespace),
+            'base_url': self._context.intern(_REQUEST_PATH.text(root_element)),
+            'identifier': _IDENTIFIER_PATH.text(header_el),
+            'datestamp': _DATESTAMP_PATH.text(header_el)
         }
 
     @property
@@ -91,6 +270,15 @@ class ProvenanceInfo:
         """
         return self._direct_provenance['identifier']
 
+    @property
+    def aggregator_identifier(self):
+        """Get aggregator identifier generated from direct base url and identifier.
+
+        :returns: Aggregator identifier.
+        :rtype: str
+        """
+        return self._context.aggregator_identifier(self.base_url, self.identifier)
+
     def full(self):
         """Get full provenance info including indirect provenances.
 
@@ -98,22 +286,224 @@ class ProvenanceInfo:
 
         :returns: Full provenance.
         :rtype: list
+        :raises: :exc:`ProvenanceDepthExceeded` if indirect provenances
+                 are nested deeper than allowed by the harvest context.
         """
         provenances = [self._direct_provenance]
-        prov_el = self._root_element.find('./oai:GetRecord/oai:record/oai:about/oai_p:provenance', OAI_NS)
+        prov_el = _PROVENANCE_PATH.find(self._root_element)
         if prov_el is not None:
-            provenances.extend(_indirect_provenances_from_oaixml(prov_el.find('./oai_p:originDescription', OAI_NS)))
+            _append_indirect_provenances(provenances, _ORIGIN_DESCRIPTION_PATH.find(prov_el),
+                                         self._context)
         return provenances
 
 
+_PARSER_REGISTRY = {}
+
+
+def register_parser(*metadata_root_tags):
+    """Class decorator to register a parser class for dispatching.
+
+    Registers the decorated parser class to handle OAI-PMH records
+    whose ``oai:metadata`` first child element has one of the given
+    tags. Tags are given in ``{namespace}tag`` notation. If no tags
+    are given, the tags are read from the ``_metadata_roots``
+    attribute of the parser class. Registering an already registered
+    tag overrides the previous registration.
+
+    Parser classes are instantiated with the root element. A harvest
+    batch context given by the caller is passed as keyword argument
+    ``context``. A context created internally, as in
+    :func:`iter_list_records`, is passed only to parsers whose
+    signature accepts ``context``. Parsers that accept only the root
+    element keep working when the caller gives no context.
+
+    :param str metadata_root_tags: Metadata root element tags.
+    :returns: Decorator which registers and returns the parser class.
+    """
+    def _register(parser_class):
+        for tag in metadata_root_tags or (tag for tag, _ in parser_class._metadata_roots):
+            _PARSER_REGISTRY[tag] = parser_class
+        return parser_class
+    return _register
+
+
+def _first_child_tag(element):
+    return element[0].tag if element is not None and len(element) != 0 else None
+
+
+def _metadata_root_tag(root_element):
+    return _first_child_tag(_METADATA_PATH.find(root_element))
+
+
+def get_parser_class(root_element, context=None):
+    """Get registered parser class for OAI-PMH GetRecord root element.
+
+    Looks up the tag of the first child of ``oai:metadata`` from the
+    registered parsers.
+
+    :param root_element: XML root node.
+    :type root_element: :obj:`xml.etree.ElementTree.Element`
+    :param context: Harvest batch context used for tombstones.
+    :type context: :obj:`HarvestContext` or None
+    :returns: Parser class registered for the metadata root tag.
+    :raises: :exc:`RecordDeleted` if the record is deleted.
+    :raises: :exc:`kuha_common.document_store.mappings.exceptions.UnknownXMLRoot`
+             if root element is not OAI-PMH or there is no parser registered
+             for the metadata root tag.
+    """
+    _expect_oai_pmh_root(root_element)
+    tombstone = get_tombstone(root_element, context)
+    if tombstone is not None:
+        instrumentation.count('records_deleted')
+        raise RecordDeleted(tombstone, *_PARSER_REGISTRY)
+    tag = _metadata_root_tag(root_element)
+    parser_class = _PARSER_REGISTRY.get(tag)
+    if parser_class is None:
+        instrumentation.count('unknown_xml_root')
+        raise exceptions.UnknownXMLRoot(tag, *_PARSER_REGISTRY)
+    return parser_class
+
+
+def get_parser(root_element, context=None):
+    """Instantiate registered parser for OAI-PMH GetRecord root element.
+
+    :param root_element: XML root node.
+    :type root_element: :obj:`xml.etree.ElementTree.Element`
+    :param context: Harvest batch context passed to the parser.
+    :type context: :obj:`HarvestContext` or None
+    :returns: Parser instance.
+    :raises: :exc:`kuha_common.document_store.mappings.exceptions.UnknownXMLRoot`
+             if no parser is registered for the metadata root tag.
+    """
+    return _instantiate_parser(get_parser_class(root_element, context), root_element, context)
+
+
+_ACCEPTS_CONTEXT = WeakKeyDictionary()
+
+
+def _accepts_context(parser_class):
+    accepts = _ACCEPTS_CONTEXT.get(parser_class)
+    if accepts is None:
+        try:
+            parameters = inspect.signature(parser_class).parameters.values()
+        except (TypeError, ValueError):
+            accepts = False
+        else:
+            accepts = any(parameter.name == 'context' or parameter.kind is parameter.VAR_KEYWORD
+                          for parameter in parameters)
+        _ACCEPTS_CONTEXT[parser_class] = accepts
+    return accepts
+
+
+#: Root elements whose raw payload size is counted by the caller
+#: instead of the parser.
+_PAYLOAD_COUNTED = WeakSet()
+
+
+def _instantiate_parser(parser_class, root_element, context, explicit=True, payload_size=None):
+    """Instantiate parser with context if appropriate.
+
+    An explicitly given context is always passed. A context created
+    internally is passed only to parsers whose signature accepts
+    ``context``, so parsers taking only the root element keep working.
+
+    If payload_size is given, it is counted as bytes processed by
+    the parser instead of the size the parser would count.
+    """
+    if payload_size is not None and instrumentation.is_enabled():
+        _PAYLOAD_COUNTED.add(root_element)
+    if context is None or not (explicit or _accepts_context(parser_class)):
+        parser = parser_class(root_element)
+    else:
+        parser = parser_class(root_element, context=context)
+    if payload_size is not None:
+        instrumentation.count('bytes_processed', type(parser), getattr(parser, 'base_url', None),
+                              payload_size)
+    return parser
+
+
+def _count_parsed_bytes(parser, root_element, base_url):
+    # Parsers instantiated directly count the serialized size of the
+    # element tree, since the raw payload is not available to them.
+    if instrumentation.is_enabled() and root_element not in _PAYLOAD_COUNTED:
+        size = len(ElementTree.tostring(root_element, encoding='unicode').encode('utf8'))
+        instrumentation.count('bytes_processed', type(parser), base_url, size)
+
+
 def _expect_oai_pmh_root(root_element):
-    exp_root_tag = '{http://www.openarchives.org/OAI/2.0/}OAI-PMH'
-    if root_element.tag != exp_root_tag:
-        raise exceptions.UnknownXMLRoot(root_element.tag, exp_root_tag)
+    if root_element.tag != _OAI_PMH_TAG:
+        raise exceptions.UnknownXMLRoot(root_element.tag, _OAI_PMH_TAG)
+
+
+def _get_ddi_root_and_namespace_or_raise(root_element, metadata_roots, context=None):
+    """Find DDI root element from OAI-PMH GetRecord envelope.
+
+    :param root_element: XML root node.
+    :type root_element: :obj:`xml.etree.ElementTree.Element`
+    :param tuple metadata_roots: Pairs of accepted DDI root tag and
+                                 the corresponding metadata namespace
+                                 in order of preference.
+    :param context: Harvest batch context used for tombstones.
+    :type context: :obj:`HarvestContext` or None
+    :returns: DDI root element and its metadata namespace.
+    :rtype: tuple
+    :raises: :exc:`RecordDeleted` if the record is deleted.
+    :raises: :exc:`kuha_common.document_store.mappings.exceptions.UnknownXMLRoot`
+             if root element is not OAI-PMH or no accepted DDI root is found.
+    """
+    _expect_oai_pmh_root(root_element)
+    tombstone = get_tombstone(root_element, context)
+    if tombstone is not None:
+        raise RecordDeleted(tombstone, *(tag for tag, _ in metadata_roots))
+    md_el = _METADATA_PATH.find(root_element)
+    if md_el is not None:
+        for tag, metadata_namespace in metadata_roots:
+            ddi_root = md_el.find(tag)
+            if ddi_root is not None:
+                return ddi_root, metadata_namespace
+    raise exceptions.UnknownXMLRoot(_first_child_tag(md_el), *(tag for tag, _ in metadata_roots))
 
 
-def _add_provenances(obj, getter):
-    for prov in getter():
+def _element_fingerprint(element):
+    """Hash element subtree to a hexadecimal sha256 digest.
+
+    Feeds tag, sorted attributes, text and number of children of each
+    element in document order, followed by the tail of every element
+    below the given element. Fields are separated by control characters
+    which are not allowed in XML content, so that different trees never
+    feed equal input to the hash.
+    """
+    hasher = sha256()
+    for el in element.iter():
+        hasher.update('\x01'.join(
+            (el.tag, *(f'{key}\x02{value}' for key, value in sorted(el.attrib.items())),
+             el.text or '', str(len(el)), '' if el is element else el.tail or '')).encode('utf8'))
+        hasher.update(b'\x00')
+    return hasher.hexdigest()
+
+
+def metadata_fingerprint(root_element):
+    """Get content fingerprint of the ``oai:metadata`` payload.
+
+    The fingerprint is a hexadecimal sha256 digest of the metadata
+    subtree. It is stable across harvests and processes and
+    changes whenever tags, attributes or text content of the
+    payload change. It does not depend on namespace prefixes or
+    attribute order. Whitespace is part of text content, so
+    re-indenting the source document changes the fingerprint.
+
+    :param root_element: XML root node of OAI-PMH GetRecord response.
+    :type root_element: :obj:`xml.etree.ElementTree.Element`
+    :returns: Fingerprint or None if there is no metadata element.
+    :rtype: str or None
+    """
+    md_el = _METADATA_PATH.find(root_element)
+    return None if md_el is None else _element_fingerprint(md_el)
+
+
+def _add_provenances(obj, provenances):
+    for prov in provenances:
+        prov = intern_provenance(prov)
         obj._provenance.add_value(prov['harvest_date'],
                                   altered=prov['altered'],
                                   base_url=prov['base_url'],
@@ -150,17 +540,53 @@ def _aggregator_parser_factory(baseclass):
 
         _study_cls = Study
 
-        def _ddic_init(self, root_element, ddi_ns):
-            _expect_oai_pmh_root(root_element)
-            namespaces = dict(**ddi_ns, oai=OAI_NS['oai'])
-            ddi_root = root_element.find('./oai:GetRecord/oai:record/oai:metadata/ddi:codeBook', namespaces)
-            if ddi_root is None:
-                md_el = root_element.find('./oai:GetRecord/oai:record/oai:metadata', namespaces)
-                raise exceptions.UnknownXMLRoot(md_el[0].tag if md_el is not None and len(md_el) != 0 else None,
-                                                f"{ {namespaces['ddi']} }codeBook")
-            self._provenance_info = ProvenanceInfo(root_element, namespaces['ddi'])
+        #: Pairs of accepted DDI root tag and metadata namespace.
+        _metadata_roots = ()
+
+        def _ddi_init(self, root_element, context):
+            try:
+                ddi_root, metadata_namespace = _get_ddi_root_and_namespace_or_raise(
+                    root_element, self._metadata_roots, context)
+            except RecordDeleted:
+                instrumentation.count('records_deleted', type(self))
+                raise
+            except exceptions.UnknownXMLRoot:
+                instrumentation.count('unknown_xml_root', type(self))
+                raise
+            start = instrumentation.clock()
+            self._provenance_info = ProvenanceInfo(root_element, metadata_namespace, context)
+            instrumentation.observe(instrumentation.STAGE_PROVENANCE, start, type(self),
+                                    self._provenance_info.base_url)
+            _count_parsed_bytes(self, root_element, self._provenance_info.base_url)
+            self._oai_root_element = root_element
+            self._metadata_fingerprint = None
+            self._fingerprint_sources = context is not None and context.fingerprint_sources
             return ddi_root
 
+        @property
+        def base_url(self):
+            """Get direct OAI-PMH base url of the source record.
+
+            :returns: Direct base url.
+            :rtype: str
+            """
+            return self._provenance_info.base_url
+
+        @property
+        def metadata_fingerprint(self):
+            """Get content fingerprint of the source ``oai:metadata``.
+
+            Computed on first access. Compare to the fingerprint of
+            a stored record to skip mapping unchanged records. Studies
+            mapped after the first access carry the fingerprint.
+
+            :returns: Fingerprint of source metadata.
+            :rtype: str
+            """
+            if self._metadata_fingerprint is None:
+                self._metadata_fingerprint = metadata_fingerprint(self._oai_root_element)
+            return self._metadata_fingerprint
+
         def _parse_study_number(self):
             self.study_number = _aggregator_study_number(self._provenance_info.base_url,
                                                          self._provenance_info.identifier)
@@ -172,139 +598,441 @@ def _aggregator_parser_factory(baseclass):
             Populates a study record using metadata gathered from
             XML. Returns it.
 
+            The source fingerprint is set to the study if it has been
+            computed or if the harvest context fingerprints sources.
+
             :returns: Populated study record.
             :rtype: :obj:`cdcagg_common.records.Study`
             """
-            for study in super().studies:
-                study.set_direct_base_url(self._provenance_info.base_url)
-                study.set_aggregator_identifier(_generate_aggregator_identifier(
-                    self._provenance_info.base_url, self._provenance_info.identifier))
-                _add_provenances(study, self._provenance_info.full)
+            base_url = self._provenance_info.base_url
+            fingerprint = (self.metadata_fingerprint if self._fingerprint_sources
+                           else self._metadata_fingerprint)
+            start = instrumentation.clock()
+            provenances = self._provenance_info.full()
+            instrumentation.observe(instrumentation.STAGE_PROVENANCE, start, type(self), base_url)
+            studies = iter(super().studies)
+            while True:
+                start = instrumentation.clock()
+                study = next(studies, None)
+                if study is None:
+                    return
+                study.set_direct_base_url(base_url)
+                study.set_aggregator_identifier(self._provenance_info.aggregator_identifier)
+                if fingerprint is not None:
+                    study.set_source_fingerprint(fingerprint)
+                _add_provenances(study, provenances)
+                instrumentation.observe(instrumentation.STAGE_MAP, start, type(self), base_url)
+                instrumentation.count('records_mapped', type(self), base_url)
                 yield study
 
     return DynamicAggregatorBase
 
 
+@register_parser()
 class DDI122NesstarRecordParser(_aggregator_parser_factory(ddi.DDI122NesstarRecordParser)):
     """Parse OAI-PMH record containing DDI122 Nesstar metadata
     and map it to CDCAGG records."""
 
-    def __init__(self, root_element):
+    _metadata_roots = (('{http://www.icpsr.umich.edu/DDI}codeBook', 'http://www.icpsr.umich.edu/DDI'),)
+
+    def __init__(self, root_element, context=None):
         """Initiate DDI122NesstarRecordParser with XML root node.
 
         :param root_element: XML root node.
         :type root_element: :obj:`xml.etree.ElementTree.Element`
+        :param context: Harvest batch context shared by records of
+                        the same batch. Defaults to a new context.
+        :type context: :obj:`HarvestContext` or None
         :returns: Instance of DDI122NesstarRecordParser
         :rtype: :obj:`DDI122NesstarRecordParser`
         """
-        super().__init__(self._ddic_init(root_element,
-                                         {'ddi': 'http://www.icpsr.umich.edu/DDI'}))
+        super().__init__(self._ddi_init(root_element, context))
 
 
+@register_parser()
 class DDI25RecordParser(_aggregator_parser_factory(ddi.DDI25RecordParser)):
     """Parse OAI-PMH record containing DDI2.5 metadata
     and map it to CDCAGG records."""
 
-    def __init__(self, root_element):
+    _metadata_roots = (('{ddi:codebook:2_5}codeBook', 'ddi:codebook:2_5'),)
+
+    def __init__(self, root_element, context=None):
         """Initiate DDI25RecordParser with XML root node.
 
         :param root_element: XML root node.
         :type root_element: :obj:`xml.etree.ElementTree.Element`
+        :param context: Harvest batch context shared by records of
+                        the same batch. Defaults to a new context.
+        :type context: :obj:`HarvestContext` or None
         :returns: Instance of DDI25RecordParser
         :rtype: :obj:`DDI25RecordParser`
         """
-        super().__init__(self._ddic_init(root_element,
-                                         {'ddi': 'ddi:codebook:2_5'}))
+        super().__init__(self._ddi_init(root_element, context))
 
 
+@register_parser()
 class DDI31RecordParser(_aggregator_parser_factory(ddi.DDI31RecordParser)):
     """Parse OAI-PMH record containing DDI3.1 metadata
     and map it to CDCAGG records."""
 
-    def __init__(self, root_element):
+    _metadata_roots = (('{ddi:instance:3_1}DDIInstance', 'ddi:instance:3_1'),
+                       ('{ddi:studyunit:3_1}StudyUnit', 'ddi:studyunit:3_1'))
+
+    def __init__(self, root_element, context=None):
         """Initiate DDI31RecordParser with XML root node.
 
         :param root_element: XML root node.
         :type root_element: :obj:`xml.etree.ElementTree.Element`
+        :param context: Harvest batch context shared by records of
+                        the same batch. Defaults to a new context.
+        :type context: :obj:`HarvestContext` or None
         :returns: Instance of DDI31RecordParser
         :rtype: :obj:`DDI31RecordParser`
         """
-        _expect_oai_pmh_root(root_element)
-        _ns = {'oai': OAI_NS['oai'],
-               's': 'ddi:studyunit:3_1',
-               'ddi': 'ddi:instance:3_1'}
-        ddi_root = None
-        ddi_instance_root = root_element.find(
-            './oai:GetRecord/oai:record/oai:metadata/ddi:DDIInstance', _ns)
-        if ddi_instance_root is not None:
-            ddi_root = ddi_instance_root
-            metadata_namespace = _ns['ddi']
-        else:
-            ddi_root = root_element.find(
-                './oai:GetRecord/oai:record/oai:metadata/s:StudyUnit', _ns)
-            metadata_namespace = _ns['s']
-        if ddi_root is None:
-            md_el = root_element.find('./oai:GetRecord/oai:record/oai:metadata', _ns)
-            raise exceptions.UnknownXMLRoot(md_el[0].tag if md_el is not None and len(md_el) != 0 else None,
-                                            f"{ {_ns['ddi']} }DDIInstance",
-                                            f"{ {_ns['s']} }StudyUnit")
-        self._provenance_info = ProvenanceInfo(root_element, metadata_namespace)
-        super().__init__(ddi_root)
-
-
-def _ddi32_get_ddi_root_and_namespace_or_raise(root_element, namespaces):
-    for xpath, metadata_namespace in (
-            ('./oai:GetRecord/oai:record/oai:metadata/ddi:DDIInstance', namespaces['ddi']),
-            ('./oai:GetRecord/oai:record/oai:metadata/s:StudyUnit', namespaces['s']),
-            ('./oai:GetRecord/oai:record/oai:metadata/ddi:FragmentInstance', namespaces['ddi'])):
-        ddi_root = root_element.find(xpath, namespaces)
-        if ddi_root is not None:
-            return ddi_root, metadata_namespace
-    md_el = root_element.find('./oai:GetRecord/oai:record/oai:metadata', namespaces)
-    raise exceptions.UnknownXMLRoot(
-        md_el[0].tag if md_el is not None and len(md_el) != 0 else None,
-        f"{ {namespaces['ddi']} }DDIInstance",
-        f"{ {namespaces['s']} }StudyUnit",
-        f"{ {namespaces['ddi']} }FragmentInstance")
+        super().__init__(self._ddi_init(root_element, context))
 
 
+@register_parser()
 class DDI32RecordParser(_aggregator_parser_factory(ddi.DDI32RecordParser)):
     """Parse OAI-PMH record containing DDI3.2. metadata
     and map it to CDCAGG records."""
 
-    def __init__(self, root_element):
+    _metadata_roots = (('{ddi:instance:3_2}DDIInstance', 'ddi:instance:3_2'),
+                       ('{ddi:studyunit:3_2}StudyUnit', 'ddi:studyunit:3_2'),
+                       ('{ddi:instance:3_2}FragmentInstance', 'ddi:instance:3_2'))
+
+    def __init__(self, root_element, context=None):
         """Initiate DDI32RecordParser with XML root node.
 
         :param root_element: XML root node.
         :type root_element: :obj:`xml.etree.ElementTree.Element`
+        :param context: Harvest batch context shared by records of
+                        the same batch. Defaults to a new context.
+        :type context: :obj:`HarvestContext` or None
         :returns: Instance of DDI32RecordParser
         :rtype: :obj:`DDI32RecordParser`
         """
-        _expect_oai_pmh_root(root_element)
-        _ns = {'oai': OAI_NS['oai'],
-               's': 'ddi:studyunit:3_2',
-               'ddi': 'ddi:instance:3_2'}
-        ddi_root, metadata_namespace = _ddi32_get_ddi_root_and_namespace_or_raise(root_element, _ns)
-        self._provenance_info = ProvenanceInfo(root_element, metadata_namespace)
-        super().__init__(ddi_root)
+        super().__init__(self._ddi_init(root_element, context))
 
 
+@register_parser()
 class DDI33RecordParser(_aggregator_parser_factory(ddi.DDI33RecordParser)):
     """Parse OAI-PMH record containing DDI3.3. metadata
     and map it to CDCAGG records."""
 
-    def __init__(self, root_element):
+    _metadata_roots = (('{ddi:instance:3_3}DDIInstance', 'ddi:instance:3_3'),
+                       ('{ddi:studyunit:3_3}StudyUnit', 'ddi:studyunit:3_3'),
+                       ('{ddi:instance:3_3}FragmentInstance', 'ddi:instance:3_3'))
+
+    def __init__(self, root_element, context=None):
         """Initiate DDI33RecordParser with XML root node.
 
         :param root_element: XML root node.
         :type root_element: :obj:`xml.etree.ElementTree.Element`
+        :param context: Harvest batch context shared by records of
+                        the same batch. Defaults to a new context.
+        :type context: :obj:`HarvestContext` or None
         :returns: Instance of DDI33RecordParser
         :rtype: :obj:`DDI33RecordParser`
         """
-        _expect_oai_pmh_root(root_element)
-        _ns = {'oai': OAI_NS['oai'],
-               's': 'ddi:studyunit:3_3',
-               'ddi': 'ddi:instance:3_3'}
-        ddi_root, metadata_namespace = _ddi32_get_ddi_root_and_namespace_or_raise(root_element, _ns)
-        self._provenance_info = ProvenanceInfo(root_element, metadata_namespace)
-        super().__init__(ddi_root)
+        super().__init__(self._ddi_init(root_element, context))
+
+
+class _CountingReader:
+    """Binary file wrapper counting bytes read."""
+
+    def __init__(self):
+        self.fileobj = None
+        self._size = 0
+        self._taken = 0
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self._size += len(data)
+        return data
+
+    def take(self):
+        """Get number of bytes read since the previous call.
+
+        :rtype: int
+        """
+        size = self._size - self._taken
+        self._taken = self._size
+        return size
+
+
+def _iterparse(source, events, reader=None):
+    """Incrementally parse source with :func:`xml.etree.ElementTree.iterparse`.
+
+    :param source: Filename, file object or bytes containing XML.
+    :param tuple events: Events to report.
+    :param reader: Reader counting bytes read from source, or None.
+    :type reader: :obj:`_CountingReader` or None
+    :returns: Iterator yielding (event, element) tuples.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+    if reader is None:
+        return ElementTree.iterparse(source, events=events)
+    return _iterparse_counted(source, events, reader)
+
+
+def _iterparse_counted(source, events, reader):
+    opened = not hasattr(source, 'read')
+    reader.fileobj = open(source, 'rb') if opened else source
+    try:
+        yield from ElementTree.iterparse(reader, events=events)
+    finally:
+        if opened:
+            reader.fileobj.close()
+
+
+def _is_deleted(header_el):
+    return header_el is not None and header_el.get('status') == 'deleted'
+
+
+def _getrecord_envelope(base_url, record_el):
+    """Wrap a ListRecords record element into a GetRecord envelope.
+
+    The record element is appended as is (not copied) so that
+    the parsers may consume it as if it were a GetRecord response.
+    """
+    root_element = ElementTree.Element(_OAI_PMH_TAG)
+    ElementTree.SubElement(root_element, _OAI_REQUEST_TAG).text = base_url
+    ElementTree.SubElement(root_element, _OAI_GETRECORD_TAG).append(record_el)
+    return root_element
+
+
+def iter_list_records(source, parser_class=None, include_deleted=False, context=None):
+    """Stream OAI-PMH ListRecords response and yield mapped studies.
+
+    Parses the source incrementally and maps each ``oai:record``
+    as soon as its end tag has been read. The record subtree is
+    cleared after it has been mapped, so memory consumption stays
+    flat regardless of the number of records in the response.
+
+    Records with header status 'deleted' contain no metadata. They
+    are skipped, or yielded as :obj:`Tombstone` if include_deleted
+    is True.
+
+    :param source: Filename, file object or bytes containing
+                   OAI-PMH ListRecords response.
+    :param parser_class: Parser class used to map each record. If None,
+                         the parser class is looked up for each record
+                         from registered parsers.
+    :type parser_class: :class:`DDI25RecordParser` or any other
+                        parser class in this module or None.
+    :param bool include_deleted: Yield tombstones for deleted records.
+    :param context: Harvest batch context shared by all records.
+                    Defaults to a new context for the response.
+    :type context: :obj:`HarvestContext` or None
+    :returns: Generator yielding populated study records and
+              tombstones, if requested.
+    :rtype: :obj:`generator`
+    :raises: :exc:`kuha_common.document_store.mappings.exceptions.UnknownXMLRoot`
+             if root element is not OAI-PMH or a record cannot be mapped.
+    """
+    explicit_context = context is not None
+    context = context if explicit_context else HarvestContext()
+    root_element = None
+    list_records_el = None
+    base_url = ''
+    reader = _CountingReader() if instrumentation.is_enabled() else None
+    parse_start = instrumentation.clock()
+    for event, element in _iterparse(source, ('start', 'end'), reader):
+        if event == 'start':
+            if root_element is None:
+                _expect_oai_pmh_root(element)
+                root_element = element
+            elif element.tag == _OAI_LISTRECORDS_TAG:
+                list_records_el = element
+            continue
+        if element.tag == _OAI_REQUEST_TAG:
+            base_url = ''.join(element.itertext())
+        elif element.tag == _OAI_RECORD_TAG and list_records_el is not None:
+            header_el = element.find(_OAI_HEADER_TAG)
+            if _is_deleted(header_el):
+                instrumentation.count('records_deleted', parser_class, base_url)
+                if reader is not None:
+                    instrumentation.count('bytes_processed', parser_class, base_url, reader.take())
+                if include_deleted:
+                    yield tombstone_from_header(_header_info(base_url, header_el), context)
+            else:
+                parse_end = instrumentation.clock()
+                envelope = _getrecord_envelope(base_url, element)
+                parser = _instantiate_parser(
+                    get_parser_class(envelope, context) if parser_class is None else parser_class,
+                    envelope, context, explicit_context,
+                    None if reader is None else reader.take())
+                instrumentation.observe(instrumentation.STAGE_PARSE, parse_start, type(parser), base_url,
+                                        parse_end)
+                yield from parser.studies
+            element.clear()
+            list_records_el.remove(element)
+            parse_start = instrumentation.clock()
+    if reader is not None:
+        instrumentation.count('bytes_processed', parser_class, base_url, reader.take())
+
+
+#: Header info of an OAI-PMH record read without mapping the metadata.
+#:
+#: :base_url: OAI-PMH request base URL.
+#: :identifier: OAI identifier.
+#: :datestamp: OAI datestamp.
+#: :deleted: True if header status is 'deleted'.
+#: :aggregator_identifier: Aggregator identifier of the record.
+#: :study_number: Study number of the record.
+HeaderInfo = namedtuple('HeaderInfo', ['base_url', 'identifier', 'datestamp', 'deleted',
+                                       'aggregator_identifier', 'study_number'])
+
+
+def _header_info(base_url, header_el):
+    identifier = _IDENTIFIER_PATH.text(header_el)
+    return HeaderInfo(base_url, identifier, _DATESTAMP_PATH.text(header_el),
+                      _is_deleted(header_el),
+                      _generate_aggregator_identifier(base_url, identifier),
+                      _aggregator_study_number(base_url, identifier))
+
+
+def _iter_headers(source):
+    root_element = None
+    list_records_el = None
+    base_url = ''
+    # Open elements from oai:metadata down. Each is removed from its
+    # parent as soon as it ends, so metadata subtrees are never built.
+    metadata_path = []
+    for event, element in _iterparse(source, ('start', 'end')):
+        if event == 'start':
+            if metadata_path or element.tag == _OAI_METADATA_TAG:
+                metadata_path.append(element)
+            elif root_element is None:
+                _expect_oai_pmh_root(element)
+                root_element = element
+            elif element.tag == _OAI_LISTRECORDS_TAG:
+                list_records_el = element
+            continue
+        if metadata_path:
+            metadata_path.pop()
+            if metadata_path:
+                metadata_path[-1].remove(element)
+        elif element.tag == _OAI_REQUEST_TAG:
+            base_url = ''.join(element.itertext())
+        elif element.tag == _OAI_HEADER_TAG:
+            yield _header_info(base_url, element)
+        elif element.tag == _OAI_RECORD_TAG and list_records_el is not None:
+            element.clear()
+            list_records_el.remove(element)
+
+
+def scan_header(source):
+    """Read the header of an OAI-PMH GetRecord response.
+
+    Parsing stops at the end of ``oai:header``, so the metadata
+    is never read or mapped.
+
+    :param source: Filename, file object or bytes containing
+                   OAI-PMH GetRecord response.
+    :returns: Header info or None if source contains no header.
+    :rtype: :obj:`HeaderInfo` or None
+    :raises: :exc:`kuha_common.document_store.mappings.exceptions.UnknownXMLRoot`
+             if root element is not OAI-PMH.
+    """
+    return next(_iter_headers(source), None)
+
+
+def iter_headers(source):
+    """Stream OAI-PMH ListRecords response and yield header info per record.
+
+    Metadata is not mapped. Metadata elements are discarded as
+    they are read and each record subtree is cleared once it has
+    been read, so no metadata subtree is held in memory.
+
+    :param source: Filename, file object or bytes containing
+                   OAI-PMH ListRecords response.
+    :returns: Generator yielding :obj:`HeaderInfo` for each record.
+    :rtype: :obj:`generator`
+    :raises: :exc:`kuha_common.document_store.mappings.exceptions.UnknownXMLRoot`
+             if root element is not OAI-PMH.
+    """
+    return _iter_headers(source)
+
+
+#: Tombstone of a deleted OAI-PMH record.
+#:
+#: :aggregator_identifier: Aggregator identifier of the deleted record.
+#: :study_number: Study number of the deleted record.
+#: :provenance: List containing the direct provenance of the deletion.
+#:              Metadata namespace is None, since deleted records carry
+#:              no metadata.
+Tombstone = namedtuple('Tombstone', ['aggregator_identifier', 'study_number', 'provenance'])
+
+
+class RecordDeleted(exceptions.UnknownXMLRoot):
+    """Raised when a parser is initiated with a deleted OAI-PMH record.
+
+    Subclass of :exc:`kuha_common.document_store.mappings.exceptions.UnknownXMLRoot`
+    to remain compatible with callers catching it. The tombstone of
+    the deleted record is available in :attr:`tombstone`.
+    """
+
+    def __init__(self, tombstone, *expected_tags):
+        super().__init__(None, *expected_tags)
+        self.tombstone = tombstone
+
+
+def tombstone_from_header(header, context=None):
+    """Create tombstone from header info.
+
+    :param header: Header info of a deleted record.
+    :type header: :obj:`HeaderInfo`
+    :param context: Harvest batch context. Defaults to a new context.
+    :type context: :obj:`HarvestContext` or None
+    :returns: Tombstone of the record.
+    :rtype: :obj:`Tombstone`
+    """
+    context = HarvestContext() if context is None else context
+    return Tombstone(header.aggregator_identifier, header.study_number,
+                     [{'harvest_date': context.harvest_date,
+                       'altered': True, 'direct': True,
+                       'metadata_namespace': None,
+                       'base_url': context.intern(header.base_url),
+                       'identifier': header.identifier,
+                       'datestamp': header.datestamp}])
+
+
+def get_tombstone(root_element, context=None):
+    """Get tombstone from OAI-PMH GetRecord root element.
+
+    Only the envelope and header are read.
+
+    :param root_element: XML root node.
+    :type root_element: :obj:`xml.etree.ElementTree.Element`
+    :param context: Harvest batch context. Defaults to a new context.
+    :type context: :obj:`HarvestContext` or None
+    :returns: Tombstone if the record is deleted, otherwise None.
+    :rtype: :obj:`Tombstone` or None
+    """
+    header_el = _HEADER_PATH.find(root_element)
+    if not _is_deleted(header_el):
+        return None
+    return tombstone_from_header(_header_info(_REQUEST_PATH.text(root_element), header_el), context)
+
+
+def scan_tombstone(source, context=None):
+    """Read the header of an OAI-PMH GetRecord response for deletion.
+
+    Parsing stops at the end of ``oai:header``.
+
+    :param source: Filename, file object or bytes containing
+                   OAI-PMH GetRecord response.
+    :param context: Harvest batch context. Defaults to a new context.
+    :type context: :obj:`HarvestContext` or None
+    :returns: Tombstone if the record is deleted, otherwise None.
+    :rtype: :obj:`Tombstone` or None
+    :raises: :exc:`kuha_common.document_store.mappings.exceptions.UnknownXMLRoot`
+             if root element is not OAI-PMH.
+    """
+    header = scan_header(source)
+    if header is None or not header.deleted:
+        return None
+    return tombstone_from_header(header, context)
@@ -25,6 +25,10 @@ MDB_REGEX = '$regex'
 MDB_TYPE = '$type'
 
 MDB_AND = '$and'
+MDB_OR = '$or'
+
+MDB_ASCENDING = 1
+MDB_DESCENDING = -1
 
 MDB_TYPE_DATE = 'date'
 MDB_TYPE_NULL = 'null'
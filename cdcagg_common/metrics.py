@@ -0,0 +1,291 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Prometheus-format metrics for record processing.
+
+Collects measurements from :mod:`cdcagg_common.instrumentation` into
+an in-process registry and renders them in the Prometheus text
+exposition format. No server or client library is required. Serve
+the output of :func:`render` from any HTTP handler.
+
+Enable with one call and render whenever metrics are scraped::
+
+    from cdcagg_common import metrics
+    metrics.install()
+    ...
+    body = metrics.render()
+
+Collected metrics:
+
+* ``cdcagg_records_mapped_total`` records mapped per parser class.
+* ``cdcagg_records_deleted_total`` deleted records per parser class.
+  Deleted records found before a parser class is known have an empty
+  source.
+* ``cdcagg_unknown_xml_root_total`` ``UnknownXMLRoot`` rejections per
+  parser class. Dispatch failures have an empty source.
+* ``cdcagg_bytes_processed_total`` bytes of payloads mapped per parser
+  class. :func:`cdcagg_common.batch.map_record` and
+  :func:`cdcagg_common.mappings.iter_list_records` count raw payload
+  bytes. Parsers instantiated directly count the serialized size of
+  the element tree.
+* ``cdcagg_stage_duration_seconds`` histogram of time spent per stage
+  and parser or record class.
+
+Endpoint base URLs are not used as labels to keep label cardinality
+bounded.
+"""
+from abc import (
+    ABC,
+    abstractmethod
+)
+from threading import Lock
+
+from cdcagg_common import instrumentation
+
+
+#: Content type of the text exposition format.
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_COUNTER_HELP = {
+    'records_mapped': 'Records mapped per parser class.',
+    'records_deleted': 'Deleted records per parser class.',
+    'unknown_xml_root': 'UnknownXMLRoot rejections per parser class.',
+    'bytes_processed': 'Bytes of raw payloads mapped per parser class.',
+}
+
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric(ABC):
+
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = Lock()
+
+    def _header(self):
+        return [f'# HELP {self.name} {self.documentation}',
+                f'# TYPE {self.name} {self.metric_type}']
+
+    @abstractmethod
+    def render(self):
+        """Render metric in text exposition format.
+
+        :returns: Lines of the exposition format.
+        :rtype: list
+        """
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter with labels."""
+
+    metric_type = 'counter'
+
+    def inc(self, labelvalues=(), value=1):
+        """Increment counter.
+
+        :param tuple labelvalues: Label values in order of label names.
+        :param value: Increment. Must not be negative.
+        """
+        if value < 0:
+            raise ValueError("Counters can only be incremented by non-negative amounts")
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + value
+
+    def get(self, labelvalues=()):
+        """Get current value.
+
+        :param tuple labelvalues: Label values in order of label names.
+        :returns: Current value.
+        """
+        return self._values.get(labelvalues, 0)
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            items = sorted(self._values.items())
+        for labelvalues, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}')
+        return lines
+
+
+class Histogram(_Metric):
+    """Histogram with cumulative buckets and labels."""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=instrumentation.DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, labelvalues, value):
+        """Observe a value.
+
+        :param tuple labelvalues: Label values in order of label names.
+        :param float value: Observed value.
+        """
+        with self._lock:
+            stats = self._values.get(labelvalues)
+            if stats is None:
+                stats = self._values[labelvalues] = instrumentation.StageStats(self.buckets)
+            stats.add(value)
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            items = sorted((labelvalues, (list(stats.histogram), stats.total, stats.count))
+                           for labelvalues, stats in self._values.items())
+        for labelvalues, (histogram, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), histogram):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, labelvalues, (('le', _format_value(float(bound))),))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    """In-process registry of metrics."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as {metric.metric_type}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        """Get or create counter.
+
+        :param str name: Metric name.
+        :param str documentation: Help text.
+        :param tuple labelnames: Label names.
+        :rtype: :obj:`Counter`
+        """
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=instrumentation.DEFAULT_BUCKETS):
+        """Get or create histogram.
+
+        :param str name: Metric name.
+        :param str documentation: Help text.
+        :param tuple labelnames: Label names.
+        :param tuple buckets: Upper bounds of buckets.
+        :rtype: :obj:`Histogram`
+        """
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name):
+        """Get registered metric by name.
+
+        :param str name: Metric name.
+        :returns: Metric or None if not registered.
+        """
+        return self._metrics.get(name)
+
+    def render(self):
+        """Render all metrics in text exposition format.
+
+        :returns: Exposition.
+        :rtype: str
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        lines = []
+        for _, metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+class PrometheusSink(instrumentation.Sink):
+    """Instrumentation sink collecting measurements to a registry."""
+
+    def __init__(self, registry, prefix='cdcagg', buckets=instrumentation.DEFAULT_BUCKETS):
+        """Initiate PrometheusSink.
+
+        :param registry: Registry to collect to.
+        :type registry: :obj:`Registry`
+        :param str prefix: Prefix for metric names.
+        :param tuple buckets: Upper bounds of duration buckets in seconds.
+        """
+        self.registry = registry
+        self.prefix = prefix
+        self._durations = registry.histogram(f'{prefix}_stage_duration_seconds',
+                                             'Time spent per processing stage.',
+                                             ('stage', 'source'), buckets)
+        for name, documentation in _COUNTER_HELP.items():
+            registry.counter(f'{prefix}_{name}_total', documentation, ('source',))
+
+    def timing(self, stage, source, base_url, seconds):
+        self._durations.observe((stage, source or ''), seconds)
+
+    def count(self, name, source, base_url, value):
+        self.registry.counter(f'{self.prefix}_{name}_total', _COUNTER_HELP.get(name, name),
+                              ('source',)).inc((source or '',), value)
+
+
+#: Default registry used by :func:`install` and :func:`render`.
+REGISTRY = Registry()
+
+
+def install(registry=None):
+    """Enable instrumentation and collect it to registry.
+
+    :param registry: Registry to collect to. Defaults to :data:`REGISTRY`.
+    :type registry: :obj:`Registry` or None
+    :returns: Installed sink.
+    :rtype: :obj:`PrometheusSink`
+    """
+    sink = PrometheusSink(REGISTRY if registry is None else registry)
+    instrumentation.enable(sink)
+    return sink
+
+
+def render(registry=None):
+    """Render metrics in text exposition format.
+
+    :param registry: Registry to render. Defaults to :data:`REGISTRY`.
+    :type registry: :obj:`Registry` or None
+    :returns: Exposition.
+    :rtype: str
+    """
+    return (REGISTRY if registry is None else registry).render()
@@ -0,0 +1,463 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Build MongoDB queries for common aggregator lookups.
+
+Queries are built from the operators in :mod:`cdcagg_common.mdb_const`
+and checked against the indexes declared for the record class (see
+:meth:`cdcagg_common.records.RecordBase.list_indexes`). A query that no
+declared index can serve would need a collection scan. It emits
+:exc:`UnindexedQueryWarning`, or raises :exc:`UnindexedQueryError` in
+strict mode.
+
+Example::
+
+    from cdcagg_common.queries import QueryBuilder
+    builder = QueryBuilder(strict=True)
+    query = builder.changed_since('2024-01-01T00:00:00Z',
+                                  base_url='https://some.url/oai')
+
+:class:`KeysetPaginator` traverses a collection in pages of range
+queries over a unique key, so the cost per page does not grow with
+the depth of the traversal as it does with skip.
+"""
+import json
+import warnings
+from base64 import (
+    urlsafe_b64decode,
+    urlsafe_b64encode
+)
+from collections import namedtuple
+
+from cdcagg_common.mdb_const import (
+    MDB_AND,
+    MDB_ASCENDING,
+    MDB_EXISTS,
+    MDG_GREATER_THAN,
+    MDB_GREATER_THAN_OR_EQUAL,
+    MDB_ISODATE,
+    MDB_OID,
+    MDB_OR,
+    MDB_TYPE,
+    MDB_TYPE_DATE,
+    MDB_TYPE_NULL
+)
+from cdcagg_common.records import (
+    Index,
+    Study
+)
+
+
+#: Index MongoDB creates for ``_id`` of every collection.
+ID_INDEX = Index([('_id', MDB_ASCENDING)], name='_id_')
+
+
+class UnindexedQueryWarning(UserWarning):
+    """Query is not served by any declared index."""
+
+
+class UnindexedQueryError(ValueError):
+    """Query is not served by any declared index.
+
+    Raised in strict mode.
+    """
+
+    def __init__(self, query, record_class):
+        self.query = query
+        self.record_class = record_class
+        super().__init__(f"Query would need a collection scan on {record_class.get_collection()}: "
+                         f"{query}")
+
+
+def _conditions(query):
+    """Yield (field path, condition) pairs of a query.
+
+    Descends into ``$and``. Other top-level operators are skipped.
+    """
+    for key, value in query.items():
+        if key == MDB_AND:
+            for subquery in value:
+                yield from _conditions(subquery)
+        elif not key.startswith('$'):
+            yield key, value
+
+
+def _may_match_missing(condition):
+    """Tell whether condition may match documents without the field.
+
+    Partial indexes do not contain such documents.
+    """
+    if condition is None:
+        return True
+    if isinstance(condition, dict):
+        if condition.get(MDB_EXISTS) is False:
+            return True
+        if condition.get(MDB_TYPE) == MDB_TYPE_NULL:
+            return True
+    return False
+
+
+def find_index(query, record_class=Study):
+    """Find a declared index that can serve query.
+
+    An index can serve a query if the query constrains the first field
+    of the index. A partial index is only used if the query does not
+    look for documents where the field is missing. An ``$or`` is served
+    if every clause is served. The ``_id`` index always exists.
+
+    :param dict query: MongoDB query.
+    :param record_class: Record class to consult for indexes.
+    :returns: Matching index or None.
+    :rtype: :obj:`cdcagg_common.records.Index` or None
+    """
+    index = _find_prefix_index(query, record_class)
+    if index is not None:
+        return index
+    for clauses in _or_clauses(query):
+        indexes = [find_index(clause, record_class) for clause in clauses]
+        if indexes and all(index is not None for index in indexes):
+            return indexes[0]
+    return None
+
+
+def _or_clauses(query):
+    """Yield clauses of each ``$or`` at top level or in ``$and``."""
+    if query.get(MDB_OR):
+        yield query[MDB_OR]
+    for subquery in query.get(MDB_AND, ()):
+        yield from _or_clauses(subquery)
+
+
+def _find_prefix_index(query, record_class):
+    conditions = {}
+    for field, condition in _conditions(query):
+        conditions.setdefault(field, []).append(condition)
+    if '_id' in conditions:
+        return ID_INDEX
+    for index in record_class.list_indexes():
+        prefix = index.fields[0]
+        if prefix not in conditions:
+            continue
+        if index.partial_filter is not None and any(
+                _may_match_missing(condition) for condition in conditions[prefix]):
+            continue
+        return index
+    return None
+
+
+def check_query(query, record_class=Study, strict=False, stacklevel=2):
+    """Check that query can be served by a declared index.
+
+    An empty query matches all documents and is not checked.
+
+    :param dict query: MongoDB query.
+    :param record_class: Record class to consult for indexes.
+    :param bool strict: Raise instead of warning.
+    :param int stacklevel: Stack level of the warning as in
+                           :func:`warnings.warn`. The default points
+                           to the caller of this function.
+    :returns: Query.
+    :rtype: dict
+    :raises: :exc:`UnindexedQueryError` in strict mode if no declared
+             index can serve the query.
+    """
+    if query and find_index(query, record_class) is None:
+        if strict:
+            raise UnindexedQueryError(query, record_class)
+        warnings.warn(f"Query would need a collection scan on {record_class.get_collection()}: {query}",
+                      UnindexedQueryWarning, stacklevel=stacklevel)
+    return query
+
+
+class QueryBuilder:
+    """Build checked queries for a record class."""
+
+    def __init__(self, record_class=Study, strict=False):
+        """Initiate QueryBuilder.
+
+        :param record_class: Record class to consult for indexes.
+        :param bool strict: Raise :exc:`UnindexedQueryError` instead of
+                            warning for unindexed queries.
+        """
+        self.record_class = record_class
+        self.strict = strict
+
+    def check(self, query, stacklevel=2):
+        """Check query against declared indexes.
+
+        :param dict query: MongoDB query.
+        :param int stacklevel: Stack level of the warning as in
+                               :func:`warnings.warn`, counted from this
+                               method.
+        :returns: Query.
+        :rtype: dict
+        :raises: :exc:`UnindexedQueryError` in strict mode.
+        """
+        return check_query(query, self.record_class, self.strict, stacklevel + 1)
+
+    @staticmethod
+    def _and(*queries):
+        queries = [query for query in queries if query]
+        if not queries:
+            return {}
+        if len(queries) == 1:
+            return queries[0]
+        return {MDB_AND: queries}
+
+    def and_(self, *queries):
+        """Combine queries with ``$and``.
+
+        :param dict queries: Queries to combine.
+        :returns: Combined query.
+        :rtype: dict
+        """
+        return self.check(self._and(*queries), stacklevel=3)
+
+    def by_aggregator_identifier(self, aggregator_identifier):
+        """Query record by aggregator identifier.
+
+        :param str aggregator_identifier: Aggregator identifier.
+        :rtype: dict
+        """
+        return self.check({'_aggregator_identifier': aggregator_identifier}, stacklevel=3)
+
+    def by_direct_base_url(self, base_url):
+        """Query records harvested directly from base url.
+
+        :param str base_url: Direct OAI-PMH base url.
+        :rtype: dict
+        """
+        return self.check({'_direct_base_url': base_url}, stacklevel=3)
+
+    def changed_since(self, datestamp, base_url=None):
+        """Query records updated since datestamp.
+
+        :param str datestamp: ISO 8601 datestamp.
+        :param str or None base_url: Limit to records harvested directly
+                                     from base url.
+        :rtype: dict
+        """
+        query = {'_metadata.updated': {MDB_GREATER_THAN_OR_EQUAL: {MDB_ISODATE: datestamp}}}
+        if base_url is not None:
+            query = self._and({'_direct_base_url': base_url}, query)
+        return self.check(query, stacklevel=3)
+
+    def deleted(self, base_url=None):
+        """Query records marked as deleted.
+
+        :param str or None base_url: Limit to records harvested directly
+                                     from base url.
+        :rtype: dict
+        """
+        query = {'_metadata.deleted': {MDB_TYPE: MDB_TYPE_DATE}}
+        if base_url is not None:
+            query = self._and({'_direct_base_url': base_url}, query)
+        return self.check(query, stacklevel=3)
+
+    def missing(self, field, base_url=None):
+        """Query records missing field.
+
+        :param str field: Field path.
+        :param str or None base_url: Limit to records harvested directly
+                                     from base url.
+        :rtype: dict
+        """
+        query = {field: {MDB_EXISTS: False}}
+        if base_url is not None:
+            query = self._and({'_direct_base_url': base_url}, query)
+        return self.check(query, stacklevel=3)
+
+    def missing_or_deleted(self, field, base_url=None):
+        """Query records missing field or marked as deleted.
+
+        :param str field: Field path.
+        :param str or None base_url: Limit to records harvested directly
+                                     from base url.
+        :rtype: dict
+        """
+        query = {MDB_OR: [{field: {MDB_EXISTS: False}},
+                         {'_metadata.deleted': {MDB_TYPE: MDB_TYPE_DATE}}]}
+        if base_url is not None:
+            query = self._and({'_direct_base_url': base_url}, query)
+        return self.check(query, stacklevel=3)
+
+
+#: Keys for keyset pagination.
+KEY_ID = ('_id',)
+KEY_DIRECT_BASE_URL_AGGREGATOR_IDENTIFIER = ('_direct_base_url', '_aggregator_identifier')
+
+
+class PageCursor(namedtuple('PageCursor', ['key', 'values'])):
+    """Position after the last document of a page.
+
+    :key: Field paths of the pagination key.
+    :values: Values of the key fields in the last document.
+    """
+
+    __slots__ = ()
+
+    def encode(self):
+        """Encode cursor to an opaque string token.
+
+        :returns: Token.
+        :rtype: str
+        """
+        payload = json.dumps([list(self.key), list(self.values)], separators=(',', ':'))
+        return urlsafe_b64encode(payload.encode('utf8')).decode('ascii')
+
+    @classmethod
+    def decode(cls, token):
+        """Decode cursor from token returned by :meth:`encode`.
+
+        :param str token: Token.
+        :returns: Cursor.
+        :rtype: :obj:`PageCursor`
+        :raises: :exc:`ValueError` for an invalid token.
+        """
+        try:
+            key, values = json.loads(urlsafe_b64decode(token.encode('ascii')).decode('utf8'))
+        except (TypeError, ValueError, UnicodeError) as exc:
+            raise ValueError(f"Invalid page cursor: {token}") from exc
+        if not isinstance(key, list) or not isinstance(values, list) or len(key) != len(values) or \
+           not all(isinstance(field, str) for field in key):
+            raise ValueError(f"Invalid page cursor: {token}")
+        return cls(tuple(key), tuple(values))
+
+
+#: Page of documents and the cursor to continue from.
+Page = namedtuple('Page', ['documents', 'cursor'])
+
+
+def _oid_value(value):
+    if isinstance(value, dict):
+        return value.get(MDB_OID)
+    return str(value)
+
+
+class KeysetPaginator:
+    """Traverse a collection with keyset pagination.
+
+    Each page is a range query for documents whose key comes after the
+    key of the last document of the previous page, sorted by the key.
+    The key must be unique. Documents missing a key field are not
+    traversed. Key values must not be null, since a range query after
+    a null value matches no documents. :meth:`cursor_after` rejects
+    them instead of ending the traversal early.
+
+    Example::
+
+        paginator = KeysetPaginator(KEY_DIRECT_BASE_URL_AGGREGATOR_IDENTIFIER)
+        for page in paginator.pages(fetch):
+            process(page.documents)
+            save(page.cursor.encode())
+    """
+
+    def __init__(self, key=KEY_ID, query=None, page_size=1000, record_class=Study, strict=False):
+        """Initiate KeysetPaginator.
+
+        :param tuple key: Field paths of the unique pagination key.
+        :param dict or None query: Query to limit the traversal.
+        :param int page_size: Maximum number of documents per page.
+        :param record_class: Record class to consult for indexes.
+        :param bool strict: Raise :exc:`UnindexedQueryError` instead of
+                            warning for unindexed queries.
+        """
+        if not key:
+            raise ValueError("Pagination key must have at least one field")
+        if page_size < 1:
+            raise ValueError("Page size must be positive")
+        self.key = tuple(key)
+        self.base_query = query or {}
+        self.page_size = page_size
+        self._builder = QueryBuilder(record_class, strict)
+
+    @property
+    def sort(self):
+        """Sort specification of the pagination key.
+
+        :rtype: list
+        """
+        return [(field, MDB_ASCENDING) for field in self.key]
+
+    def _after(self, field, value):
+        if field == '_id':
+            value = {MDB_OID: value}
+        return {field: {MDG_GREATER_THAN: value}}
+
+    def _range(self, values):
+        clauses = []
+        for position, field in enumerate(self.key):
+            clause = dict(zip(self.key[:position], values[:position]))
+            clause.update(self._after(field, values[position]))
+            clauses.append(clause)
+        return clauses[0] if len(clauses) == 1 else {MDB_OR: clauses}
+
+    def query(self, cursor=None):
+        """Build query for the page after cursor.
+
+        :param cursor: Cursor of the previous page or None for the first
+                       page.
+        :type cursor: :obj:`PageCursor` or None
+        :returns: Query.
+        :rtype: dict
+        :raises: :exc:`ValueError` if cursor key does not match.
+        """
+        exists = {field: {MDB_EXISTS: True} for field in self.key if field != '_id'}
+        if cursor is None:
+            query = self._builder._and(self.base_query, exists)
+        elif tuple(cursor.key) != self.key:
+            raise ValueError(f"Cursor key {cursor.key} does not match pagination key {self.key}")
+        else:
+            query = self._builder._and(self.base_query, exists, self._range(cursor.values))
+        return self._builder.check(query, stacklevel=3)
+
+    def cursor_after(self, document):
+        """Get cursor positioned after document.
+
+        :param dict document: Last document of a page.
+        :returns: Cursor.
+        :rtype: :obj:`PageCursor`
+        :raises: :exc:`ValueError` if document is missing a key field or
+                 a key value is null.
+        """
+        values = []
+        for field in self.key:
+            value = document
+            try:
+                for part in field.split('.'):
+                    value = value[part]
+            except (KeyError, TypeError) as exc:
+                raise ValueError(f"Document is missing pagination key field {field}") from exc
+            if value is None:
+                raise ValueError(f"Document has null value in pagination key field {field}")
+            values.append(_oid_value(value) if field == '_id' else value)
+        return PageCursor(self.key, tuple(values))
+
+    def pages(self, fetch, cursor=None):
+        """Iterate pages.
+
+        :param callable fetch: Called with query, sort and limit
+                               keyword arguments. Returns a sequence of
+                               documents.
+        :param cursor: Cursor to resume from or None to start from the
+                       beginning.
+        :type cursor: :obj:`PageCursor` or None
+        :returns: generator yielding :obj:`Page` tuples.
+        """
+        while True:
+            documents = list(fetch(query=self.query(cursor), sort=self.sort, limit=self.page_size))
+            if not documents:
+                return
+            cursor = self.cursor_after(documents[-1])
+            yield Page(documents, cursor)
+            if len(documents) < self.page_size:
+                return
@@ -16,48 +16,602 @@ These records define the internal data model for CDC Aggregator. They
 are reflected to the MongoDB database and DocStore record validation
 is dynamically constructed by consulting the record properties.
 """
+import sys
+from collections import namedtuple
 from itertools import chain
+from types import MappingProxyType
 from kuha_common.document_store.field_types import FieldTypeFactory
 from kuha_common.document_store import records
+from cdcagg_common import (
+    instrumentation,
+    streams,
+    validation
+)
+from cdcagg_common.mdb_const import (
+    MDB_ASCENDING,
+    MDB_DESCENDING,
+    MDB_TYPE,
+    MDB_TYPE_STRING
+)
+
+
+def _store_fabricated(instance, name, field):
+    # Fields fabricated after the export cache started watching the
+    # record must invalidate the cache too.
+    dct = instance.__dict__
+    dct[name] = field
+    if dct.get('_export_cache_watching'):
+        _watch_field(field, dct['_export_cache'])
+
+
+class _LazyFieldTypeFactory(FieldTypeFactory):
+    """Field type factory that fabricates the field on first access.
+
+    Accessed from the class, returns the factory itself. Accessed from
+    an instance, fabricates the field, stores it to the instance
+    ``__dict__`` and returns it. Further lookups find the fabricated
+    field from the instance and bypass the factory.
+    """
+
+    def __set_name__(self, owner, name):
+        self._attribute_name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        field = self.fabricate()
+        _store_fabricated(instance, self._attribute_name, field)
+        return field
+
+
+class _AbsentField:
+    """Descriptor for a field absent from a partial document.
+
+    Like :class:`_LazyFieldTypeFactory`, but wraps an existing factory.
+    """
+
+    __slots__ = ('_factory', '_attribute_name')
+
+    def __init__(self, factory, attribute_name):
+        self._factory = factory
+        self._attribute_name = attribute_name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self._factory
+        field = self._factory.fabricate()
+        _store_fabricated(instance, self._attribute_name, field)
+        return field
+
+
+#: Fields of the document store record outside record fields.
+_DOCUMENT_FIELDS = ('_metadata', '_id')
+
+#: Record fields exported as provenance.
+_PROVENANCE_FIELDS = frozenset(('_provenance', '_aggregator_identifier',
+                                '_direct_base_url', '_source_fingerprint'))
+
+
+def _complete(item, keys):
+    if all(key in item for key in keys):
+        return item
+    return {**dict.fromkeys(keys), **item}
+
+
+class _PartialRecordMixin:
+    """Record built from a partial document.
+
+    Only fields present in the document are fabricated. Absent fields
+    are fabricated empty on first access. Exports contain present and
+    accessed fields only.
+    """
+
+    def export_dict(self, include_provenance=True, include_metadata=True, include_id=True):
+        """Export fields of the partial record as a dict.
+
+        :param bool include_provenance: Include provenance in export.
+        :param bool include_metadata: Include metadata in export.
+        :param bool include_id: Include id in export.
+        :returns: Record as dictionary.
+        :rtype: dict
+        """
+        fields = vars(self)
+        dct = {}
+        for name, _ in self.record_fields():
+            if name in fields and (include_provenance or name not in _PROVENANCE_FIELDS):
+                dct.update(fields[name].export_dict())
+        for name, include in zip(_DOCUMENT_FIELDS, (include_metadata, include_id)):
+            if include and name in fields:
+                dct.update(fields[name].export_dict())
+        return dct
+
+    def _export_tracked(self):
+        return self.export_dict(include_metadata=False, include_id=False)
+
+
+#: Field methods that change field values.
+_FIELD_MUTATORS = ('add_value', 'set_value', 'import_records')
+
+
+#: Provenance values that repeat across records and are interned.
+_INTERNED_PROVENANCE_KEYS = ('harvest_date', 'base_url', 'metadata_namespace')
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def intern_provenance(provenance):
+    """Intern provenance values that repeat across records.
+
+    Harvest date, base url and metadata namespace are shared by most
+    records of a harvest. Interning them makes all records refer to a
+    single copy of each string. The given entry is not modified.
+
+    :param dict provenance: Provenance entry as exported in
+                            ``_provenance``.
+    :returns: New provenance entry with interned values.
+    :rtype: dict
+    """
+    interned = dict(provenance)
+    for key in _INTERNED_PROVENANCE_KEYS:
+        value = interned.get(key)
+        if value is not None:
+            interned[key] = _intern(value)
+    return interned
+
+
+class ProvenanceEntry(namedtuple('ProvenanceEntry', ['harvest_date', 'altered', 'base_url',
+                                                     'identifier', 'datestamp', 'direct',
+                                                     'metadata_namespace'])):
+    """Compact immutable provenance entry.
+
+    Fields correspond to the keys of a provenance entry exported in
+    ``_provenance``. Repeating values are interned.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, provenance):
+        """Create entry from exported provenance dictionary.
+
+        :param dict provenance: Provenance entry as exported in
+                                ``_provenance``.
+        :returns: Provenance entry.
+        :rtype: :obj:`ProvenanceEntry`
+        """
+        return cls(_intern(provenance.get('harvest_date')), provenance.get('altered'),
+                   _intern(provenance.get('base_url')), provenance.get('identifier'),
+                   provenance.get('datestamp'), provenance.get('direct'),
+                   _intern(provenance.get('metadata_namespace')))
+
+    def as_dict(self):
+        """Export entry as a dictionary.
+
+        :returns: Provenance entry as exported in ``_provenance``.
+        :rtype: dict
+        """
+        return dict(zip(self._fields, self))
+
+
+class Index(namedtuple('Index', ['keys', 'name', 'unique', 'partial_filter'])):
+    """Declarative specification of a MongoDB index.
+
+    Keys are (field path, direction) pairs. A single pair declares a
+    single field index, several pairs a compound index. If name is not
+    given, it is generated the same way MongoDB generates default
+    index names.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, keys, name=None, unique=False, partial_filter=None):
+        """Create index specification.
+
+        :param list keys: (field path, direction) pairs. Direction is
+                          :data:`cdcagg_common.mdb_const.MDB_ASCENDING` or
+                          :data:`cdcagg_common.mdb_const.MDB_DESCENDING`.
+        :param str or None name: Index name.
+        :param bool unique: Declare unique index.
+        :param dict or None partial_filter: Filter expression for a partial
+                                            index.
+        :returns: Index specification.
+        :rtype: :obj:`Index`
+        """
+        keys = tuple((path, direction) for path, direction in keys)
+        if not keys:
+            raise ValueError("Index must have at least one key")
+        if name is None:
+            name = '_'.join(f'{path}_{direction}' for path, direction in keys)
+        return super().__new__(cls, keys, name, unique, partial_filter)
+
+    @property
+    def fields(self):
+        """Field paths of the index in order.
+
+        :rtype: tuple
+        """
+        return tuple(path for path, _ in self.keys)
+
+    def as_mongo(self):
+        """Export as keyword arguments for creating the index.
+
+        The result is accepted by ``pymongo.IndexModel`` and
+        ``create_index()`` of pymongo and motor collections.
+
+        :returns: Index specification.
+        :rtype: dict
+        """
+        spec = {'keys': list(self.keys), 'name': self.name}
+        if self.unique:
+            spec['unique'] = True
+        if self.partial_filter is not None:
+            spec['partialFilterExpression'] = self.partial_filter
+        return spec
+
+
+def _provenance_key(provenance):
+    return (provenance.get('harvest_date'), provenance.get('direct'),
+            provenance.get('base_url'), provenance.get('identifier'))
+
+
+def _harvest_groups(provenances):
+    group = []
+    for provenance in provenances:
+        if group and provenance.get('direct'):
+            yield group
+            group = []
+        group.append(provenance)
+    if group:
+        yield group
+
+
+def merge_provenances(*provenance_lists, max_history=None):
+    """Merge lists of exported provenance entries.
+
+    Entries are merged per harvest. A harvest is a direct entry and the
+    indirect entries that follow it. Indirect entries carry the harvest
+    dates of upstream aggregators, so harvests are ordered and capped
+    by the harvest date of their direct entry and their entries are
+    never separated.
+
+    Harvests are identified by ``(harvest_date, direct, base_url,
+    identifier)`` of the direct entry. The first occurrence of a harvest
+    is kept and later duplicates are dropped. Harvests are ordered by
+    harvest date in ascending order. Harvests of the same date keep the
+    order of their first occurrence.
+
+    :param list provenance_lists: Lists of provenance dictionaries as
+                                  exported in ``_provenance``.
+    :param int or None max_history: Keep harvests of at most this many
+                                    most recent harvest dates. None
+                                    keeps all.
+    :returns: Merged provenance entries.
+    :rtype: list
+    """
+    seen = set()
+    by_harvest_date = {}
+    for provenances in provenance_lists:
+        for group in _harvest_groups(provenances):
+            key = _provenance_key(group[0])
+            if key in seen:
+                continue
+            seen.add(key)
+            by_harvest_date.setdefault(key[0], []).extend(group)
+    harvest_dates = sorted(by_harvest_date, key=lambda harvest_date: (harvest_date is not None,
+                                                                        harvest_date or ''))
+    if max_history is not None:
+        harvest_dates = harvest_dates[len(harvest_dates) - max_history:] if max_history > 0 else []
+    return [provenance for harvest_date in harvest_dates for provenance in by_harvest_date[harvest_date]]
+
+
+class _InvalidatingMutator:
+    """Field method wrapper clearing the record export cache.
+
+    Holds the field and the cache instead of a bound method, so copies
+    of records get wrappers bound to the copied field and cache.
+    """
+
+    __slots__ = ('_field', '_name', '_cache')
+
+    def __init__(self, field, name, cache):
+        self._field = field
+        self._name = name
+        self._cache = cache
+
+    def __call__(self, *args, **kwargs):
+        self._cache.clear()
+        return getattr(type(self._field), self._name)(self._field, *args, **kwargs)
+
+
+def _watch_field(field, cache):
+    for mutator in _FIELD_MUTATORS:
+        if hasattr(field, mutator):
+            setattr(field, mutator, _InvalidatingMutator(field, mutator, cache))
 
 
 class RecordBase(records.RecordBase):
     """Base class for all CDC Aggregator records.
 
     Subclass of :class:`kuha_common.document_store.records`, which
-    defines additional :attr:`_provenance`, :attr:`_direct_base_url`
-    and :attr:`_aggregator_identifier` attributes.
+    defines additional :attr:`_provenance`, :attr:`_direct_base_url`,
+    :attr:`_aggregator_identifier` and :attr:`_source_fingerprint`
+    attributes.
+
+    Record fields are collected once per record class when the class is
+    created. :meth:`iterate_record_fields` iterates the cached table.
+
+    The aggregator attributes are fabricated on first access, so
+    records that never touch them do not pay for fabrication.
+
+    Exports are cached only if the record is instantiated with
+    ``cache_exports``, since watching the fields for changes costs more
+    than a single export. Cached dictionaries are kept until the record
+    changes. The cache is invalidated by the setters, by import and by
+    the ``add_value``, ``set_value`` and ``import_records`` methods of
+    the record's fields. Call :meth:`invalidate_export_cache` after
+    changing values through other means, such as attributes of
+    individual values.
     """
 
-    _provenance = FieldTypeFactory('_provenance', 'harvest_date',
-                                   attrs=['altered', 'base_url',
-                                          'identifier', 'datestamp',
-                                          'direct',
-                                          'metadata_namespace'],
-                                   localizable=False)
-    _direct_base_url = FieldTypeFactory('_direct_base_url',
-                                        localizable=False, single_value=True)
-    _aggregator_identifier = FieldTypeFactory('_aggregator_identifier',
-                                              localizable=False, single_value=True)
-
-    def __init__(self, document_store_dictionary=None):
+    #: Indexes declared by the class. Subclasses add to indexes declared
+    #: by their bases.
+    _indexes = (
+        Index([('_aggregator_identifier', MDB_ASCENDING)], unique=True,
+              partial_filter={'_aggregator_identifier': {MDB_TYPE: MDB_TYPE_STRING}}),
+        Index([('_direct_base_url', MDB_ASCENDING), ('_metadata.updated', MDB_DESCENDING)]),
+        Index([('_direct_base_url', MDB_ASCENDING), ('_aggregator_identifier', MDB_ASCENDING)]),
+        Index([('_provenance.identifier', MDB_ASCENDING)]),
+        Index([('_provenance.datestamp', MDB_DESCENDING)]),
+        Index([('_metadata.created', MDB_DESCENDING)]),
+        Index([('_metadata.updated', MDB_DESCENDING)]),
+        Index([('_metadata.deleted', MDB_DESCENDING)]),
+    )
+
+    #: Allowed types of values by field name, checked by the compiled
+    #: validator. See :func:`cdcagg_common.validation.compile_field`.
+    _value_types = {
+        '_provenance': {'harvest_date': (str,), 'altered': (bool,), 'direct': (bool,),
+                        'base_url': (str, type(None)), 'identifier': (str, type(None)),
+                        'datestamp': (str, type(None)), 'metadata_namespace': (str, type(None))},
+        '_aggregator_identifier': (str, type(None)),
+        '_direct_base_url': (str, type(None)),
+        '_source_fingerprint': (str, type(None)),
+    }
+
+    #: Ordered (attribute_name, field) pairs of the record class.
+    _record_fields = ()
+    #: Read-only mapping of attribute_name to field.
+    _record_fields_by_name = MappingProxyType({})
+
+    _provenance = _LazyFieldTypeFactory('_provenance', 'harvest_date',
+                                        attrs=['altered', 'base_url',
+                                               'identifier', 'datestamp',
+                                               'direct',
+                                               'metadata_namespace'],
+                                        localizable=False)
+    _direct_base_url = _LazyFieldTypeFactory('_direct_base_url',
+                                             localizable=False, single_value=True)
+    _aggregator_identifier = _LazyFieldTypeFactory('_aggregator_identifier',
+                                                   localizable=False, single_value=True)
+    _source_fingerprint = _LazyFieldTypeFactory('_source_fingerprint',
+                                                localizable=False, single_value=True)
+
+    def __init__(self, document_store_dictionary=None, track_changes=False, cache_exports=False):
         """Instantiate a record instance.
 
         If document_store_dictionary is given on init, the object is
         assumed an existing record and no attributes for new record are
         created.
 
+        Change tracking is opt-in, since taking the snapshot costs a
+        full export. If track_changes is True, imported values are taken
+        as the unchanged state for :meth:`export_changes`.
+
+        Export caching is opt-in as well. Use it for records that are
+        exported repeatedly without changes.
+
         :note: Do not instantiate directly but use from a subclass.
 
         :param dict or None document_store_dictionary: Record response from DocStore converted from JSON by Python dict.
+        :param bool track_changes: Track changes made after import.
+        :param bool cache_exports: Cache exported dictionaries until the
+                                   record changes.
         :returns: Instance of a record subclass.
         """
-        self._provenance = self._provenance.fabricate()
-        self._direct_base_url = self._direct_base_url.fabricate()
-        self._aggregator_identifier = self._aggregator_identifier.fabricate()
+        self._snapshot = None
+        self._export_cache = {} if cache_exports else None
+        self._export_cache_watching = False
         if document_store_dictionary is not None:
             self._import_provenance(document_store_dictionary)
         super().__init__(document_store_dictionary)
+        if track_changes:
+            self.mark_clean()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._build_record_fields()
+
+    @classmethod
+    def _collect_record_fields(cls):
+        """Collect record fields by walking the class hierarchy.
+
+        Called once per record class. Override to change the fields
+        collected for the class.
+
+        :returns: iterable of (attribute_name, field) pairs.
+        """
+        return super().iterate_record_fields()
+
+    @classmethod
+    def _build_record_fields(cls):
+        fields = tuple(cls._collect_record_fields())
+        cls._record_fields = fields
+        cls._record_fields_by_name = MappingProxyType(dict(fields))
+
+    @classmethod
+    def _document_field(cls, name):
+        factory = cls._record_fields_by_name.get(name)
+        if factory is None and name in _DOCUMENT_FIELDS:
+            factory = getattr(cls, name, None)
+            if not isinstance(factory, FieldTypeFactory):
+                factory = None
+        return factory
+
+    @classmethod
+    def projection(cls, fields, include_id=True):
+        """Build a projection for fetching only given fields.
+
+        Fields are attribute names of record fields, ``_metadata`` or
+        ``_id``. Subfields are given with dot notation, for example
+        ``_provenance.datestamp``. A subfield is an attribute, the value
+        key or the language key of the field.
+
+        :param fields: Field paths to fetch.
+        :type fields: list or tuple
+        :param bool include_id: Fetch ``_id``.
+        :returns: Projection for DocStore and MongoDB queries.
+        :rtype: dict
+        :raises: :exc:`ValueError` for an unknown field or subfield.
+        """
+        projection = {}
+        for path in fields:
+            if path != '_id':
+                name, _, subfield = path.partition('.')
+                factory = cls._document_field(name)
+                if factory is None or (subfield and subfield not in validation.field_keys(factory)):
+                    raise ValueError(f"{cls.__name__} has no field {path}")
+            projection[path] = 1
+        if not include_id and '_id' not in projection:
+            projection['_id'] = 0
+        return projection
+
+    @classmethod
+    def _partial_class(cls):
+        partial_class = cls.__dict__.get('_partial_record_class')
+        if partial_class is None:
+            attrs = {'_collect_record_fields': classmethod(lambda _: cls._record_fields),
+                     '__module__': cls.__module__, '__doc__': _PartialRecordMixin.__doc__}
+            names = [name for name, _ in cls._record_fields]
+            names.extend(_DOCUMENT_FIELDS)
+            for name in names:
+                factory = cls._document_field(name)
+                if factory is not None and not isinstance(factory, _LazyFieldTypeFactory):
+                    attrs[name] = _AbsentField(factory, name)
+            partial_class = type(f'Partial{cls.__name__}', (_PartialRecordMixin, cls), attrs)
+            cls._partial_record_class = partial_class
+        return partial_class
+
+    @classmethod
+    def from_partial(cls, document):
+        """Instantiate record from a partial document.
+
+        Use with documents fetched with a :meth:`projection`. Only fields
+        present in the document are fabricated and imported. The record
+        is an instance of a subclass of cls, which exports only fields
+        present in the document or accessed afterwards.
+
+        Keys missing from the objects of a subfield projection are
+        imported as None. Such records are for reading only and must
+        not be written back.
+
+        :param dict document: Partial record from DocStore.
+        :returns: Record instance.
+        """
+        partial_class = cls._partial_class()
+        record = partial_class.__new__(partial_class)
+        record._snapshot = None
+        record._export_cache = None
+        record._export_cache_watching = False
+        for name, value in document.items():
+            factory = cls._document_field(name)
+            if factory is None:
+                continue
+            keys = validation.field_keys(factory)
+            if keys:
+                value = _complete(value, keys) if factory.single_value else \
+                    [_complete(item, keys) for item in value]
+            if name == '_provenance':
+                value = [intern_provenance(provenance) for provenance in value]
+            elif name == '_direct_base_url':
+                value = _intern(value)
+            getattr(record, name).import_records(value)
+        return record
+
+    @classmethod
+    def validator(cls):
+        """Get validator compiled for the record class.
+
+        Compiled on first call and cached for the class.
+
+        :returns: Validator for documents of the record class.
+        :rtype: :obj:`cdcagg_common.validation.Validator`
+        """
+        compiled = cls.__dict__.get('_compiled_validator')
+        if compiled is None:
+            compiled = cls._compiled_validator = validation.compile_validator(cls)
+        return compiled
+
+    @classmethod
+    def list_indexes(cls):
+        """List indexes declared for the record class and its bases.
+
+        Base class indexes come first. If a subclass declares an index
+        with the same name, it replaces the base class index.
+
+        :returns: Index specifications.
+        :rtype: tuple
+        """
+        indexes = {}
+        for klass in reversed(cls.__mro__):
+            for index in vars(klass).get('_indexes', ()):
+                indexes[index.name] = index
+        return tuple(indexes.values())
+
+    @classmethod
+    def record_fields(cls):
+        """Get record fields of the class.
+
+        :returns: Ordered (attribute_name, field) pairs.
+        :rtype: tuple
+        """
+        return cls._record_fields
+
+    @classmethod
+    def get_record_field(cls, name):
+        """Get record field by attribute name.
+
+        :param str name: Attribute name of the field.
+        :returns: Field or None if the class has no such field.
+        """
+        return cls._record_fields_by_name.get(name)
+
+    @classmethod
+    def iterate_record_fields(cls):
+        """Iterate record fields from the cached table.
+
+        :returns: iterator yielding (attribute_name, field) pairs.
+        :rtype: iterator
+        """
+        return iter(cls._record_fields)
+
+    @classmethod
+    def iter_from_stream(cls, stream, chunk_size=streams.DEFAULT_CHUNK_SIZE, track_changes=False):
+        """Iterate records from a stream of DocStore records.
+
+        Reads a JSON array or NDJSON stream incrementally and
+        instantiates one record at a time.
+
+        :param stream: Binary or text stream with a ``read()`` method.
+        :param int chunk_size: Number of bytes or characters to read at a
+                               time.
+        :param bool track_changes: Track changes made after import.
+        :returns: generator yielding record instances.
+        :raises: :exc:`json.JSONDecodeError` for invalid JSON.
+        """
+        for document_store_dictionary in streams.iter_json_documents(stream, chunk_size):
+            yield cls(document_store_dictionary, track_changes=track_changes)
 
     def set_aggregator_identifier(self, value):
         """Set aggregator identifier.
@@ -66,8 +620,19 @@ class RecordBase(records.RecordBase):
 
         :param str value: Aggregator identifier
         """
+        self.invalidate_export_cache()
         self._aggregator_identifier.set_value(value)
 
+    def set_source_fingerprint(self, value):
+        """Set fingerprint of the source metadata.
+
+        Silently overwrites previous value, if any.
+
+        :param str value: Source metadata fingerprint.
+        """
+        self.invalidate_export_cache()
+        self._source_fingerprint.set_value(value)
+
     def set_direct_base_url(self, value):
         """Set direct base url
 
@@ -76,37 +641,177 @@ class RecordBase(records.RecordBase):
         """
         if self._direct_base_url.get_value() is not None:
             raise ValueError("Direct base url is already set")
+        self.invalidate_export_cache()
         self._direct_base_url.set_value(value)
 
     def _import_provenance(self, dct):
-        if self._provenance.name in dct:
-            self._provenance.import_records(dct[self._provenance.name])
-        if self._aggregator_identifier.name in dct:
-            self._aggregator_identifier.import_records(dct[self._aggregator_identifier.name])
-        if self._direct_base_url.name in dct:
-            self._direct_base_url.import_records(dct[self._direct_base_url.name])
+        # Look up names from the class, so that fields absent from dct
+        # are not fabricated.
+        cls = type(self)
+        self.invalidate_export_cache()
+        if cls._provenance.name in dct:
+            self._provenance.import_records([intern_provenance(provenance)
+                                             for provenance in dct[cls._provenance.name]])
+        if cls._aggregator_identifier.name in dct:
+            self._aggregator_identifier.import_records(dct[cls._aggregator_identifier.name])
+        if cls._direct_base_url.name in dct:
+            self._direct_base_url.import_records(_intern(dct[cls._direct_base_url.name]))
+        if cls._source_fingerprint.name in dct:
+            self._source_fingerprint.import_records(dct[cls._source_fingerprint.name])
 
-    def export_provenance_dict(self):
-        """Export provenance info as a dictionary.
+    def _export_tracked(self):
+        dct = super().export_dict(include_metadata=False, include_id=False)
+        dct.update(self._build_provenance_dict())
+        return dct
 
-        :returns: Record's provenance info.
+    def mark_clean(self):
+        """Take current field values as the unchanged state.
+
+        Starts change tracking. Called after import if the record was
+        instantiated with track_changes. Call after the record has been
+        written to reset change tracking.
+        """
+        self._snapshot = self._export_tracked()
+
+    def is_dirty(self):
+        """Tell whether any field has changed since the record was
+        marked clean.
+
+        :returns: True if the record has changes.
+        :rtype: bool
+        """
+        return bool(self.export_changes())
+
+    def export_changes(self):
+        """Export fields changed since the record was marked clean.
+
+        The result is suitable for a ``$set`` update. Metadata and id
+        are not tracked. For a record that is not tracking changes,
+        all fields are exported.
+
+        :returns: Changed fields as dictionary.
         :rtype: dict
         """
+        current = self._export_tracked()
+        snapshot = self._snapshot
+        if snapshot is None:
+            return current
+        return {key: value for key, value in current.items()
+                if key not in snapshot or snapshot[key] != value}
+
+    def invalidate_export_cache(self):
+        """Discard cached exports.
+
+        Subsequent exports are built from the field values.
+        """
+        if self._export_cache is not None:
+            self._export_cache.clear()
+
+    def _watch_fields(self):
+        # Fields fabricated later are watched on fabrication.
+        cache = self._export_cache
+        fields = vars(self)
+        names = [name for name, _ in self.record_fields()]
+        names.extend(_DOCUMENT_FIELDS)
+        for name in names:
+            field = fields.get(name)
+            if field is not None:
+                _watch_field(field, cache)
+        self._export_cache_watching = True
+
+    def _cache_export(self, key, dct):
+        if not self._export_cache_watching:
+            self._watch_fields()
+        self._export_cache[key] = dct
+
+    def provenance_entries(self):
+        """Get provenance as compact entries.
+
+        :returns: Provenance entries.
+        :rtype: tuple
+        """
+        return tuple(ProvenanceEntry.from_dict(provenance)
+                     for provenance in self._provenance.export_dict()[self._provenance.name])
+
+    def merge_provenance(self, other, max_history=None):
+        """Merge provenance of other record to this record.
+
+        Replaces the provenance of this record with the result of
+        :func:`merge_provenances` over this record's provenance
+        followed by other's.
+
+        :param other: Record or list of exported provenance entries to
+                      merge from.
+        :type other: :obj:`RecordBase` or list
+        :param int or None max_history: Keep entries of at most this many
+                                        most recent harvest dates.
+        """
+        name = self._provenance.name
+        if isinstance(other, RecordBase):
+            other = other._provenance.export_dict()[name]
+        merged = merge_provenances(self._provenance.export_dict()[name], other,
+                                   max_history=max_history)
+        self.invalidate_export_cache()
+        self._export_cache_watching = False
+        self._provenance = type(self)._provenance.fabricate()
+        self._provenance.import_records([intern_provenance(provenance) for provenance in merged])
+
+    def _build_provenance_dict(self):
         dct = self._provenance.export_dict()
         dct.update(self._aggregator_identifier.export_dict())
         dct.update(self._direct_base_url.export_dict())
+        dct.update(self._source_fingerprint.export_dict())
         return dct
 
+    def export_provenance_dict(self):
+        """Export provenance info as a dictionary.
+
+        If exports are cached, the result is cached until the record
+        changes. Nested values are then shared with the cache and must
+        not be modified.
+
+        :returns: Record's provenance info.
+        :rtype: dict
+        """
+        if self._export_cache is None:
+            return self._build_provenance_dict()
+        dct = self._export_cache.get('provenance')
+        if dct is None:
+            dct = self._build_provenance_dict()
+            self._cache_export('provenance', dct)
+        return dict(dct)
+
     def export_dict(self, include_provenance=True, **kwargs):
         """Export record as a dict.
 
         Additional keyword arguments are passed to parent method
         :meth:`kuha_common.document_store.records.RecordBase.export_dict`
 
+        If exports are cached, the result is cached until the record
+        changes. Nested values are then shared with the cache and must
+        not be modified.
+
         :param bool include_provenance: Include provenance in export.
         :returns: Record as dictionary.
         :rtype: dict
         """
+        start = instrumentation.clock()
+        cache = self._export_cache
+        if cache is None:
+            dct = self._build_export_dict(include_provenance, kwargs)
+        else:
+            key = (include_provenance, tuple(sorted(kwargs.items())))
+            dct = cache.get(key)
+            if dct is None:
+                dct = self._build_export_dict(include_provenance, kwargs)
+                self._cache_export(key, dct)
+            dct = dict(dct)
+        if start is not None:
+            instrumentation.observe(instrumentation.STAGE_EXPORT, start, type(self),
+                                    self._direct_base_url.get_value())
+        return dct
+
+    def _build_export_dict(self, include_provenance, kwargs):
         dct = super().export_dict(**kwargs)
         if include_provenance:
             dct.update(self.export_provenance_dict())
@@ -120,11 +825,14 @@ class Study(RecordBase, records.Study):
     :class:`kuha_common.document_store.records.Study`
     """
     @classmethod
-    def iterate_record_fields(cls):
-        """Override iterate_record_fields to include fields from both
+    def _collect_record_fields(cls):
+        """Override _collect_record_fields to include fields from both
         inherited classes.
 
         :returns: iterator yielding record fields.
         :rtype: iterator
         """
-        return chain(super().iterate_record_fields(), records.Study.iterate_record_fields())
+        return chain(super()._collect_record_fields(), records.Study.iterate_record_fields())
+
+
+RecordBase._build_record_fields()
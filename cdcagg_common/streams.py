@@ -0,0 +1,293 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Incremental reading and writing of JSON documents in streams.
+
+Reading supports newline delimited JSON (NDJSON) and JSON arrays.
+Documents are decoded one at a time from a buffer that only holds the
+unread part of the stream, so memory stays proportional to a single
+document instead of the whole stream.
+
+Writing serializes records as NDJSON to a binary file-like object
+through a reused buffer, optionally compressed with gzip or, if the
+``zstandard`` package is installed, zstd.
+"""
+import json
+import codecs
+import gzip
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+#: Default number of bytes or characters to read at a time.
+DEFAULT_CHUNK_SIZE = 65536
+
+_WHITESPACE = ' \t\n\r'
+_NUMBER_CHARS = frozenset('0123456789+-.eE')
+_LITERALS = ('true', 'false', 'null', 'NaN', 'Infinity', '-Infinity')
+
+# Parser states in JSON array.
+_ARRAY_VALUE_OR_END = 1
+_ARRAY_SEPARATOR_OR_END = 2
+_ARRAY_VALUE = 3
+
+
+def _iter_text_chunks(stream, chunk_size):
+    decoder = None
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, bytes):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder('utf-8')()
+            chunk = decoder.decode(chunk)
+            if not chunk:
+                continue
+        yield chunk
+    if decoder is not None:
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            yield tail
+
+
+def _skip_whitespace(buf, pos):
+    end = len(buf)
+    while pos < end and buf[pos] in _WHITESPACE:
+        pos += 1
+    return pos
+
+
+def _error(msg, buf, pos):
+    return json.JSONDecodeError(msg, buf, pos)
+
+
+def _is_number_tail(tail):
+    return all(char in _NUMBER_CHARS for char in tail)
+
+
+def _may_be_truncated(exc):
+    """Tell whether decoding may succeed once more input is read.
+
+    True if the error is at the end of the buffer or the rest of the
+    buffer is a prefix of a valid value. Errors within the buffer are
+    not retried, so malformed input is reported without reading the
+    rest of the stream.
+    """
+    tail = exc.doc[exc.pos:]
+    if not tail or exc.msg.startswith('Unterminated string'):
+        return True
+    if exc.msg == 'Invalid \\uXXXX escape':
+        return len(tail) <= 5
+    return _is_number_tail(tail) or any(literal.startswith(tail) for literal in _LITERALS)
+
+
+def iter_json_documents(stream, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Iterate JSON documents incrementally from a stream.
+
+    The stream may contain a single JSON array, in which case its
+    items are yielded, or whitespace separated JSON documents, such
+    as NDJSON.
+
+    :param stream: Binary or text stream with a ``read()`` method.
+                   Binary streams are decoded as UTF-8.
+    :param int chunk_size: Number of bytes or characters to read at a
+                           time.
+    :returns: generator yielding decoded documents.
+    :raises: :exc:`json.JSONDecodeError` for invalid JSON.
+    """
+    decoder = json.JSONDecoder()
+    chunks = _iter_text_chunks(stream, chunk_size)
+    buf = ''
+    pos = 0
+    eof = False
+    array_state = None
+    array_done = False
+
+    def _read_more():
+        nonlocal buf, pos, eof
+        for chunk in chunks:
+            buf = buf[pos:] + chunk
+            pos = 0
+            return
+        eof = True
+
+    while True:
+        pos = _skip_whitespace(buf, pos)
+        if pos == len(buf):
+            if eof:
+                break
+            _read_more()
+            continue
+        if array_done:
+            raise _error('Extra data', buf, pos)
+        char = buf[pos]
+        if array_state is None:
+            if char == '[':
+                array_state = _ARRAY_VALUE_OR_END
+                pos += 1
+                continue
+            array_state = False
+        if array_state:
+            if char == ']' and array_state != _ARRAY_VALUE:
+                array_done = True
+                pos += 1
+                continue
+            if array_state == _ARRAY_SEPARATOR_OR_END:
+                if char != ',':
+                    raise _error("Expecting ',' delimiter", buf, pos)
+                array_state = _ARRAY_VALUE
+                pos += 1
+                continue
+        try:
+            document, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError as exc:
+            if eof or not _may_be_truncated(exc):
+                raise
+            _read_more()
+            continue
+        if not eof and (end == len(buf) or (type(document) in (int, float) and
+                                            _is_number_tail(buf[end:]))):
+            # A number or literal may continue in the next chunk.
+            _read_more()
+            continue
+        pos = end
+        if array_state:
+            array_state = _ARRAY_SEPARATOR_OR_END
+        yield document
+    if array_state and not array_done:
+        raise _error('Unterminated array', buf, pos)
+
+
+#: Supported values for ``compression``.
+COMPRESSION_GZIP = 'gzip'
+COMPRESSION_ZSTD = 'zstd'
+
+
+def _open_compressed(fileobj, compression, compresslevel):
+    if compression is None:
+        return fileobj
+    if compression == COMPRESSION_GZIP:
+        return gzip.GzipFile(fileobj=fileobj, mode='wb',
+                             compresslevel=9 if compresslevel is None else compresslevel)
+    if compression == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        compressor = zstandard.ZstdCompressor(level=3 if compresslevel is None else compresslevel)
+        return compressor.stream_writer(fileobj, closefd=False)
+    raise ValueError(f"Unsupported compression: {compression}")
+
+
+class NDJSONWriter:
+    """Write records to a binary file-like object as NDJSON.
+
+    Records are exported with
+    :meth:`cdcagg_common.records.RecordBase.export_dict` and encoded
+    into a buffer that is reused between writes. The buffer is written
+    out when it grows over ``buffer_size``. Closing the writer flushes
+    the buffer and finishes compression, but leaves ``fileobj`` open.
+
+    Use as a context manager::
+
+        with NDJSONWriter(fileobj, compression='gzip') as writer:
+            writer.write_many(studies)
+    """
+
+    def __init__(self, fileobj, compression=None, compresslevel=None,
+                 buffer_size=DEFAULT_CHUNK_SIZE, include_provenance=True):
+        """Initiate NDJSONWriter.
+
+        :param fileobj: Binary file-like object to write to.
+        :param str or None compression: None, 'gzip' or 'zstd'.
+        :param int or None compresslevel: Compression level. Defaults
+                                          to the library default.
+        :param int buffer_size: Bytes to buffer before writing out.
+        :param bool include_provenance: Include provenance in export.
+        :raises: :exc:`ValueError` for unsupported compression.
+        """
+        self._fileobj = _open_compressed(fileobj, compression, compresslevel)
+        self._owns_fileobj = self._fileobj is not fileobj
+        self._encode = json.JSONEncoder(ensure_ascii=False, check_circular=False,
+                                        separators=(',', ':')).encode
+        self._buffer = bytearray()
+        self._buffer_size = buffer_size
+        self._include_provenance = include_provenance
+        self.count = 0
+
+    def write_dict(self, dct):
+        """Write a document.
+
+        :param dict dct: Document to write.
+        """
+        buf = self._buffer
+        buf += self._encode(dct).encode('utf8')
+        buf += b'\n'
+        self.count += 1
+        if len(buf) >= self._buffer_size:
+            self.flush()
+
+    def write(self, record):
+        """Write a record.
+
+        :param record: Record to write.
+        :type record: :obj:`cdcagg_common.records.RecordBase`
+        """
+        self.write_dict(record.export_dict(include_provenance=self._include_provenance))
+
+    def write_many(self, records):
+        """Write records.
+
+        :param records: Iterable of records.
+        :returns: Number of records written.
+        :rtype: int
+        """
+        count = self.count
+        for record in records:
+            self.write(record)
+        return self.count - count
+
+    def flush(self):
+        """Write out buffered data."""
+        if self._buffer:
+            self._fileobj.write(self._buffer)
+            del self._buffer[:]
+
+    def close(self):
+        """Flush buffer and finish compression."""
+        self.flush()
+        if self._owns_fileobj:
+            self._fileobj.close()
+        else:
+            self._fileobj.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def write_ndjson(records, fileobj, **kwargs):
+    """Write records to a binary file-like object as NDJSON.
+
+    Keyword arguments are passed to :class:`NDJSONWriter`.
+
+    :param records: Iterable of records.
+    :param fileobj: Binary file-like object to write to.
+    :returns: Number of records written.
+    :rtype: int
+    """
+    with NDJSONWriter(fileobj, **kwargs) as writer:
+        return writer.write_many(records)
@@ -0,0 +1,237 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compiled validation of record documents.
+
+DocStore validation is constructed from the record fields. Building it
+for every document repeats the same work. :func:`compile_validator`
+walks the fields of a record class once and produces a
+:class:`Validator` that checks plain dictionaries without
+instantiating records. Use :meth:`cdcagg_common.records.RecordBase.validator`
+to get the cached validator of a record class.
+
+Each field is checked for its shape:
+
+* Single value fields without subfields hold a scalar.
+* Fields with a value key, attributes or language hold objects whose
+  keys are limited to those, with scalar values. Objects of fields
+  with a value key must contain it. Single value fields hold one
+  object, others a list of objects.
+* Multi value fields without subfields hold a list of scalars.
+
+Scalars are strings, numbers, booleans and null. Record classes
+narrow the types of individual values in ``_value_types``, for example
+boolean ``altered`` and ``direct`` in ``_provenance``.
+
+Differences from DocStore validation: documents are checked as they
+are, without instantiating records or converting values. Values whose
+types are not declared by the record class only need to be scalars,
+and formats of values, such as datestamps, are not checked. ``_id``
+and ``_metadata`` are managed by DocStore and are not checked. Missing
+fields are accepted.
+"""
+
+#: Key of the language of a localizable value.
+LANGUAGE_KEY = 'language'
+
+#: Document keys managed by DocStore and not validated.
+DOCUMENT_KEYS = ('_id', '_metadata')
+
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+
+
+class ValidationError(ValueError):
+    """Document failed validation.
+
+    :attr:`errors` maps field names to lists of messages.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"Document failed validation: {errors}")
+
+
+def _describe(types):
+    if types == _SCALAR_TYPES:
+        return 'a scalar'
+    return ' or '.join('null' if type_ is type(None) else type_.__name__ for type_ in types)
+
+
+def _scalar_checker(name, types=_SCALAR_TYPES):
+    description = _describe(types)
+
+    def check(value):
+        if not isinstance(value, types):
+            return [f"{name} must be {description}, got {type(value).__name__}"]
+        return None
+    return check
+
+
+def _object_checker(name, allowed_keys, required_keys=(), key_types=None):
+    key_types = {key: (types, _describe(types)) for key, types in (key_types or {}).items()}
+    scalar = (_SCALAR_TYPES, _describe(_SCALAR_TYPES))
+    allowed_keys = {key: key_types.get(key, scalar) for key in allowed_keys}
+
+    def check(value):
+        if not isinstance(value, dict):
+            return [f"{name} must be an object, got {type(value).__name__}"]
+        errors = None
+        for key in required_keys:
+            if key not in value:
+                errors = errors or []
+                errors.append(f"{name} is missing key {key}")
+        for key, item in value.items():
+            allowed = allowed_keys.get(key)
+            if allowed is None:
+                errors = errors or []
+                errors.append(f"{name} has unknown key {key}")
+            elif not isinstance(item, allowed[0]):
+                errors = errors or []
+                errors.append(f"{name}.{key} must be {allowed[1]}, got {type(item).__name__}")
+        return errors
+    return check
+
+
+def _list_checker(name, item_check):
+    def check(value):
+        if not isinstance(value, list):
+            return [f"{name} must be a list, got {type(value).__name__}"]
+        errors = None
+        for item in value:
+            item_errors = item_check(item)
+            if item_errors:
+                errors = errors or []
+                errors.extend(item_errors)
+        return errors
+    return check
+
+
+def field_keys(factory):
+    """Get keys of the objects held by a field.
+
+    :param factory: Field type factory.
+    :type factory: :obj:`kuha_common.document_store.field_types.FieldTypeFactory`
+    :returns: Attribute names followed by the value key and the
+              language key, if any. Empty for scalar fields.
+    :rtype: list
+    """
+    keys = list(factory.attrs or ())
+    if factory.sub_name:
+        keys.append(factory.sub_name)
+    if factory.localizable:
+        keys.append(LANGUAGE_KEY)
+    return keys
+
+
+def compile_field(factory, value_types=None):
+    """Compile checker for a field.
+
+    :param factory: Field type factory.
+    :type factory: :obj:`kuha_common.document_store.field_types.FieldTypeFactory`
+    :param value_types: Allowed types of values. For fields holding
+                        objects, a dict mapping keys to tuples of types.
+                        For other fields, a tuple of types. Values
+                        without declared types must be scalars.
+    :type value_types: dict or tuple or None
+    :returns: Function that takes a field value and returns None if the
+              value is valid or a list of error messages.
+    :rtype: callable
+    """
+    name = factory.name
+    keys = field_keys(factory)
+    if keys:
+        item_check = _object_checker(name, keys, [factory.sub_name] if factory.sub_name else (),
+                                     value_types)
+    else:
+        item_check = _scalar_checker(name, value_types or _SCALAR_TYPES)
+    if factory.single_value:
+        return item_check
+    return _list_checker(name, item_check)
+
+
+class Validator:
+    """Validator compiled for a record class."""
+
+    def __init__(self, checkers, allowed_keys=DOCUMENT_KEYS):
+        """Initiate Validator.
+
+        :param dict checkers: Checkers by field name.
+        :param tuple allowed_keys: Keys accepted without validation.
+        """
+        self._checkers = checkers
+        self._allowed_keys = frozenset(allowed_keys)
+
+    @property
+    def fields(self):
+        """Names of validated fields.
+
+        :rtype: tuple
+        """
+        return tuple(self._checkers)
+
+    def validate(self, document):
+        """Validate document.
+
+        Missing fields are accepted. Unknown keys are errors.
+
+        :param dict document: Document to validate.
+        :returns: Error messages by field name. Empty if document is valid.
+        :rtype: dict
+        """
+        checkers = self._checkers
+        errors = {}
+        for key, value in document.items():
+            checker = checkers.get(key)
+            if checker is None:
+                if key not in self._allowed_keys:
+                    errors[key] = [f"unknown field {key}"]
+                continue
+            field_errors = checker(value)
+            if field_errors:
+                errors[key] = field_errors
+        return errors
+
+    def is_valid(self, document):
+        """Tell whether document is valid.
+
+        :param dict document: Document to validate.
+        :rtype: bool
+        """
+        return not self.validate(document)
+
+    def check(self, document):
+        """Validate document and raise on errors.
+
+        :param dict document: Document to validate.
+        :returns: The document.
+        :rtype: dict
+        :raises: :exc:`ValidationError` if document is invalid.
+        """
+        errors = self.validate(document)
+        if errors:
+            raise ValidationError(errors)
+        return document
+
+
+def compile_validator(record_class):
+    """Compile validator for a record class.
+
+    Types of values are read from ``_value_types`` of the record class,
+    if declared.
+
+    :param record_class: Record class whose fields are validated.
+    :returns: Validator.
+    :rtype: :obj:`Validator`
+    """
+    value_types = getattr(record_class, '_value_types', {})
+    return Validator({factory.name: compile_field(factory, value_types.get(factory.name))
+                      for _, factory in record_class.record_fields()})
@@ -33,7 +33,7 @@ setup(name='cdcagg_common',
       license='EUPL v1.2',
       author='Toni Sissala',
       author_email='toni.sissala@tuni.fi',
-      packages=find_packages(exclude=['tests']),
+      packages=find_packages(exclude=['tests', 'benchmarks', 'benchmarks.*']),
       include_package_data=True,
       install_requires=requires,
       classifiers=(
@@ -0,0 +1,136 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import (
+    TestCase,
+    mock
+)
+from cdcagg_common import (
+    batch,
+    instrumentation,
+    mappings
+)
+
+
+def _getrecord(title, identifier, metadata_ns='ddi:codebook:2_5'):
+    return ('<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/">'
+            '<request>some.base.url</request>'
+            '<GetRecord><record><header>'
+            '<identifier>' + identifier + '</identifier>'
+            '<datestamp>2000-01-01</datestamp></header>'
+            '<metadata><codeBook xmlns="' + metadata_ns + '"><stdyDscr><citation><titlStmt>'
+            '<titl>' + title + '</titl>'
+            '</titlStmt></citation></stdyDscr></codeBook></metadata>'
+            '</record></GetRecord></OAI-PMH>')
+
+
+class TestMapRecord(TestCase):
+
+    def test_returns_exported_records(self):
+        records = batch.map_record(_getrecord('some title', 'some_id'))
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['study_number'], 'some.base.url__some_id')
+        self.assertEqual(records[0]['_direct_base_url'], 'some.base.url')
+
+    @mock.patch.dict(mappings._PARSER_REGISTRY)
+    def test_maps_with_parser_taking_only_root_element(self):
+
+        @mappings.register_parser('{some:namespace}root')
+        class _Parser:
+            def __init__(self, root_element):
+                self.studies = [mock.Mock(export_dict=mock.Mock(return_value={'some': 'record'}))]
+
+        source = _getrecord('some title', 'some_id').replace(
+            '<codeBook xmlns="ddi:codebook:2_5"><stdyDscr><citation><titlStmt>'
+            '<titl>some title</titl></titlStmt></citation></stdyDscr></codeBook>',
+            '<root xmlns="some:namespace"/>')
+        self.assertEqual(batch.map_record(source), [{'some': 'record'}])
+        results = list(batch.map_records([source], workers=0))
+        self.assertIsNone(results[0].error)
+        self.assertEqual(results[0].records, [{'some': 'record'}])
+
+
+class TestMapRecords(TestCase):
+
+    def _sources(self):
+        return [_getrecord('first', 'id_1'),
+                _getrecord('second', 'id_2', metadata_ns='unknown:namespace'),
+                'not xml',
+                _getrecord('fourth', 'id_4')]
+
+    def test_maps_in_process(self):
+        results = list(batch.map_records(self._sources(), workers=0, chunksize=3))
+        self.assertEqual([result.index for result in results], [0, 1, 2, 3])
+        self.assertEqual(results[0].records[0]['study_number'], 'some.base.url__id_1')
+        self.assertIsNone(results[0].error)
+        self.assertEqual(results[3].records[0]['study_number'], 'some.base.url__id_4')
+
+    def test_captures_errors_per_record(self):
+        results = list(batch.map_records(self._sources(), workers=0))
+        self.assertIsNone(results[1].records)
+        self.assertEqual(results[1].error.exception_type, 'UnknownXMLRoot')
+        self.assertIsNone(results[2].records)
+        self.assertEqual(results[2].error.exception_type, 'ParseError')
+        self.assertIn('Traceback', results[2].error.traceback)
+
+    def test_sets_source_fingerprint_on_request(self):
+        results = list(batch.map_records(self._sources(), workers=0))
+        self.assertIsNone(results[0].records[0]['_source_fingerprint'])
+        results = list(batch.map_records(self._sources(), workers=0, fingerprint_sources=True))
+        self.assertEqual(len(results[0].records[0]['_source_fingerprint']), 64)
+
+    def test_replays_worker_measurements(self):
+        aggregator = instrumentation.Aggregator()
+        instrumentation.enable(aggregator)
+        self.addCleanup(instrumentation.disable)
+        source = _getrecord('first', 'id_1')
+        list(batch.map_records([source, _getrecord('second', 'id_2')], workers=1, chunksize=1))
+        self.assertEqual(aggregator.counters[('records_mapped', 'DDI25RecordParser', 'some.base.url')], 2)
+        self.assertEqual(aggregator.stages[(instrumentation.STAGE_PARSE, 'DDI25RecordParser',
+                                            'some.base.url')].count, 2)
+        self.assertEqual(aggregator.counters[('bytes_processed', 'DDI25RecordParser', 'some.base.url')],
+                         2 * len(source))
+
+    def test_maps_in_process_pool_in_order(self):
+        results = list(batch.map_records(self._sources(), workers=2, chunksize=1, max_pending=2))
+        self.assertEqual([result.index for result in results], [0, 1, 2, 3])
+        self.assertEqual([result.error is None for result in results], [True, False, False, True])
+
+    def test_maps_in_process_pool_unordered(self):
+        results = list(batch.map_records(self._sources(), workers=2, chunksize=1, ordered=False))
+        self.assertEqual(sorted(result.index for result in results), [0, 1, 2, 3])
+
+    def test_returns_tombstone_for_deleted_record(self):
+        source = ('<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/">'
+                  '<request>some.base.url</request>'
+                  '<GetRecord><record><header status="deleted">'
+                  '<identifier>some_id</identifier>'
+                  '<datestamp>2000-01-01</datestamp></header>'
+                  '</record></GetRecord></OAI-PMH>')
+        result = list(batch.map_records([source], workers=0)).pop()
+        self.assertIsNone(result.records)
+        self.assertIsNone(result.error)
+        self.assertEqual(result.tombstone.study_number, 'some.base.url__some_id')
+
+    def test_raises_ValueError_for_invalid_chunksize(self):
+        with self.assertRaises(ValueError):
+            batch.map_records([], chunksize=0)
+
+    def test_raises_ValueError_for_invalid_max_pending(self):
+        for max_pending in (0, -1):
+            with self.subTest(max_pending=max_pending), self.assertRaises(ValueError):
+                batch.map_records([], max_pending=max_pending)
+
+    def test_raises_ValueError_for_negative_workers(self):
+        with self.assertRaises(ValueError):
+            batch.map_records([], workers=-1)
@@ -28,3 +28,8 @@ class TestCdcAggPackage(TestCase):
 
     def test_record_by_collection_returns_study_class(self):
         self.assertEqual(cdcagg_common.record_by_collection_name('studies'), cdcagg_common.Study)
+
+    def test_list_indexes_returns_indexes_by_collection(self):
+        indexes = cdcagg_common.list_indexes()
+        self.assertEqual(list(indexes), ['studies'])
+        self.assertEqual(indexes['studies'], list(cdcagg_common.Study.list_indexes()))
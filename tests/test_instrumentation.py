@@ -0,0 +1,169 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pickle
+from unittest import (
+    TestCase,
+    mock
+)
+from cdcagg_common import instrumentation
+
+
+class _InstrumentationTestBase(TestCase):
+
+    def setUp(self):
+        self.sink = mock.Mock(spec=instrumentation.Sink)
+        self.addCleanup(instrumentation.disable)
+
+
+class TestDisabled(_InstrumentationTestBase):
+
+    def test_is_disabled_by_default(self):
+        self.assertFalse(instrumentation.is_enabled())
+
+    def test_clock_returns_None(self):
+        self.assertIsNone(instrumentation.clock())
+
+    @mock.patch.object(instrumentation, 'perf_counter')
+    def test_does_not_read_clock(self, mock_perf_counter):
+        with instrumentation.timed(instrumentation.STAGE_PARSE, 'source'):
+            pass
+        instrumentation.observe(instrumentation.STAGE_PARSE, None, 'source')
+        list(instrumentation.timed_iter(instrumentation.STAGE_MAP, [1, 2], 'source'))
+        mock_perf_counter.assert_not_called()
+
+    def test_timed_iter_returns_iterable(self):
+        iterable = [1, 2]
+        self.assertIs(instrumentation.timed_iter(instrumentation.STAGE_MAP, iterable, 'source'), iterable)
+
+    def test_disable_stops_submitting(self):
+        instrumentation.enable(self.sink)
+        instrumentation.disable()
+        instrumentation.count('some_counter')
+        self.sink.count.assert_not_called()
+
+
+class TestEnabled(_InstrumentationTestBase):
+
+    def setUp(self):
+        super().setUp()
+        instrumentation.enable(self.sink)
+
+    def test_observe_submits_timing(self):
+        start = instrumentation.clock()
+        instrumentation.observe(instrumentation.STAGE_PARSE, start, TestCase, 'some.url')
+        self.sink.timing.assert_called_once_with(instrumentation.STAGE_PARSE, 'TestCase',
+                                                 'some.url', mock.ANY)
+        self.assertGreaterEqual(self.sink.timing.call_args[0][3], 0)
+
+    def test_observe_submits_timing_until_end(self):
+        instrumentation.observe(instrumentation.STAGE_PARSE, 1.0, 'Parser', 'some.url', 1.5)
+        self.sink.timing.assert_called_once_with(instrumentation.STAGE_PARSE, 'Parser',
+                                                 'some.url', 0.5)
+
+    def test_timed_submits_timing(self):
+        with instrumentation.timed(instrumentation.STAGE_EXPORT, 'Study', 'some.url'):
+            pass
+        self.sink.timing.assert_called_once_with(instrumentation.STAGE_EXPORT, 'Study',
+                                                 'some.url', mock.ANY)
+
+    def test_timed_submits_timing_on_exception(self):
+        with self.assertRaises(ValueError):
+            with instrumentation.timed(instrumentation.STAGE_EXPORT, 'Study'):
+                raise ValueError()
+        self.sink.timing.assert_called_once()
+
+    def test_timed_iter_submits_timing_per_item(self):
+        self.assertEqual(list(instrumentation.timed_iter(instrumentation.STAGE_MAP, iter([1, 2]), 'Parser')),
+                         [1, 2])
+        self.assertEqual(self.sink.timing.call_count, 2)
+
+    def test_count_submits_counter(self):
+        instrumentation.count('some_counter', 'Parser', 'some.url', 3)
+        self.sink.count.assert_called_once_with('some_counter', 'Parser', 'some.url', 3)
+
+
+class TestAggregator(TestCase):
+
+    def test_aggregates_timings(self):
+        aggregator = instrumentation.Aggregator(buckets=(0.1, 1.0))
+        aggregator.timing('parse', 'Parser', 'some.url', 0.05)
+        aggregator.timing('parse', 'Parser', 'some.url', 0.5)
+        aggregator.timing('parse', 'Parser', 'some.url', 2.0)
+        stats = aggregator.stages[('parse', 'Parser', 'some.url')]
+        self.assertEqual(stats.count, 3)
+        self.assertAlmostEqual(stats.total, 2.55)
+        self.assertAlmostEqual(stats.mean, 0.85)
+        self.assertEqual(stats.max, 2.0)
+        self.assertEqual(stats.histogram, [1, 1, 1])
+
+    def test_bucket_upper_bound_is_inclusive(self):
+        aggregator = instrumentation.Aggregator(buckets=(0.1, 1.0))
+        aggregator.timing('parse', 'Parser', None, 0.1)
+        self.assertEqual(aggregator.stages[('parse', 'Parser', None)].histogram, [1, 0, 0])
+
+    def test_stage_totals(self):
+        aggregator = instrumentation.Aggregator()
+        aggregator.timing('parse', 'Parser', 'some.url', 1.0)
+        aggregator.timing('parse', 'OtherParser', 'other.url', 2.0)
+        aggregator.timing('map', 'Parser', 'some.url', 3.0)
+        self.assertEqual(aggregator.stage_totals(), {'parse': (2, 3.0), 'map': (1, 3.0)})
+
+    def test_aggregates_counters(self):
+        aggregator = instrumentation.Aggregator()
+        aggregator.count('records_mapped', 'Parser', 'some.url', 1)
+        aggregator.count('records_mapped', 'Parser', 'some.url', 2)
+        self.assertEqual(aggregator.counters, {('records_mapped', 'Parser', 'some.url'): 3})
+
+    def test_report_contains_stages_and_counters(self):
+        aggregator = instrumentation.Aggregator()
+        aggregator.timing('parse', 'Parser', 'some.url', 1.0)
+        aggregator.count('records_mapped', 'Parser', 'some.url', 1)
+        report = aggregator.report()
+        self.assertIn('total parse: 1', report)
+        self.assertIn('counter records_mapped Parser some.url: 1', report)
+
+    def test_reset_discards_values(self):
+        aggregator = instrumentation.Aggregator()
+        aggregator.timing('parse', 'Parser', 'some.url', 1.0)
+        aggregator.count('records_mapped', 'Parser', 'some.url', 1)
+        aggregator.reset()
+        self.assertEqual(aggregator.stages, {})
+        self.assertEqual(aggregator.counters, {})
+
+    def test_collects_from_hooks(self):
+        aggregator = instrumentation.Aggregator()
+        instrumentation.enable(aggregator)
+        self.addCleanup(instrumentation.disable)
+        with instrumentation.timed(instrumentation.STAGE_PARSE, 'Parser', 'some.url'):
+            pass
+        self.assertEqual(aggregator.stages[(instrumentation.STAGE_PARSE, 'Parser', 'some.url')].count, 1)
+
+
+class TestRecorder(_InstrumentationTestBase):
+
+    def test_replays_recorded_measurements(self):
+        recorder = instrumentation.Recorder()
+        recorder.timing('parse', 'Parser', 'some.url', 1.0)
+        recorder.count('records_mapped', 'Parser', 'some.url', 2)
+        recorder = pickle.loads(pickle.dumps(recorder))
+        aggregator = instrumentation.Aggregator()
+        instrumentation.enable(aggregator)
+        instrumentation.replay(recorder)
+        self.assertEqual(aggregator.stages[('parse', 'Parser', 'some.url')].total, 1.0)
+        self.assertEqual(aggregator.counters, {('records_mapped', 'Parser', 'some.url'): 2})
+
+    def test_replay_does_nothing_if_disabled(self):
+        recorder = mock.Mock()
+        instrumentation.replay(recorder)
+        recorder.replay.assert_not_called()
@@ -15,9 +15,14 @@ from unittest import (
     TestCase,
     mock
 )
+import sys
+from io import BytesIO
 from xml.etree import ElementTree
 from kuha_common.document_store.mappings.exceptions import UnknownXMLRoot
-from cdcagg_common import mappings
+from cdcagg_common import (
+    mappings,
+    instrumentation
+)
 
 
 def _valid_root(metadata='', base_url='', identifier='', datestamp='', about=''):
@@ -38,6 +43,22 @@ def _valid_root(metadata='', base_url='', identifier='', datestamp='', about='')
             '</OAI-PMH>')
 
 
+def _list_records_root(*records, base_url=''):
+    return ('<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/">'
+            '<request verb="ListRecords">' + base_url + '</request>'
+            '<ListRecords>' + ''.join(records) +
+            '<resumptionToken completeListSize="3" cursor="0"></resumptionToken>'
+            '</ListRecords></OAI-PMH>')
+
+
+def _record(metadata='', identifier='', datestamp='', deleted=False):
+    return ('<record><header' + (' status="deleted"' if deleted else '') + '>'
+            '<identifier>' + identifier + '</identifier>'
+            '<datestamp>' + datestamp + '</datestamp></header>' +
+            ('' if deleted else '<metadata>' + metadata + '</metadata>') +
+            '</record>')
+
+
 def _invalid_root(inner_xml=''):
     return ('<invalid_root>' + inner_xml + '</invalid_root>')
 
@@ -112,6 +133,151 @@ class TestProvenanceInfo(TestCase):
             self.assertEqual(prov, exp_provs[index])
 
 
+class TestHarvestContext(TestCase):
+
+    @mock.patch.object(mappings, 'datetime_to_datestamp')
+    def test_computes_harvest_date_once(self, mock_datetime_to_datestamp):
+        context = mappings.HarvestContext()
+        self.assertEqual(context.harvest_date, mock_datetime_to_datestamp.return_value)
+        mock_datetime_to_datestamp.assert_called_once()
+
+    def test_uses_given_harvest_date(self):
+        self.assertEqual(mappings.HarvestContext('2000-01-01T00:00:00Z').harvest_date,
+                         '2000-01-01T00:00:00Z')
+
+    def test_aggregator_identifier_equals_generated(self):
+        context = mappings.HarvestContext()
+        for identifier in ('oai:some.domain:local_identifier', 'other', 'ääkköset'):
+            self.assertEqual(context.aggregator_identifier('https://some.url/oai', identifier),
+                             mappings._generate_aggregator_identifier('https://some.url/oai', identifier))
+
+    def test_intern_returns_interned_string(self):
+        value = ''.join(['some', '.base.url'])
+        self.assertIs(mappings.HarvestContext.intern(value), mappings.HarvestContext.intern('some.base.url'))
+        self.assertIsNone(mappings.HarvestContext.intern(None))
+
+    def test_records_share_harvest_date(self):
+        context = mappings.HarvestContext('2000-01-01T00:00:00Z')
+        for identifier in ('id_1', 'id_2'):
+            prov = mappings.ProvenanceInfo(ElementTree.fromstring(_valid_root(identifier=identifier)),
+                                           'somenamespace', context)
+            self.assertEqual(prov.full()[0]['harvest_date'], '2000-01-01T00:00:00Z')
+
+    def test_shares_base_url_between_records(self):
+        context = mappings.HarvestContext()
+        provs = [mappings.ProvenanceInfo(ElementTree.fromstring(_valid_root(base_url='some.base.url',
+                                                                            identifier=identifier)),
+                                         'somenamespace', context)
+                 for identifier in ('id_1', 'id_2')]
+        self.assertIs(provs[0].base_url, provs[1].base_url)
+
+
+class TestCompiledPath(TestCase):
+
+    def test_find_returns_element(self):
+        root_element = ElementTree.fromstring(_valid_root(identifier='some_identifier'))
+        path = mappings._CompiledPath('oai:GetRecord/oai:record/oai:header/oai:identifier')
+        self.assertIs(path.find(root_element),
+                      root_element.find('./oai:GetRecord/oai:record/oai:header/oai:identifier',
+                                        mappings.OAI_NS))
+
+    def test_find_returns_None(self):
+        root_element = ElementTree.fromstring(_valid_root())
+        self.assertIsNone(mappings._CompiledPath('oai:GetRecord/oai:about').find(root_element))
+
+    def test_text_returns_inner_text(self):
+        root_element = ElementTree.fromstring(_valid_root(base_url='some.base.url'))
+        self.assertEqual(mappings._CompiledPath('oai:request').text(root_element), 'some.base.url')
+
+    def test_uses_given_namespaces(self):
+        root_element = ElementTree.fromstring('<a xmlns="some:ns"><b>text</b></a>')
+        self.assertEqual(mappings._CompiledPath('x:b', {'x': 'some:ns'}).text(root_element), 'text')
+
+
+class TestMetadataFingerprint(TestCase):
+
+    def _fingerprint(self, metadata):
+        return mappings.metadata_fingerprint(ElementTree.fromstring(_valid_root(metadata=metadata)))
+
+    def test_returns_sha256_hexdigest(self):
+        fingerprint = self._fingerprint('<codeBook xmlns="ddi:codebook:2_5"/>')
+        self.assertEqual(len(fingerprint), 64)
+        int(fingerprint, 16)
+
+    def test_is_stable_across_prefixes_and_attribute_order(self):
+        self.assertEqual(
+            self._fingerprint('<codeBook xmlns="ddi:codebook:2_5" a="1" b="2"><titl>t</titl></codeBook>'),
+            self._fingerprint('<c:codeBook xmlns:c="ddi:codebook:2_5" b="2" a="1"><c:titl>t</c:titl></c:codeBook>'))
+
+    def test_changes_with_content(self):
+        fingerprints = {self._fingerprint(metadata) for metadata in (
+            '<codeBook xmlns="ddi:codebook:2_5"><titl>t</titl></codeBook>',
+            '<codeBook xmlns="ddi:codebook:2_5"><titl>u</titl></codeBook>',
+            '<codeBook xmlns="ddi:codebook:2_5"><titl a="1">t</titl></codeBook>',
+            '<codeBook xmlns="ddi:codebook:2_5"><titl/>t</codeBook>',
+            '<codeBook xmlns="ddi:codebook:2_5"><titl><titl>t</titl></titl></codeBook>',
+            '<codeBook xmlns="ddi:codebook:2_5"><titl/><titl>t</titl></codeBook>')}
+        self.assertEqual(len(fingerprints), 6)
+
+    def test_ignores_header(self):
+        metadata = '<codeBook xmlns="ddi:codebook:2_5"/>'
+        self.assertEqual(
+            mappings.metadata_fingerprint(ElementTree.fromstring(_valid_root(metadata=metadata, identifier='a'))),
+            mappings.metadata_fingerprint(ElementTree.fromstring(_valid_root(metadata=metadata, identifier='b'))))
+
+    def test_returns_None_without_metadata(self):
+        root_element = ElementTree.fromstring(
+            '<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/"><GetRecord>' +
+            _record(identifier='some_id', deleted=True) + '</GetRecord></OAI-PMH>')
+        self.assertIsNone(mappings.metadata_fingerprint(root_element))
+
+
+def _provenance_chain_root(depth):
+    origdesc = ''.join('<originDescription harvestDate="2000-01-01" altered="false">'
+                       '<baseURL>base_url_%s</baseURL>'
+                       '<identifier>identifier_%s</identifier>'
+                       '<datestamp>2000-01-01</datestamp>'
+                       '<metadataNamespace>some:namespace</metadataNamespace>' % (level, level)
+                       for level in range(depth))
+    about = ('<about><provenance xmlns="http://www.openarchives.org/OAI/2.0/provenance">' +
+             origdesc + '</originDescription>' * depth + '</provenance></about>')
+    return ElementTree.fromstring(_valid_root(about=about))
+
+
+class TestProvenanceChain(TestCase):
+
+    def test_reads_chain_in_order(self):
+        provs = mappings.ProvenanceInfo(_provenance_chain_root(5), 'somenamespace').full()
+        self.assertEqual(len(provs), 6)
+        self.assertEqual([prov['identifier'] for prov in provs[1:]],
+                         ['identifier_%s' % (level,) for level in range(5)])
+        self.assertTrue(all(prov['direct'] is False for prov in provs[1:]))
+
+    def test_reads_chain_of_max_depth(self):
+        context = mappings.HarvestContext(max_provenance_depth=3)
+        provs = mappings.ProvenanceInfo(_provenance_chain_root(3), 'somenamespace', context).full()
+        self.assertEqual(len(provs), 4)
+
+    def test_raises_ProvenanceDepthExceeded(self):
+        context = mappings.HarvestContext(max_provenance_depth=3)
+        prov_info = mappings.ProvenanceInfo(_provenance_chain_root(4), 'somenamespace', context)
+        with self.assertRaises(mappings.ProvenanceDepthExceeded) as cm:
+            prov_info.full()
+        self.assertEqual(cm.exception.max_depth, 3)
+
+    def test_default_max_depth(self):
+        prov_info = mappings.ProvenanceInfo(_provenance_chain_root(mappings.MAX_PROVENANCE_DEPTH + 1),
+                                            'somenamespace')
+        with self.assertRaises(mappings.ProvenanceDepthExceeded):
+            prov_info.full()
+
+    def test_reads_chains_deeper_than_recursion_limit(self):
+        depth = sys.getrecursionlimit() + 100
+        context = mappings.HarvestContext(max_provenance_depth=depth)
+        provs = mappings.ProvenanceInfo(_provenance_chain_root(depth), 'somenamespace', context).full()
+        self.assertEqual(len(provs), depth + 1)
+
+
 class TestExpectOAIPMHRoot(TestCase):
 
     def test_raises_UnknownXMLRoot_for_invalid_root_element(self):
@@ -125,6 +291,364 @@ class TestExpectOAIPMHRoot(TestCase):
         mappings._expect_oai_pmh_root(root_element)
 
 
+class TestIterListRecords(TestCase):
+
+    def _ddi25_study(self, title):
+        return ('<codeBook xmlns="ddi:codebook:2_5"><stdyDscr><citation><titlStmt>'
+                '<titl>' + title + '</titl>'
+                '</titlStmt></citation></stdyDscr></codeBook>')
+
+    def test_yields_study_per_record(self):
+        xml = _list_records_root(_record(self._ddi25_study('first'), identifier='id_1'),
+                                 _record(self._ddi25_study('second'), identifier='id_2'),
+                                 base_url='some.base.url')
+        studies = list(mappings.iter_list_records(BytesIO(xml.encode('utf8')),
+                                                  mappings.DDI25RecordParser))
+        self.assertEqual(len(studies), 2)
+        self.assertEqual([study.study_titles[0].get_value() for study in studies],
+                         ['first', 'second'])
+        self.assertEqual([study.study_number.get_value() for study in studies],
+                         ['some.base.url__id_1', 'some.base.url__id_2'])
+        self.assertEqual(studies[1]._direct_base_url.get_value(), 'some.base.url')
+
+    def test_accepts_bytes(self):
+        xml = _list_records_root(_record(self._ddi25_study('first'), identifier='id_1'))
+        studies = list(mappings.iter_list_records(xml.encode('utf8'), mappings.DDI25RecordParser))
+        self.assertEqual(len(studies), 1)
+
+    def test_skips_deleted_records(self):
+        xml = _list_records_root(_record(identifier='id_1', deleted=True),
+                                 _record(self._ddi25_study('second'), identifier='id_2'))
+        studies = list(mappings.iter_list_records(xml.encode('utf8'), mappings.DDI25RecordParser))
+        self.assertEqual(len(studies), 1)
+        self.assertEqual(studies[0].study_titles[0].get_value(), 'second')
+
+    def test_clears_mapped_records(self):
+        xml = _list_records_root(_record(self._ddi25_study('first'), identifier='id_1'),
+                                 _record(self._ddi25_study('second'), identifier='id_2'))
+        records = []
+
+        class _Parser(mappings.DDI25RecordParser):
+            def __init__(self, root_element):
+                records.append(root_element.find('./oai:GetRecord/oai:record', mappings.OAI_NS))
+                super().__init__(root_element)
+
+        list(mappings.iter_list_records(xml.encode('utf8'), _Parser))
+        self.assertEqual(len(records), 2)
+        for record in records:
+            self.assertEqual(len(record), 0)
+
+    def test_raises_UnknownXMLRoot_for_invalid_root_element(self):
+        with self.assertRaises(UnknownXMLRoot):
+            list(mappings.iter_list_records(_invalid_root().encode('utf8'),
+                                            mappings.DDI25RecordParser))
+
+    def test_records_share_harvest_date(self):
+        xml = _list_records_root(_record(self._ddi25_study('first'), identifier='id_1'),
+                                 _record(self._ddi25_study('second'), identifier='id_2'))
+        context = mappings.HarvestContext('2000-01-01T00:00:00Z')
+        studies = list(mappings.iter_list_records(xml.encode('utf8'), context=context))
+        self.assertEqual([study._provenance[0].get_value() for study in studies],
+                         ['2000-01-01T00:00:00Z', '2000-01-01T00:00:00Z'])
+
+    def test_dispatches_parser_per_record(self):
+        ddi122_study = ('<codeBook xmlns="http://www.icpsr.umich.edu/DDI">'
+                        '<stdyDscr xmlns=""><citation><titlStmt>'
+                        '<titl>second</titl>'
+                        '</titlStmt></citation></stdyDscr></codeBook>')
+        xml = _list_records_root(_record(self._ddi25_study('first'), identifier='id_1'),
+                                 _record(ddi122_study, identifier='id_2'))
+        studies = list(mappings.iter_list_records(xml.encode('utf8')))
+        self.assertEqual([study.study_titles[0].get_value() for study in studies],
+                         ['first', 'second'])
+        self.assertEqual([study._provenance[0].attr_metadata_namespace.get_value() for study in studies],
+                         ['ddi:codebook:2_5', 'http://www.icpsr.umich.edu/DDI'])
+
+
+class TestInstrumentation(TestCase):
+
+    def test_collects_stages(self):
+        aggregator = instrumentation.Aggregator()
+        instrumentation.enable(aggregator)
+        self.addCleanup(instrumentation.disable)
+        xml = _list_records_root(_record('<codeBook xmlns="ddi:codebook:2_5"/>', identifier='id_1'),
+                                 base_url='some.base.url')
+        for study in mappings.iter_list_records(xml.encode('utf8')):
+            study.export_dict()
+        for stage, source in ((instrumentation.STAGE_PARSE, 'DDI25RecordParser'),
+                              (instrumentation.STAGE_PROVENANCE, 'DDI25RecordParser'),
+                              (instrumentation.STAGE_MAP, 'DDI25RecordParser'),
+                              (instrumentation.STAGE_EXPORT, 'Study')):
+            with self.subTest(stage=stage):
+                self.assertIn((stage, source, 'some.base.url'), aggregator.stages)
+        self.assertEqual(aggregator.counters[('records_mapped', 'DDI25RecordParser', 'some.base.url')], 1)
+
+    def test_observes_provenance_header_and_chain_per_record(self):
+        aggregator = instrumentation.Aggregator()
+        instrumentation.enable(aggregator)
+        self.addCleanup(instrumentation.disable)
+        xml = _list_records_root(_record('<codeBook xmlns="ddi:codebook:2_5"/>', identifier='id_1'),
+                                 _record('<codeBook xmlns="ddi:codebook:2_5"/>', identifier='id_2'),
+                                 base_url='some.base.url')
+        list(mappings.iter_list_records(xml.encode('utf8')))
+        self.assertEqual(aggregator.stages[(instrumentation.STAGE_PROVENANCE, 'DDI25RecordParser',
+                                            'some.base.url')].count, 4)
+        self.assertEqual(aggregator.stages[(instrumentation.STAGE_MAP, 'DDI25RecordParser',
+                                            'some.base.url')].count, 2)
+
+    def test_times_provenance_chain_under_provenance_stage(self):
+        sink = mock.Mock(spec=instrumentation.Sink)
+        instrumentation.enable(sink)
+        self.addCleanup(instrumentation.disable)
+        parser = mappings.DDI25RecordParser(ElementTree.fromstring(_valid_root(
+            metadata='<codeBook xmlns="ddi:codebook:2_5"/>', base_url='some.base.url')))
+        events = []
+        sink.timing.side_effect = lambda stage, *args: events.append(stage)
+        with mock.patch.object(mappings.ProvenanceInfo, 'full', autospec=True,
+                               side_effect=lambda _: events.append('full') or []):
+            list(parser.studies)
+        self.assertEqual(events, ['full', instrumentation.STAGE_PROVENANCE, instrumentation.STAGE_MAP])
+
+    def test_counts_unknown_xml_root(self):
+        aggregator = instrumentation.Aggregator()
+        instrumentation.enable(aggregator)
+        self.addCleanup(instrumentation.disable)
+        with self.assertRaises(UnknownXMLRoot):
+            mappings.get_parser_class(ElementTree.fromstring(_valid_root(
+                metadata='<unknown xmlns="some:namespace"/>')))
+        with self.assertRaises(UnknownXMLRoot):
+            mappings.DDI25RecordParser(ElementTree.fromstring(_valid_root(
+                metadata='<unknown xmlns="some:namespace"/>')))
+        self.assertEqual(aggregator.counters[('unknown_xml_root', None, None)], 1)
+        self.assertEqual(aggregator.counters[('unknown_xml_root', 'DDI25RecordParser', None)], 1)
+
+    def test_counts_records_deleted(self):
+        aggregator = instrumentation.Aggregator()
+        instrumentation.enable(aggregator)
+        self.addCleanup(instrumentation.disable)
+        deleted_root = ElementTree.fromstring(
+            '<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/"><request>some.base.url</request>'
+            '<GetRecord>' + _record(identifier='id_1', deleted=True) + '</GetRecord></OAI-PMH>')
+        with self.assertRaises(mappings.RecordDeleted):
+            mappings.get_parser(deleted_root)
+        with self.assertRaises(mappings.RecordDeleted):
+            mappings.DDI25RecordParser(deleted_root)
+        xml = _list_records_root(_record(identifier='id_1', deleted=True), base_url='some.base.url')
+        list(mappings.iter_list_records(xml.encode('utf8')))
+        self.assertEqual(aggregator.counters[('records_deleted', None, None)], 1)
+        self.assertEqual(aggregator.counters[('records_deleted', 'DDI25RecordParser', None)], 1)
+        self.assertEqual(aggregator.counters[('records_deleted', None, 'some.base.url')], 1)
+
+
+    def test_counts_bytes_processed(self):
+        aggregator = instrumentation.Aggregator()
+        instrumentation.enable(aggregator)
+        self.addCleanup(instrumentation.disable)
+        xml = _list_records_root(_record('<codeBook xmlns="ddi:codebook:2_5"/>', identifier='id_1'),
+                                 _record(identifier='id_2', deleted=True),
+                                 base_url='some.base.url').encode('utf8')
+        list(mappings.iter_list_records(xml, mappings.DDI25RecordParser))
+        self.assertEqual(sum(value for (name, _, _), value in aggregator.counters.items()
+                             if name == 'bytes_processed'), len(xml))
+
+    def test_counts_bytes_processed_by_parser_instantiated_directly(self):
+        aggregator = instrumentation.Aggregator()
+        instrumentation.enable(aggregator)
+        self.addCleanup(instrumentation.disable)
+        root_element = ElementTree.fromstring(_valid_root(metadata='<codeBook xmlns="ddi:codebook:2_5"/>',
+                                                          base_url='some.base.url', identifier='id_1'))
+        mappings.DDI25RecordParser(root_element)
+        self.assertEqual(aggregator.counters[('bytes_processed', 'DDI25RecordParser', 'some.base.url')],
+                         len(ElementTree.tostring(root_element, encoding='unicode').encode('utf8')))
+
+
+class TestScanHeader(TestCase):
+
+    def test_returns_header_info(self):
+        header = mappings.scan_header(_valid_root(
+            metadata='<codeBook xmlns="ddi:codebook:2_5"/>',
+            base_url='https://some.url/oai', identifier='oai:some.domain:local_identifier',
+            datestamp='2000-01-01').encode('utf8'))
+        self.assertEqual(header.base_url, 'https://some.url/oai')
+        self.assertEqual(header.identifier, 'oai:some.domain:local_identifier')
+        self.assertEqual(header.datestamp, '2000-01-01')
+        self.assertFalse(header.deleted)
+        self.assertEqual(header.aggregator_identifier,
+                         '8c70c7fd65e84fdf7cc08690ebbf944605690f7e0b7ebcb995d6c35c9c0185fc')
+        self.assertEqual(header.study_number, 'https%3A%2F%2Fsome.url%2Foai__oai%3Asome.domain%3Alocal_identifier')
+
+    def test_stops_reading_at_end_of_header(self):
+        xml = _valid_root(metadata='<codeBook xmlns="ddi:codebook:2_5">' + 'x' * 100000 + '</codeBook>',
+                          identifier='some_id')
+        stream = BytesIO(xml.encode('utf8'))
+        header = mappings.scan_header(stream)
+        self.assertEqual(header.identifier, 'some_id')
+        self.assertLess(stream.tell(), len(xml))
+
+    def test_detects_deleted(self):
+        xml = ('<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/">'
+               '<request>some.base.url</request>'
+               '<GetRecord>' + _record(identifier='some_id', deleted=True) + '</GetRecord>'
+               '</OAI-PMH>')
+        self.assertTrue(mappings.scan_header(xml.encode('utf8')).deleted)
+
+    def test_returns_None_without_header(self):
+        self.assertIsNone(mappings.scan_header(b'<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/"/>'))
+
+    def test_raises_UnknownXMLRoot_for_invalid_root_element(self):
+        with self.assertRaises(UnknownXMLRoot):
+            mappings.scan_header(_invalid_root().encode('utf8'))
+
+    def test_iter_headers_yields_header_per_record(self):
+        xml = _list_records_root(_record('<codeBook xmlns="ddi:codebook:2_5"/>', identifier='id_1'),
+                                 _record(identifier='id_2', deleted=True),
+                                 base_url='some.base.url')
+        headers = list(mappings.iter_headers(xml.encode('utf8')))
+        self.assertEqual([(header.identifier, header.deleted) for header in headers],
+                         [('id_1', False), ('id_2', True)])
+        self.assertEqual(headers[1].study_number, 'some.base.url__id_2')
+
+    def test_iter_headers_discards_metadata_while_reading(self):
+        iterparse = mappings._iterparse
+        metadata_sizes = []
+
+        def _iterparse(source, events):
+            for event, element in iterparse(source, events):
+                if event == 'end' and element.tag == '{http://www.openarchives.org/OAI/2.0/}metadata':
+                    metadata_sizes.append(len(list(element.iter())))
+                yield event, element
+
+        xml = _list_records_root(_record('<codeBook xmlns="ddi:codebook:2_5"><stdyDscr><citation>'
+                                         '<titlStmt><titl>some title</titl></titlStmt>'
+                                         '</citation></stdyDscr></codeBook>', identifier='id_1'),
+                                 base_url='some.base.url')
+        with mock.patch.object(mappings, '_iterparse', _iterparse):
+            headers = list(mappings.iter_headers(xml.encode('utf8')))
+        self.assertEqual(len(headers), 1)
+        self.assertEqual(metadata_sizes, [1])
+
+
+class TestTombstone(TestCase):
+
+    def _deleted_root(self, base_url='https://some.url/oai', identifier='oai:some.domain:local_identifier'):
+        return ('<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/">'
+                '<request>' + base_url + '</request>'
+                '<GetRecord>' + _record(identifier=identifier, datestamp='2000-01-01', deleted=True) +
+                '</GetRecord></OAI-PMH>')
+
+    def _assert_tombstone(self, tombstone, harvest_date):
+        self.assertEqual(tombstone.aggregator_identifier,
+                         '8c70c7fd65e84fdf7cc08690ebbf944605690f7e0b7ebcb995d6c35c9c0185fc')
+        self.assertEqual(tombstone.study_number,
+                         'https%3A%2F%2Fsome.url%2Foai__oai%3Asome.domain%3Alocal_identifier')
+        self.assertEqual(tombstone.provenance, [{'harvest_date': harvest_date,
+                                                 'altered': True,
+                                                 'direct': True,
+                                                 'metadata_namespace': None,
+                                                 'base_url': 'https://some.url/oai',
+                                                 'identifier': 'oai:some.domain:local_identifier',
+                                                 'datestamp': '2000-01-01'}])
+
+    @mock.patch.object(mappings, 'datetime_to_datestamp')
+    def test_get_tombstone_returns_tombstone(self, mock_datetime_to_datestamp):
+        tombstone = mappings.get_tombstone(ElementTree.fromstring(self._deleted_root()))
+        self._assert_tombstone(tombstone, mock_datetime_to_datestamp.return_value)
+
+    def test_get_tombstone_returns_None_for_record(self):
+        self.assertIsNone(mappings.get_tombstone(ElementTree.fromstring(_valid_root())))
+
+    @mock.patch.object(mappings, 'datetime_to_datestamp')
+    def test_scan_tombstone_returns_tombstone(self, mock_datetime_to_datestamp):
+        tombstone = mappings.scan_tombstone(self._deleted_root().encode('utf8'))
+        self._assert_tombstone(tombstone, mock_datetime_to_datestamp.return_value)
+
+    def test_scan_tombstone_returns_None_for_record(self):
+        self.assertIsNone(mappings.scan_tombstone(_valid_root().encode('utf8')))
+
+    def test_parsers_raise_RecordDeleted(self):
+        root_element = ElementTree.fromstring(self._deleted_root())
+        for parser_class in (mappings.DDI122NesstarRecordParser, mappings.DDI25RecordParser,
+                             mappings.DDI31RecordParser, mappings.DDI32RecordParser,
+                             mappings.DDI33RecordParser):
+            with self.subTest(parser_class=parser_class):
+                with self.assertRaises(mappings.RecordDeleted) as cm:
+                    parser_class(root_element)
+                self.assertEqual(cm.exception.tombstone.aggregator_identifier,
+                                 '8c70c7fd65e84fdf7cc08690ebbf944605690f7e0b7ebcb995d6c35c9c0185fc')
+
+    def test_RecordDeleted_is_UnknownXMLRoot(self):
+        with self.assertRaises(UnknownXMLRoot):
+            mappings.get_parser(ElementTree.fromstring(self._deleted_root()))
+
+    def test_iter_list_records_yields_tombstones(self):
+        xml = _list_records_root(_record(identifier='id_1', deleted=True), base_url='some.base.url')
+        tombstones = list(mappings.iter_list_records(xml.encode('utf8'), include_deleted=True))
+        self.assertEqual(len(tombstones), 1)
+        self.assertIsInstance(tombstones[0], mappings.Tombstone)
+        self.assertEqual(tombstones[0].study_number, 'some.base.url__id_1')
+
+
+class TestParserDispatch(TestCase):
+
+    def test_get_parser_class_raises_UnknownXMLRoot_for_invalid_root_element(self):
+        with self.assertRaises(UnknownXMLRoot):
+            mappings.get_parser_class(ElementTree.fromstring(_invalid_root()))
+
+    def test_get_parser_class_raises_UnknownXMLRoot_for_unregistered_metadata(self):
+        with self.assertRaises(UnknownXMLRoot):
+            mappings.get_parser_class(ElementTree.fromstring(_valid_root(
+                metadata='<unknown xmlns="some:namespace"/>')))
+
+    def test_get_parser_class_raises_UnknownXMLRoot_for_missing_metadata(self):
+        with self.assertRaises(UnknownXMLRoot):
+            mappings.get_parser_class(ElementTree.fromstring(_valid_root()))
+
+    @mock.patch.dict(mappings._PARSER_REGISTRY)
+    def test_register_parser_registers_class(self):
+
+        @mappings.register_parser('{some:namespace}root', '{other:namespace}root')
+        class _Parser:
+            def __init__(self, root_element):
+                self.root_element = root_element
+
+        root_element = ElementTree.fromstring(_valid_root(metadata='<root xmlns="other:namespace"/>'))
+        self.assertIs(mappings.get_parser_class(root_element), _Parser)
+        parser = mappings.get_parser(root_element)
+        self.assertIsInstance(parser, _Parser)
+        self.assertIs(parser.root_element, root_element)
+
+    @mock.patch.dict(mappings._PARSER_REGISTRY)
+    def test_get_parser_passes_given_context(self):
+
+        @mappings.register_parser('{some:namespace}root')
+        class _Parser:
+            def __init__(self, root_element, context=None):
+                self.context = context
+
+        context = mappings.HarvestContext()
+        root_element = ElementTree.fromstring(_valid_root(metadata='<root xmlns="some:namespace"/>'))
+        self.assertIs(mappings.get_parser(root_element, context).context, context)
+        self.assertIsNone(mappings.get_parser(root_element).context)
+
+    @mock.patch.dict(mappings._PARSER_REGISTRY)
+    def test_iter_list_records_passes_internal_context_to_accepting_parsers(self):
+        contexts = []
+
+        @mappings.register_parser('{some:namespace}root')
+        class _Parser:
+            studies = ()
+
+            def __init__(self, root_element, context=None):
+                contexts.append(context)
+
+        xml = _list_records_root(_record('<root xmlns="some:namespace"/>', identifier='id_1'),
+                                 _record('<root xmlns="some:namespace"/>', identifier='id_2'))
+        list(mappings.iter_list_records(xml.encode('utf8')))
+        self.assertEqual(len(contexts), 2)
+        self.assertIsInstance(contexts[0], mappings.HarvestContext)
+        self.assertIs(contexts[0], contexts[1])
+
+
 class _Wrapper:
 
     class RecordParserTestBase(TestCase):
@@ -214,6 +738,29 @@ class _Wrapper:
         def test_does_not_raise_for_valid_root_element(self):
             self.ParserClass.from_string(_valid_root(metadata=self._valid_md))
 
+        def test_returned_study_contains_requested_source_fingerprint(self):
+            root_element = ElementTree.fromstring(_valid_root(metadata=self._valid_study))
+            parser = self.ParserClass(root_element, mappings.HarvestContext(fingerprint_sources=True))
+            study = list(parser.studies).pop()
+            self.assertEqual(parser.metadata_fingerprint, mappings.metadata_fingerprint(root_element))
+            self.assertEqual(study._source_fingerprint.get_value(), parser.metadata_fingerprint)
+
+        def test_returned_study_contains_computed_source_fingerprint(self):
+            parser = self.ParserClass.from_string(_valid_root(metadata=self._valid_study))
+            fingerprint = parser.metadata_fingerprint
+            study = list(parser.studies).pop()
+            self.assertEqual(study._source_fingerprint.get_value(), fingerprint)
+
+        @mock.patch.object(mappings, 'metadata_fingerprint')
+        def test_does_not_compute_source_fingerprint_by_default(self, mock_metadata_fingerprint):
+            study = list(self.ParserClass.from_string(_valid_root(metadata=self._valid_study)).studies).pop()
+            mock_metadata_fingerprint.assert_not_called()
+            self.assertIsNone(study._source_fingerprint.get_value())
+
+        def test_registered_for_dispatch(self):
+            root_element = ElementTree.fromstring(_valid_root(metadata=self._valid_md))
+            self.assertIs(mappings.get_parser_class(root_element), self.ParserClass)
+
 
 class TestDDI122RecordParser(_Wrapper.RecordParserTestBase):
 
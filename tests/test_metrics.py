@@ -0,0 +1,121 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase
+from cdcagg_common import (
+    instrumentation,
+    metrics
+)
+
+
+class TestCounter(TestCase):
+
+    def test_inc_accumulates_per_labels(self):
+        counter = metrics.Counter('some_total', 'Some help.', ('source',))
+        counter.inc(('a',))
+        counter.inc(('a',), 2)
+        counter.inc(('b',))
+        self.assertEqual(counter.get(('a',)), 3)
+        self.assertEqual(counter.get(('b',)), 1)
+
+    def test_inc_negative_raises(self):
+        counter = metrics.Counter('some_total', 'Some help.')
+        with self.assertRaises(ValueError):
+            counter.inc((), -1)
+
+    def test_render(self):
+        counter = metrics.Counter('some_total', 'Some help.', ('source',))
+        counter.inc(('DDI25RecordParser',), 3)
+        self.assertEqual(counter.render(), [
+            '# HELP some_total Some help.',
+            '# TYPE some_total counter',
+            'some_total{source="DDI25RecordParser"} 3'])
+
+    def test_render_escapes_label_values(self):
+        counter = metrics.Counter('some_total', 'Some help.', ('source',))
+        counter.inc(('a"b\\c\nd',))
+        self.assertEqual(counter.render()[-1], 'some_total{source="a\\"b\\\\c\\nd"} 1')
+
+
+class TestHistogram(TestCase):
+
+    def test_render_cumulative_buckets(self):
+        histogram = metrics.Histogram('some_seconds', 'Some help.', ('stage',), buckets=(0.1, 1))
+        histogram.observe(('map',), 0.05)
+        histogram.observe(('map',), 0.5)
+        histogram.observe(('map',), 2)
+        self.assertEqual(histogram.render(), [
+            '# HELP some_seconds Some help.',
+            '# TYPE some_seconds histogram',
+            'some_seconds_bucket{stage="map",le="0.1"} 1',
+            'some_seconds_bucket{stage="map",le="1"} 2',
+            'some_seconds_bucket{stage="map",le="+Inf"} 3',
+            'some_seconds_sum{stage="map"} 2.55',
+            'some_seconds_count{stage="map"} 3'])
+
+
+class TestRegistry(TestCase):
+
+    def test_counter_returns_same_metric(self):
+        registry = metrics.Registry()
+        self.assertIs(registry.counter('some_total', 'Help.'), registry.counter('some_total', 'Help.'))
+
+    def test_conflicting_type_raises(self):
+        registry = metrics.Registry()
+        registry.counter('some_metric', 'Help.')
+        with self.assertRaises(ValueError):
+            registry.histogram('some_metric', 'Help.')
+
+    def test_render_empty(self):
+        self.assertEqual(metrics.Registry().render(), '')
+
+    def test_render_ends_with_newline(self):
+        registry = metrics.Registry()
+        registry.counter('some_total', 'Help.').inc()
+        self.assertEqual(registry.render(), '# HELP some_total Help.\n# TYPE some_total counter\nsome_total 1\n')
+
+
+class TestInstall(TestCase):
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+        self.sink = metrics.install(self.registry)
+        self.addCleanup(instrumentation.disable)
+
+    def test_enables_instrumentation(self):
+        self.assertTrue(instrumentation.is_enabled())
+        self.assertIsInstance(self.sink, metrics.PrometheusSink)
+
+    def test_collects_counts(self):
+        instrumentation.count('records_mapped', 'DDI25RecordParser', 'some.url')
+        instrumentation.count('unknown_xml_root')
+        self.assertEqual(self.registry.get('cdcagg_records_mapped_total').get(('DDI25RecordParser',)), 1)
+        self.assertEqual(self.registry.get('cdcagg_unknown_xml_root_total').get(('',)), 1)
+
+    def test_collects_unknown_counter(self):
+        instrumentation.count('other', 'source', value=2)
+        self.assertEqual(self.registry.get('cdcagg_other_total').get(('source',)), 2)
+
+    def test_collects_timings(self):
+        with instrumentation.timed(instrumentation.STAGE_MAP, 'DDI33RecordParser'):
+            pass
+        rendered = metrics.render(self.registry)
+        self.assertIn('cdcagg_stage_duration_seconds_count{stage="map",source="DDI33RecordParser"} 1',
+                      rendered)
+
+    def test_render_declares_known_metrics(self):
+        rendered = metrics.render(self.registry)
+        for name in ('cdcagg_records_mapped_total', 'cdcagg_records_deleted_total',
+                     'cdcagg_unknown_xml_root_total', 'cdcagg_bytes_processed_total',
+                     'cdcagg_stage_duration_seconds'):
+            self.assertIn(f'# TYPE {name} ', rendered)
@@ -0,0 +1,246 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import warnings
+from base64 import urlsafe_b64encode
+from unittest import TestCase
+from cdcagg_common import (
+    queries,
+    records
+)
+from cdcagg_common.mdb_const import MDB_ASCENDING
+
+
+class _Record(records.RecordBase):
+
+    _indexes = (records.Index([('some_field', MDB_ASCENDING)]),)
+
+    @classmethod
+    def get_collection(cls):
+        return 'some_collection'
+
+
+class TestFindIndex(TestCase):
+
+    def test_finds_index_for_prefix_field(self):
+        index = queries.find_index({'_direct_base_url': 'some.url'})
+        self.assertEqual(index.fields[0], '_direct_base_url')
+
+    def test_descends_into_and(self):
+        self.assertIsNotNone(queries.find_index({'$and': [{'some_field': 1},
+                                                          {'_provenance.identifier': 'some_id'}]}))
+
+    def test_returns_None_for_unindexed_field(self):
+        self.assertIsNone(queries.find_index({'some_field': 'value'}))
+
+    def test_skips_partial_index_for_missing_field(self):
+        self.assertIsNone(queries.find_index({'_aggregator_identifier': {'$exists': False}}))
+        self.assertIsNone(queries.find_index({'_aggregator_identifier': None}))
+        self.assertIsNotNone(queries.find_index({'_aggregator_identifier': 'some_id'}))
+
+    def test_or_requires_every_clause_indexed(self):
+        self.assertIsNotNone(queries.find_index({'$or': [{'_direct_base_url': 'some.url'},
+                                                         {'_metadata.deleted': {'$type': 'date'}}]}))
+        self.assertIsNone(queries.find_index({'$or': [{'_direct_base_url': 'some.url'},
+                                                      {'some_field': 1}]}))
+
+
+class TestCheckQuery(TestCase):
+
+    def test_warns_for_unindexed_query(self):
+        with self.assertWarns(queries.UnindexedQueryWarning):
+            queries.check_query({'some_field': 'value'})
+
+    def test_raises_in_strict_mode(self):
+        with self.assertRaises(queries.UnindexedQueryError) as cm:
+            queries.check_query({'some_field': 'value'}, strict=True)
+        self.assertEqual(cm.exception.query, {'some_field': 'value'})
+
+    def test_does_not_warn_for_indexed_or_empty_query(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            queries.check_query({'_direct_base_url': 'some.url'})
+            queries.check_query({})
+
+    def test_consults_record_class(self):
+        self.assertEqual(queries.check_query({'some_field': 'value'}, record_class=_Record, strict=True),
+                         {'some_field': 'value'})
+        with self.assertRaises(queries.UnindexedQueryError):
+            queries.check_query({'some_field': 'value'}, strict=True)
+
+    def test_warning_points_to_caller(self):
+        builder = queries.QueryBuilder()
+        paginator = queries.KeysetPaginator(('some_field',))
+        for check in (lambda: queries.check_query({'some_field': 'value'}),
+                      lambda: builder.check({'some_field': 'value'}),
+                      lambda: builder.missing('some_field'),
+                      lambda: builder.and_({'some_field': 'value'}),
+                      paginator.query):
+            with self.subTest(check=check), self.assertWarns(queries.UnindexedQueryWarning) as cm:
+                check()
+            self.assertEqual(cm.filename, __file__)
+
+
+class TestQueryBuilder(TestCase):
+
+    def setUp(self):
+        self.builder = queries.QueryBuilder(strict=True)
+
+    def test_by_aggregator_identifier(self):
+        self.assertEqual(self.builder.by_aggregator_identifier('some_id'),
+                         {'_aggregator_identifier': 'some_id'})
+
+    def test_by_direct_base_url(self):
+        self.assertEqual(self.builder.by_direct_base_url('some.url'), {'_direct_base_url': 'some.url'})
+
+    def test_changed_since(self):
+        self.assertEqual(self.builder.changed_since('2000-01-01T00:00:00Z'),
+                         {'_metadata.updated': {'$gte': {'$isodate': '2000-01-01T00:00:00Z'}}})
+
+    def test_changed_since_for_base_url(self):
+        self.assertEqual(self.builder.changed_since('2000-01-01T00:00:00Z', base_url='some.url'),
+                         {'$and': [{'_direct_base_url': 'some.url'},
+                                   {'_metadata.updated': {'$gte': {'$isodate': '2000-01-01T00:00:00Z'}}}]})
+
+    def test_deleted(self):
+        self.assertEqual(self.builder.deleted(), {'_metadata.deleted': {'$type': 'date'}})
+
+    def test_missing_for_base_url(self):
+        self.assertEqual(self.builder.missing('_aggregator_identifier', base_url='some.url'),
+                         {'$and': [{'_direct_base_url': 'some.url'},
+                                   {'_aggregator_identifier': {'$exists': False}}]})
+
+    def test_missing_unindexed_raises_in_strict_mode(self):
+        with self.assertRaises(queries.UnindexedQueryError):
+            self.builder.missing('_aggregator_identifier')
+
+    def test_missing_or_deleted(self):
+        self.assertEqual(self.builder.missing_or_deleted('_direct_base_url'),
+                         {'$or': [{'_direct_base_url': {'$exists': False}},
+                                  {'_metadata.deleted': {'$type': 'date'}}]})
+
+    def test_and_(self):
+        self.assertEqual(self.builder.and_(self.builder.by_direct_base_url('some.url'), {}),
+                         {'_direct_base_url': 'some.url'})
+
+
+class TestPageCursor(TestCase):
+
+    def test_encode_decode_roundtrip(self):
+        cursor = queries.PageCursor(('_direct_base_url', '_aggregator_identifier'), ('some.url', 'some_id'))
+        self.assertEqual(queries.PageCursor.decode(cursor.encode()), cursor)
+
+    def test_decode_invalid_raises_ValueError(self):
+        invalid_payloads = ([1, 2], 'ab', [['a'], 'b'], [[1], [2]], [['a']])
+        tokens = ['invalid', queries.PageCursor(('a', 'b'), ('c',)).encode()]
+        tokens.extend(urlsafe_b64encode(json.dumps(payload).encode('utf8')).decode('ascii')
+                      for payload in invalid_payloads)
+        for token in tokens:
+            with self.subTest(token=token), self.assertRaises(ValueError):
+                queries.PageCursor.decode(token)
+
+
+class _Collection:
+    """In-memory collection answering keyset pagination queries."""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.queries = []
+
+    @staticmethod
+    def _value(value):
+        return value['$oid'] if isinstance(value, dict) and '$oid' in value else value
+
+    def _match(self, document, query):
+        for field, condition in query.items():
+            if field == '$and':
+                if not all(self._match(document, subquery) for subquery in condition):
+                    return False
+            elif field == '$or':
+                if not any(self._match(document, subquery) for subquery in condition):
+                    return False
+            elif isinstance(condition, dict) and '$exists' in condition:
+                if (field in document) != condition['$exists']:
+                    return False
+            elif isinstance(condition, dict) and '$gt' in condition:
+                if field not in document or not document[field] > self._value(condition['$gt']):
+                    return False
+            elif document.get(field) != condition:
+                return False
+        return True
+
+    def fetch(self, query, sort, limit):
+        self.queries.append(query)
+        matching = [document for document in self.documents if self._match(document, query)]
+        matching.sort(key=lambda document: tuple(document[field] for field, _ in sort))
+        return matching[:limit]
+
+
+class TestKeysetPaginator(TestCase):
+
+    def setUp(self):
+        self.documents = [{'_id': f'{index:024x}', '_direct_base_url': f'url_{index % 3}',
+                           '_aggregator_identifier': f'id_{index:02}'} for index in range(10)]
+        self.collection = _Collection(self.documents)
+
+    def _traverse(self, paginator, cursor=None):
+        return [[document['_id'] for document in page.documents]
+                for page in paginator.pages(self.collection.fetch, cursor)]
+
+    def test_traverses_by_id(self):
+        pages = self._traverse(queries.KeysetPaginator(page_size=4, strict=True))
+        self.assertEqual([len(page) for page in pages], [4, 4, 2])
+        self.assertEqual(sum(pages, []), [document['_id'] for document in self.documents])
+
+    def test_id_range_query(self):
+        paginator = queries.KeysetPaginator(page_size=4, strict=True)
+        self.assertEqual(paginator.query(), {})
+        self.assertEqual(paginator.query(queries.PageCursor(('_id',), ('some_oid',))),
+                         {'_id': {'$gt': {'$oid': 'some_oid'}}})
+
+    def test_traverses_by_compound_key(self):
+        paginator = queries.KeysetPaginator(queries.KEY_DIRECT_BASE_URL_AGGREGATOR_IDENTIFIER,
+                                            page_size=3, strict=True)
+        ids = sum(self._traverse(paginator), [])
+        expected = sorted(self.documents, key=lambda document: (document['_direct_base_url'],
+                                                                document['_aggregator_identifier']))
+        self.assertEqual(ids, [document['_id'] for document in expected])
+
+    def test_resumes_from_encoded_cursor(self):
+        paginator = queries.KeysetPaginator(queries.KEY_DIRECT_BASE_URL_AGGREGATOR_IDENTIFIER,
+                                            page_size=3, strict=True)
+        first = next(paginator.pages(self.collection.fetch))
+        resumed = self._traverse(paginator, queries.PageCursor.decode(first.cursor.encode()))
+        all_ids = sum(self._traverse(paginator), [])
+        self.assertEqual([document['_id'] for document in first.documents] + sum(resumed, []), all_ids)
+
+    def test_cursor_after_document_missing_key_field_raises_ValueError(self):
+        paginator = queries.KeysetPaginator(queries.KEY_DIRECT_BASE_URL_AGGREGATOR_IDENTIFIER)
+        with self.assertRaisesRegex(ValueError, '_aggregator_identifier'):
+            paginator.cursor_after({'_direct_base_url': 'url_1'})
+
+    def test_cursor_after_document_with_null_key_value_raises_ValueError(self):
+        paginator = queries.KeysetPaginator(queries.KEY_DIRECT_BASE_URL_AGGREGATOR_IDENTIFIER)
+        with self.assertRaisesRegex(ValueError, '_aggregator_identifier'):
+            paginator.cursor_after({'_direct_base_url': 'url_1', '_aggregator_identifier': None})
+
+    def test_limits_to_query(self):
+        paginator = queries.KeysetPaginator(query={'_direct_base_url': 'url_1'}, page_size=2, strict=True)
+        ids = sum(self._traverse(paginator), [])
+        self.assertEqual(ids, [document['_id'] for document in self.documents
+                               if document['_direct_base_url'] == 'url_1'])
+
+    def test_mismatching_cursor_raises_ValueError(self):
+        with self.assertRaises(ValueError):
+            queries.KeysetPaginator().query(queries.PageCursor(('other',), ('value',)))
@@ -11,7 +11,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
+import json
+import sys
 import unittest
+from io import BytesIO
 
 from cdcagg_common import records
 
@@ -22,10 +26,12 @@ class TestStudy(unittest.TestCase):
         self.assertTrue(hasattr(records.Study._provenance, 'fabricate'))
         self.assertTrue(hasattr(records.Study._direct_base_url, 'fabricate'))
         self.assertTrue(hasattr(records.Study._aggregator_identifier, 'fabricate'))
+        self.assertTrue(hasattr(records.Study._source_fingerprint, 'fabricate'))
         s = records.Study()
         self.assertFalse(hasattr(s._provenance, 'fabricate'))
         self.assertFalse(hasattr(s._direct_base_url, 'fabricate'))
         self.assertFalse(hasattr(s._aggregator_identifier, 'fabricate'))
+        self.assertFalse(hasattr(s._source_fingerprint, 'fabricate'))
         self.assertTrue(hasattr(records.Study._provenance, 'fabricate'))
         self.assertTrue(hasattr(records.Study._direct_base_url, 'fabricate'))
         self.assertTrue(hasattr(records.Study._aggregator_identifier, 'fabricate'))
@@ -60,7 +66,8 @@ class TestStudy(unittest.TestCase):
     def test_export_provenance_dict_returns_keys(self):
         s = records.Study()
         self.assertEqual(list(s.export_provenance_dict().keys()),
-                         ['_provenance', '_aggregator_identifier', '_direct_base_url'])
+                         ['_provenance', '_aggregator_identifier', '_direct_base_url',
+                          '_source_fingerprint'])
 
     def test_export_direct_provenance_dict_exports_base_url(self):
         s = records.Study()
@@ -98,3 +105,499 @@ class TestStudy(unittest.TestCase):
         s.set_direct_base_url('some.url')
         imported = records.Study(s.export_dict(include_provenance=True, include_metadata=True, include_id=True))
         self.assertEqual(imported.export_provenance_dict()['_direct_base_url'], 'some.url')
+
+    def test_imports_existing_record_source_fingerprint(self):
+        s = records.Study()
+        s.set_source_fingerprint('some_fingerprint')
+        imported = records.Study(s.export_dict(include_provenance=True, include_metadata=True, include_id=True))
+        self.assertEqual(imported.export_provenance_dict()['_source_fingerprint'], 'some_fingerprint')
+
+    def test_set_source_fingerprint_overwrites(self):
+        s = records.Study()
+        s.set_source_fingerprint('some_fingerprint')
+        s.set_source_fingerprint('other_fingerprint')
+        self.assertEqual(s._source_fingerprint.get_value(), 'other_fingerprint')
+
+
+class TestRecordFields(unittest.TestCase):
+
+    def test_record_fields_returns_cached_tuple(self):
+        fields = records.Study.record_fields()
+        self.assertIsInstance(fields, tuple)
+        self.assertIs(records.Study.record_fields(), fields)
+
+    def test_record_fields_contains_aggregator_fields(self):
+        names = [name for name, _ in records.Study.record_fields()]
+        for name in ('_provenance', '_direct_base_url', '_aggregator_identifier', '_source_fingerprint'):
+            with self.subTest(name=name):
+                self.assertIn(name, names)
+
+    def test_iterate_record_fields_iterates_cached_table(self):
+        self.assertEqual(tuple(records.Study.iterate_record_fields()), records.Study.record_fields())
+
+    def test_get_record_field(self):
+        self.assertIs(records.Study.get_record_field('_source_fingerprint'),
+                      records.Study._source_fingerprint)
+        self.assertIsNone(records.Study.get_record_field('nonexistent'))
+
+    def test_subclass_gets_own_table(self):
+
+        class _Record(records.RecordBase):
+            _extra = records.FieldTypeFactory('_extra', localizable=False, single_value=True)
+
+        self.assertIs(_Record.get_record_field('_extra'), _Record._extra)
+        self.assertIsNone(records.Study.get_record_field('_extra'))
+
+
+class TestLazyFields(unittest.TestCase):
+
+    def test_aggregator_fields_not_fabricated_on_init(self):
+        s = records.Study()
+        for name in ('_provenance', '_direct_base_url', '_aggregator_identifier', '_source_fingerprint'):
+            with self.subTest(name=name):
+                self.assertNotIn(name, vars(s))
+
+    def test_aggregator_fields_absent_from_document_not_fabricated_on_import(self):
+        s = records.Study(records.Study().export_dict(include_provenance=False, include_metadata=True,
+                                                      include_id=True))
+        for name in ('_provenance', '_direct_base_url', '_aggregator_identifier', '_source_fingerprint'):
+            with self.subTest(name=name):
+                self.assertNotIn(name, vars(s))
+
+    def test_first_access_stores_field_to_instance(self):
+        s = records.Study()
+        field = s._source_fingerprint
+        self.assertIs(vars(s)['_source_fingerprint'], field)
+        self.assertIs(s._source_fingerprint, field)
+
+    def test_instances_get_own_fields(self):
+        s1, s2 = records.Study(), records.Study()
+        s1.set_source_fingerprint('some_fingerprint')
+        self.assertIsNot(s1._source_fingerprint, s2._source_fingerprint)
+        self.assertIsNone(s2._source_fingerprint.get_value())
+
+
+class TestIterFromStream(unittest.TestCase):
+
+    def test_yields_records_with_provenance(self):
+        stream = BytesIO(b'{"_aggregator_identifier": "id_1", "_source_fingerprint": "fp_1"}\n'
+                         b'{"_aggregator_identifier": "id_2", "_direct_base_url": "some.url"}\n')
+        studies = list(records.Study.iter_from_stream(stream))
+        self.assertEqual(len(studies), 2)
+        self.assertEqual(studies[0]._aggregator_identifier.get_value(), 'id_1')
+        self.assertEqual(studies[0]._source_fingerprint.get_value(), 'fp_1')
+        self.assertEqual(studies[1]._aggregator_identifier.get_value(), 'id_2')
+        self.assertEqual(studies[1]._direct_base_url.get_value(), 'some.url')
+
+    def test_json_array(self):
+        stream = BytesIO(b'[{"_aggregator_identifier": "id_1"}, {"_aggregator_identifier": "id_2"}]')
+        self.assertEqual([study._aggregator_identifier.get_value()
+                          for study in records.Study.iter_from_stream(stream, chunk_size=8)],
+                         ['id_1', 'id_2'])
+
+
+class TestChangeTracking(unittest.TestCase):
+
+    def _imported(self):
+        s = records.Study()
+        s.set_aggregator_identifier('some_id')
+        s.set_direct_base_url('some.url')
+        s._provenance.add_value('2000-01-01T23:00:00Z', altered=True, base_url='some.url',
+                                identifier='some_id', datestamp='1999-01-01T00:00:00Z',
+                                direct=True, metadata_namespace='some_namespace')
+        return records.Study(s.export_dict(include_provenance=True, include_metadata=True, include_id=True),
+                             track_changes=True)
+
+    def test_imported_record_has_no_changes(self):
+        s = self._imported()
+        self.assertEqual(s.export_changes(), {})
+        self.assertFalse(s.is_dirty())
+
+    def test_new_record_exports_all_fields(self):
+        s = records.Study()
+        self.assertEqual(s.export_changes(), s.export_dict(include_metadata=False, include_id=False))
+
+    def test_exports_changed_fields(self):
+        s = self._imported()
+        s.set_aggregator_identifier('another_id')
+        s.set_source_fingerprint('some_fingerprint')
+        self.assertEqual(s.export_changes(), {'_aggregator_identifier': 'another_id',
+                                              '_source_fingerprint': 'some_fingerprint'})
+        self.assertTrue(s.is_dirty())
+
+    def test_exports_changed_provenance(self):
+        s = self._imported()
+        s._provenance.add_value('2001-01-01T23:00:00Z', altered=False, base_url='some.url',
+                                identifier='some_id', datestamp='1999-01-01T00:00:00Z',
+                                direct=True, metadata_namespace='some_namespace')
+        changes = s.export_changes()
+        self.assertEqual(list(changes), ['_provenance'])
+        self.assertEqual(len(changes['_provenance']), 2)
+
+    def test_mark_clean_resets_changes(self):
+        s = self._imported()
+        s.set_source_fingerprint('some_fingerprint')
+        s.mark_clean()
+        self.assertEqual(s.export_changes(), {})
+
+    def test_untracked_import_exports_all_fields(self):
+        s = self._imported()
+        untracked = records.Study(s.export_dict(include_provenance=True, include_metadata=True,
+                                                include_id=True))
+        self.assertEqual(untracked.export_changes(),
+                         untracked.export_dict(include_metadata=False, include_id=False))
+
+    def test_mark_clean_starts_tracking(self):
+        s = records.Study()
+        s.mark_clean()
+        s.set_source_fingerprint('some_fingerprint')
+        self.assertEqual(s.export_changes(), {'_source_fingerprint': 'some_fingerprint'})
+
+
+class TestExportCache(unittest.TestCase):
+
+    def _study(self, cache_exports=True):
+        s = records.Study(cache_exports=cache_exports)
+        s.set_aggregator_identifier('some_id')
+        s._provenance.add_value('2000-01-01T23:00:00Z', altered=True, base_url='some.url',
+                                identifier='some_id', datestamp='1999-01-01T00:00:00Z',
+                                direct=True, metadata_namespace='some_namespace')
+        return s
+
+    def test_repeated_export_is_cached(self):
+        s = self._study()
+        first = s.export_dict()
+        second = s.export_dict()
+        self.assertEqual(first, second)
+        self.assertIs(first['_provenance'], second['_provenance'])
+
+    def test_returns_new_top_level_dict(self):
+        s = self._study()
+        s.export_dict().pop('_aggregator_identifier')
+        self.assertEqual(s.export_dict()['_aggregator_identifier'], 'some_id')
+        s.export_provenance_dict().pop('_aggregator_identifier')
+        self.assertEqual(s.export_provenance_dict()['_aggregator_identifier'], 'some_id')
+
+    def test_cached_per_arguments(self):
+        s = self._study()
+        self.assertIn('_provenance', s.export_dict())
+        self.assertNotIn('_provenance', s.export_dict(include_provenance=False))
+
+    def test_setters_invalidate(self):
+        s = self._study()
+        s.export_dict()
+        s.export_provenance_dict()
+        s.set_aggregator_identifier('another_id')
+        s.set_source_fingerprint('some_fingerprint')
+        s.set_direct_base_url('some.url')
+        for dct in (s.export_dict(), s.export_provenance_dict()):
+            self.assertEqual(dct['_aggregator_identifier'], 'another_id')
+            self.assertEqual(dct['_source_fingerprint'], 'some_fingerprint')
+            self.assertEqual(dct['_direct_base_url'], 'some.url')
+
+    def test_field_add_value_invalidates(self):
+        s = self._study()
+        s.export_dict()
+        s._provenance.add_value('2001-01-01T23:00:00Z', altered=False, base_url='some.url',
+                                identifier='some_id', datestamp='1999-01-01T00:00:00Z',
+                                direct=True, metadata_namespace='some_namespace')
+        self.assertEqual(len(s.export_dict()['_provenance']), 2)
+        self.assertEqual(len(s.export_provenance_dict()['_provenance']), 2)
+
+    def test_field_set_value_invalidates(self):
+        s = self._study()
+        s.export_dict()
+        s._source_fingerprint.set_value('some_fingerprint')
+        self.assertEqual(s.export_dict()['_source_fingerprint'], 'some_fingerprint')
+
+    def test_invalidate_export_cache(self):
+        s = self._study()
+        s.export_dict()
+        s._provenance[0].attr_altered.set_value(False)
+        s.invalidate_export_cache()
+        self.assertFalse(s.export_dict()['_provenance'][0]['altered'])
+
+    def test_field_fabricated_after_export_invalidates(self):
+        s = records.Study(cache_exports=True)
+        s.export_dict(include_provenance=False)
+        s.export_provenance_dict()
+        s._provenance.add_value('2000-01-01T23:00:00Z', altered=True, base_url='some.url',
+                                identifier='some_id', datestamp='1999-01-01T00:00:00Z',
+                                direct=True, metadata_namespace='some_namespace')
+        self.assertEqual(len(s.export_provenance_dict()['_provenance']), 1)
+
+    def test_partial_field_fabricated_after_export_invalidates(self):
+        s = records.Study.from_partial({})
+        s.export_dict()
+        s.study_number.set_value('some_number')
+        s._source_fingerprint.set_value('some_fingerprint')
+        self.assertEqual(s.export_dict(), {'study_number': 'some_number',
+                                           '_source_fingerprint': 'some_fingerprint'})
+
+    def test_not_cached_by_default(self):
+        s = self._study(cache_exports=False)
+        first = s.export_dict()
+        first['_provenance'][0]['altered'] = False
+        self.assertTrue(s.export_dict()['_provenance'][0]['altered'])
+        self.assertIsNot(s.export_provenance_dict()['_provenance'],
+                         s.export_provenance_dict()['_provenance'])
+
+    def test_fields_not_watched_by_default(self):
+        s = self._study(cache_exports=False)
+        s.export_dict()
+        self.assertNotIn('add_value', vars(s._provenance))
+        self.assertNotIn('set_value', vars(s._aggregator_identifier))
+
+    def test_copy_does_not_share_cache(self):
+        s = self._study()
+        s.export_dict()
+        copied = copy.deepcopy(s)
+        copied.set_source_fingerprint('some_fingerprint')
+        copied._provenance.add_value('2001-01-01T23:00:00Z', altered=False, base_url='some.url',
+                                     identifier='some_id', datestamp='1999-01-01T00:00:00Z',
+                                     direct=True, metadata_namespace='some_namespace')
+        self.assertEqual(len(copied.export_dict()['_provenance']), 2)
+        self.assertEqual(len(s.export_dict()['_provenance']), 1)
+        self.assertIsNone(s.export_dict()['_source_fingerprint'])
+
+
+def _prov(harvest_date, direct=True, base_url='some.url', identifier='some_id', **kwargs):
+    provenance = {'harvest_date': harvest_date, 'altered': True, 'base_url': base_url,
+                  'identifier': identifier, 'datestamp': '1999-01-01T00:00:00Z', 'direct': direct,
+                  'metadata_namespace': 'some_namespace'}
+    provenance.update(kwargs)
+    return provenance
+
+
+class TestMergeProvenances(unittest.TestCase):
+
+    def test_drops_duplicates_keeping_first(self):
+        first = _prov('2000-01-01T00:00:00Z', altered=True)
+        duplicate = _prov('2000-01-01T00:00:00Z', altered=False)
+        self.assertEqual(records.merge_provenances([first], [duplicate]), [first])
+
+    def test_keeps_entries_differing_by_key(self):
+        provenances = [_prov('2000-01-01T00:00:00Z'),
+                       _prov('2000-01-01T00:00:00Z', direct=False),
+                       _prov('2000-01-01T00:00:00Z', base_url='another.url'),
+                       _prov('2000-01-01T00:00:00Z', identifier='another_id')]
+        self.assertEqual(records.merge_provenances(provenances, provenances), provenances)
+
+    def test_orders_by_harvest_date(self):
+        old, new = _prov('2000-01-01T00:00:00Z'), _prov('2001-01-01T00:00:00Z')
+        indirect = _prov('2001-01-01T00:00:00Z', direct=False)
+        self.assertEqual(records.merge_provenances([new, indirect], [old]), [old, new, indirect])
+
+    def test_keeps_indirect_entries_with_their_direct_entry(self):
+        old = [_prov('2025-01-01T00:00:00Z'), _prov('2001-01-01T00:00:00Z', direct=False, base_url='upstream.url')]
+        new = [_prov('2026-01-01T00:00:00Z'), _prov('2001-01-01T00:00:00Z', direct=False, base_url='upstream.url')]
+        self.assertEqual(records.merge_provenances(old, new), old + new)
+        self.assertEqual(records.merge_provenances(new, old, max_history=1), new)
+
+    def test_max_history_keeps_most_recent_harvests(self):
+        provenances = [_prov(f'200{index}-01-01T00:00:00Z') for index in range(5)]
+        self.assertEqual(records.merge_provenances(provenances, max_history=2), provenances[3:])
+        self.assertEqual(records.merge_provenances(provenances, max_history=0), [])
+
+
+class TestMergeProvenance(unittest.TestCase):
+
+    def _study(self, *harvest_dates):
+        s = records.Study()
+        for harvest_date in harvest_dates:
+            prov = _prov(harvest_date)
+            s._provenance.add_value(prov.pop('harvest_date'), **prov)
+        return s
+
+    def _harvest_dates(self, study):
+        return [prov['harvest_date'] for prov in study.export_provenance_dict()['_provenance']]
+
+    def test_merges_record(self):
+        s = self._study('2000-01-01T00:00:00Z', '2001-01-01T00:00:00Z')
+        s.merge_provenance(self._study('2001-01-01T00:00:00Z', '2002-01-01T00:00:00Z'))
+        self.assertEqual(self._harvest_dates(s), ['2000-01-01T00:00:00Z', '2001-01-01T00:00:00Z',
+                                                  '2002-01-01T00:00:00Z'])
+
+    def test_merges_list_with_max_history(self):
+        s = self._study('2000-01-01T00:00:00Z', '2001-01-01T00:00:00Z')
+        s.merge_provenance([_prov('2002-01-01T00:00:00Z')], max_history=2)
+        self.assertEqual(self._harvest_dates(s), ['2001-01-01T00:00:00Z', '2002-01-01T00:00:00Z'])
+
+    def test_interns_merged_entries(self):
+        s = self._study('2000-01-01T00:00:00Z')
+        s.merge_provenance([_prov(''.join(['2001-01-01', 'T00:00:00Z']), base_url=''.join(['some', '.url']))])
+        self.assertIs(s._provenance[1].get_value(), sys.intern('2001-01-01T00:00:00Z'))
+        self.assertIs(s._provenance[1].attr_base_url.get_value(), sys.intern('some.url'))
+
+    def test_invalidates_export_cache(self):
+        s = self._study('2000-01-01T00:00:00Z')
+        s.export_dict()
+        s.merge_provenance([_prov('2001-01-01T00:00:00Z')])
+        self.assertEqual(len(s.export_dict()['_provenance']), 2)
+        s._provenance.add_value('2002-01-01T00:00:00Z', altered=True, base_url='some.url',
+                                identifier='some_id', datestamp='1999-01-01T00:00:00Z',
+                                direct=True, metadata_namespace='some_namespace')
+        self.assertEqual(len(s.export_dict()['_provenance']), 3)
+
+
+class TestProvenanceInterning(unittest.TestCase):
+
+    def test_intern_provenance_interns_repeating_values(self):
+        provenance = _prov(''.join(['2000-01-01', 'T00:00:00Z']), base_url=''.join(['some', '.url']))
+        interned = records.intern_provenance(provenance)
+        self.assertEqual(interned, provenance)
+        self.assertIs(interned['harvest_date'], sys.intern('2000-01-01T00:00:00Z'))
+        self.assertIs(interned['base_url'], sys.intern('some.url'))
+        self.assertIs(interned['metadata_namespace'], sys.intern('some_namespace'))
+
+    def test_import_does_not_modify_document(self):
+        sys.intern('2000-01-01T00:00:00Z')
+        harvest_date = ''.join(['2000-01-01', 'T00:00:00Z'])
+        dct = {'_provenance': [_prov(harvest_date)]}
+        records.Study(dct)
+        records.Study.from_partial(dct)
+        self.assertIs(dct['_provenance'][0]['harvest_date'], harvest_date)
+
+    def test_imported_records_share_values(self):
+        dct = {'_provenance': [_prov('2000-01-01T00:00:00Z')]}
+        s1 = records.Study(json.loads(json.dumps(dct)))
+        s2 = records.Study(json.loads(json.dumps(dct)))
+        self.assertIs(s1._provenance[0].attr_base_url.get_value(),
+                      s2._provenance[0].attr_base_url.get_value())
+
+    def test_export_is_unchanged(self):
+        dct = {'_provenance': [_prov('2000-01-01T00:00:00Z')]}
+        self.assertEqual(records.Study(json.loads(json.dumps(dct))).export_provenance_dict()['_provenance'],
+                         dct['_provenance'])
+
+
+class TestProvenanceEntry(unittest.TestCase):
+
+    def test_roundtrip(self):
+        provenance = _prov('2000-01-01T00:00:00Z')
+        self.assertEqual(records.ProvenanceEntry.from_dict(provenance).as_dict(), provenance)
+
+    def test_has_no_instance_dict(self):
+        self.assertFalse(hasattr(records.ProvenanceEntry.from_dict(_prov('2000')), '__dict__'))
+
+    def test_provenance_entries(self):
+        s = records.Study({'_provenance': [_prov('2000-01-01T00:00:00Z'),
+                                           _prov('2000-01-01T00:00:00Z', direct=False)]})
+        entries = s.provenance_entries()
+        self.assertEqual([entry.direct for entry in entries], [True, False])
+        self.assertIsInstance(entries[0], records.ProvenanceEntry)
+
+
+class TestIndex(unittest.TestCase):
+
+    def test_generates_default_name(self):
+        index = records.Index([('_direct_base_url', 1), ('_metadata.updated', -1)])
+        self.assertEqual(index.name, '_direct_base_url_1__metadata.updated_-1')
+        self.assertEqual(index.fields, ('_direct_base_url', '_metadata.updated'))
+
+    def test_requires_keys(self):
+        with self.assertRaises(ValueError):
+            records.Index([])
+
+    def test_as_mongo(self):
+        self.assertEqual(records.Index([('some_field', 1)]).as_mongo(),
+                         {'keys': [('some_field', 1)], 'name': 'some_field_1'})
+        self.assertEqual(records.Index([('some_field', 1)], name='some_name', unique=True,
+                                       partial_filter={'some_field': {'$exists': True}}).as_mongo(),
+                         {'keys': [('some_field', 1)], 'name': 'some_name', 'unique': True,
+                          'partialFilterExpression': {'some_field': {'$exists': True}}})
+
+
+class TestListIndexes(unittest.TestCase):
+
+    def test_study_indexes_cover_queried_fields(self):
+        fields = {field for index in records.Study.list_indexes() for field in index.fields}
+        for field in ('_aggregator_identifier', '_direct_base_url', '_provenance.identifier',
+                      '_provenance.datestamp', '_metadata.created', '_metadata.updated',
+                      '_metadata.deleted'):
+            with self.subTest(field=field):
+                self.assertIn(field, fields)
+
+    def test_aggregator_identifier_index_is_unique_and_partial(self):
+        index, = [index for index in records.Study.list_indexes()
+                  if index.fields == ('_aggregator_identifier',)]
+        self.assertTrue(index.unique)
+        self.assertIsNotNone(index.partial_filter)
+
+    def test_subclass_adds_and_replaces_indexes(self):
+
+        class _Record(records.RecordBase):
+            _indexes = (records.Index([('_direct_base_url', 1)], name='_direct_base_url_1__metadata.updated_-1'),
+                        records.Index([('some_field', 1)]))
+
+        indexes = {index.name: index for index in _Record.list_indexes()}
+        self.assertEqual(len(indexes), len(records.RecordBase.list_indexes()) + 1)
+        self.assertEqual(indexes['_direct_base_url_1__metadata.updated_-1'].fields, ('_direct_base_url',))
+        self.assertIn('some_field_1', indexes)
+
+
+class TestProjection(unittest.TestCase):
+
+    def test_projection(self):
+        self.assertEqual(records.Study.projection(['_aggregator_identifier', '_provenance.datestamp']),
+                         {'_aggregator_identifier': 1, '_provenance.datestamp': 1})
+
+    def test_projection_excludes_id(self):
+        self.assertEqual(records.Study.projection(['_aggregator_identifier'], include_id=False),
+                         {'_aggregator_identifier': 1, '_id': 0})
+
+    def test_projection_accepts_metadata_and_id(self):
+        self.assertEqual(records.Study.projection(['_metadata.updated', '_id'], include_id=False),
+                         {'_metadata.updated': 1, '_id': 1})
+
+    def test_projection_unknown_field_raises_ValueError(self):
+        for path in ('nonexistent', '_provenance.nonexistent', '_metadata.bogus',
+                     '_provenance.datestamp.nonexistent', '_id.nonexistent'):
+            with self.subTest(path=path), self.assertRaises(ValueError):
+                records.Study.projection([path])
+
+    def test_projection_accepts_value_key(self):
+        self.assertEqual(records.Study.projection(['_provenance.harvest_date'], include_id=False),
+                         {'_provenance.harvest_date': 1, '_id': 0})
+
+
+class TestFromPartial(unittest.TestCase):
+
+    def _document(self):
+        return {'_aggregator_identifier': 'some_id',
+                '_provenance': [_prov('2000-01-01T00:00:00Z')],
+                'unknown_key': 'value'}
+
+    def test_imports_present_fields(self):
+        s = records.Study.from_partial(self._document())
+        self.assertIsInstance(s, records.Study)
+        self.assertEqual(s._aggregator_identifier.get_value(), 'some_id')
+        self.assertEqual(s.export_provenance_dict()['_provenance'], [_prov('2000-01-01T00:00:00Z')])
+
+    def test_does_not_fabricate_absent_fields(self):
+        s = records.Study.from_partial(self._document())
+        fabricated = set(vars(s)) & {name for name, _ in records.Study.record_fields()}
+        self.assertEqual(fabricated, {'_aggregator_identifier', '_provenance'})
+
+    def test_exports_present_fields(self):
+        self.assertEqual(records.Study.from_partial(self._document()).export_dict(),
+                         {'_aggregator_identifier': 'some_id',
+                          '_provenance': [_prov('2000-01-01T00:00:00Z')]})
+
+    def test_export_excludes_provenance(self):
+        self.assertEqual(records.Study.from_partial(self._document()).export_dict(include_provenance=False), {})
+
+    def test_imports_subfield_projection(self):
+        s = records.Study.from_partial({'_provenance': [{'datestamp': '1999-01-01T00:00:00Z'}]})
+        self.assertEqual(s._provenance[0].attr_datestamp.get_value(), '1999-01-01T00:00:00Z')
+        self.assertIsNone(s._provenance[0].get_value())
+        self.assertIsNone(s._provenance[0].attr_base_url.get_value())
+
+    def test_absent_field_fabricated_on_access(self):
+        s = records.Study.from_partial({})
+        s.set_source_fingerprint('some_fingerprint')
+        self.assertEqual(s.export_dict(), {'_source_fingerprint': 'some_fingerprint'})
+
+    def test_partial_class_is_cached(self):
+        self.assertIs(type(records.Study.from_partial({})), type(records.Study.from_partial({})))
+        self.assertEqual(type(records.Study.from_partial({})).record_fields(), records.Study.record_fields())
@@ -0,0 +1,140 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gzip
+import json
+from io import (
+    BytesIO,
+    StringIO
+)
+from unittest import (
+    TestCase,
+    mock
+)
+from cdcagg_common import streams
+
+
+_DOCUMENTS = [{'key': index, 'value': 'ä' * index} for index in range(20)]
+
+
+class TestIterJSONDocuments(TestCase):
+
+    def _assert_documents(self, stream, expected, chunk_sizes=(1, 3, 16, streams.DEFAULT_CHUNK_SIZE)):
+        data = stream.getvalue()
+        for chunk_size in chunk_sizes:
+            with self.subTest(chunk_size=chunk_size):
+                stream = type(stream)(data)
+                self.assertEqual(list(streams.iter_json_documents(stream, chunk_size)), expected)
+
+    def test_json_array(self):
+        self._assert_documents(BytesIO(json.dumps(_DOCUMENTS).encode('utf8')), _DOCUMENTS)
+
+    def test_ndjson(self):
+        data = '\n'.join(json.dumps(document) for document in _DOCUMENTS) + '\n'
+        self._assert_documents(BytesIO(data.encode('utf8')), _DOCUMENTS)
+
+    def test_text_stream(self):
+        self._assert_documents(StringIO(json.dumps(_DOCUMENTS)), _DOCUMENTS)
+
+    def test_numbers_split_between_chunks(self):
+        self._assert_documents(BytesIO(b'[12345, 678]'), [12345, 678])
+        self._assert_documents(BytesIO(b'12345\n678'), [12345, 678])
+        self._assert_documents(BytesIO(b'[1.5e3, -2]'), [1.5e3, -2])
+        self._assert_documents(BytesIO(b'1.5\n-2e-1'), [1.5, -2e-1])
+        self._assert_documents(BytesIO(b'{"key": 1.5, "value": "\\u00e4"}'),
+                               [{'key': 1.5, 'value': '\u00e4'}])
+
+    def test_empty(self):
+        self._assert_documents(BytesIO(b''), [])
+        self._assert_documents(BytesIO(b' [ ] '), [])
+
+    def test_reads_incrementally(self):
+        stream = BytesIO('\n'.join(json.dumps(document) for document in _DOCUMENTS).encode('utf8'))
+        documents = streams.iter_json_documents(stream, chunk_size=16)
+        self.assertEqual(next(documents), _DOCUMENTS[0])
+        self.assertLess(stream.tell(), len(stream.getvalue()))
+
+    def test_invalid_raises_JSONDecodeError(self):
+        for data in (b'[1,]', b'[1 2]', b'[1', b'[1] 2', b'{"key":', b'[,1]'):
+            with self.subTest(data=data), self.assertRaises(json.JSONDecodeError):
+                list(streams.iter_json_documents(BytesIO(data), chunk_size=2))
+
+    def test_invalid_raises_before_reading_rest_of_stream(self):
+        stream = BytesIO(b'{"key": x, "value": "' + b'a' * 1000 + b'"}')
+        with self.assertRaises(json.JSONDecodeError):
+            list(streams.iter_json_documents(stream, chunk_size=16))
+        self.assertLess(stream.tell(), len(stream.getvalue()))
+
+
+class _Record:
+
+    def __init__(self, dct):
+        self.dct = dct
+        self.include_provenance = None
+
+    def export_dict(self, include_provenance=True):
+        self.include_provenance = include_provenance
+        return self.dct
+
+
+class TestNDJSONWriter(TestCase):
+
+    def test_writes_ndjson(self):
+        fileobj = BytesIO()
+        count = streams.write_ndjson([_Record(document) for document in _DOCUMENTS], fileobj)
+        self.assertEqual(count, len(_DOCUMENTS))
+        lines = fileobj.getvalue().decode('utf8').splitlines()
+        self.assertEqual([json.loads(line) for line in lines], _DOCUMENTS)
+
+    def test_writes_utf8_without_escaping(self):
+        fileobj = BytesIO()
+        streams.write_ndjson([_Record({'key': 'ä'})], fileobj)
+        self.assertEqual(fileobj.getvalue(), '{"key":"ä"}\n'.encode('utf8'))
+
+    def test_passes_include_provenance(self):
+        record = _Record({})
+        streams.write_ndjson([record], BytesIO(), include_provenance=False)
+        self.assertFalse(record.include_provenance)
+
+    def test_buffers_until_buffer_size(self):
+        fileobj = BytesIO()
+        writer = streams.NDJSONWriter(fileobj, buffer_size=1024)
+        writer.write_dict({'key': 'value'})
+        self.assertEqual(fileobj.getvalue(), b'')
+        writer.write_dict({'key': 'x' * 1024})
+        self.assertTrue(fileobj.getvalue().endswith(b'\n'))
+        writer.write_dict({'key': 'value'})
+        writer.close()
+        self.assertEqual(len(fileobj.getvalue().splitlines()), 3)
+
+    def test_gzip(self):
+        fileobj = BytesIO()
+        streams.write_ndjson([_Record(document) for document in _DOCUMENTS], fileobj, compression='gzip')
+        self.assertFalse(fileobj.closed)
+        lines = gzip.decompress(fileobj.getvalue()).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], _DOCUMENTS)
+
+    def test_output_is_readable_by_iter_json_documents(self):
+        fileobj = BytesIO()
+        streams.write_ndjson([_Record(document) for document in _DOCUMENTS], fileobj)
+        fileobj.seek(0)
+        self.assertEqual(list(streams.iter_json_documents(fileobj)), _DOCUMENTS)
+
+    @mock.patch.object(streams, 'zstandard', None)
+    def test_zstd_without_zstandard_raises_ValueError(self):
+        with self.assertRaises(ValueError):
+            streams.NDJSONWriter(BytesIO(), compression='zstd')
+
+    def test_unsupported_compression_raises_ValueError(self):
+        with self.assertRaises(ValueError):
+            streams.NDJSONWriter(BytesIO(), compression='unsupported')
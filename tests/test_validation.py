@@ -0,0 +1,119 @@
+# Copyright CESSDA ERIC 2021-2025
+#
+# Licensed under the EUPL, Version 1.2 (the "License"); you may not
+# use this file except in compliance with the License.
+# You may obtain a copy of the License at
+# https://joinup.ec.europa.eu/collection/eupl/eupl-text-eupl-12
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import TestCase
+from cdcagg_common import (
+    records,
+    validation
+)
+
+
+def _prov(**kwargs):
+    provenance = {'harvest_date': '2000-01-01T00:00:00Z', 'altered': True, 'base_url': 'some.url',
+                  'identifier': 'some_id', 'datestamp': '1999-01-01T00:00:00Z', 'direct': True,
+                  'metadata_namespace': 'some_namespace'}
+    provenance.update(kwargs)
+    return provenance
+
+
+class TestCompileField(TestCase):
+
+    def _check(self, factory, value):
+        return validation.compile_field(factory)(value)
+
+    def test_single_value_scalar(self):
+        factory = records.FieldTypeFactory('some_field', localizable=False, single_value=True)
+        self.assertIsNone(self._check(factory, 'value'))
+        self.assertIsNone(self._check(factory, None))
+        self.assertTrue(self._check(factory, ['value']))
+
+    def test_multi_value_objects(self):
+        factory = records.FieldTypeFactory('some_field', 'some_value', attrs=['some_attr'])
+        self.assertIsNone(self._check(factory, [{'some_value': 'value', 'some_attr': 'attr', 'language': 'en'}]))
+        self.assertTrue(self._check(factory, {'some_value': 'value'}))
+        self.assertTrue(self._check(factory, [{'unknown': 'value'}]))
+        self.assertTrue(self._check(factory, [{'some_value': {'nested': 'value'}}]))
+
+    def test_requires_value_key(self):
+        factory = records.FieldTypeFactory('some_field', 'some_value', attrs=['some_attr'])
+        self.assertEqual(self._check(factory, [{'some_attr': 'attr'}]), ['some_field is missing key some_value'])
+
+    def test_value_types(self):
+        factory = records.FieldTypeFactory('some_field', 'some_value', attrs=['some_attr'])
+        check = validation.compile_field(factory, {'some_attr': (bool,)})
+        self.assertIsNone(check([{'some_value': 'value', 'some_attr': True}]))
+        self.assertEqual(check([{'some_value': 'value', 'some_attr': 'true'}]),
+                         ['some_field.some_attr must be bool, got str'])
+        factory = records.FieldTypeFactory('some_field', localizable=False, single_value=True)
+        check = validation.compile_field(factory, (str, type(None)))
+        self.assertIsNone(check(None))
+        self.assertEqual(check(1), ['some_field must be str or null, got int'])
+
+    def test_not_localizable_rejects_language(self):
+        factory = records.FieldTypeFactory('some_field', 'some_value', localizable=False)
+        self.assertTrue(self._check(factory, [{'some_value': 'value', 'language': 'en'}]))
+
+
+class TestStudyValidator(TestCase):
+
+    def setUp(self):
+        self.validator = records.Study.validator()
+
+    def test_is_cached(self):
+        self.assertIs(records.Study.validator(), self.validator)
+
+    def test_covers_record_fields(self):
+        self.assertEqual(set(self.validator.fields),
+                         {factory.name for _, factory in records.Study.record_fields()})
+
+    def test_accepts_exported_study(self):
+        s = records.Study()
+        s.set_aggregator_identifier('some_id')
+        s.set_direct_base_url('some.url')
+        prov = _prov()
+        s._provenance.add_value(prov.pop('harvest_date'), **prov)
+        self.assertEqual(self.validator.validate(s.export_dict(include_metadata=False, include_id=False)), {})
+
+    def test_accepts_document_keys(self):
+        self.assertTrue(self.validator.is_valid({'_id': 'some_id', '_metadata': {}}))
+
+    def test_rejects_unknown_field(self):
+        self.assertEqual(list(self.validator.validate({'unknown': 'value'})), ['unknown'])
+
+    def test_rejects_unknown_provenance_attribute(self):
+        errors = self.validator.validate({'_provenance': [_prov(unknown='value')]})
+        self.assertEqual(list(errors), ['_provenance'])
+
+    def test_rejects_invalid_single_value(self):
+        self.assertFalse(self.validator.is_valid({'_aggregator_identifier': ['some_id']}))
+
+    def test_rejects_invalid_provenance_attribute_types(self):
+        for provenance in (_prov(altered='false'), _prov(direct=1), _prov(base_url=1)):
+            with self.subTest(provenance=provenance):
+                self.assertEqual(list(self.validator.validate({'_provenance': [provenance]})), ['_provenance'])
+
+    def test_rejects_provenance_without_harvest_date(self):
+        provenance = _prov()
+        del provenance['harvest_date']
+        self.assertFalse(self.validator.is_valid({'_provenance': [provenance]}))
+
+    def test_rejects_non_string_aggregator_identifier(self):
+        self.assertFalse(self.validator.is_valid({'_aggregator_identifier': 1}))
+        self.assertTrue(self.validator.is_valid({'_aggregator_identifier': None}))
+
+    def test_check_raises_ValidationError(self):
+        with self.assertRaises(validation.ValidationError) as cm:
+            self.validator.check({'_provenance': 'invalid'})
+        self.assertIn('_provenance', cm.exception.errors)
+        document = {'_aggregator_identifier': 'some_id'}
+        self.assertIs(self.validator.check(document), document)